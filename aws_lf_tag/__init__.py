@@ -26,6 +26,7 @@ from .core import (
     Playbook,
 )
 from .gen_code import gen_resource, gen_principal
+from .fanout import gen_all
 
 CreateDatabase: Permission = PermissionEnum.CreateDatabase.value
 AlterDatabase: Permission = PermissionEnum.AlterDatabase.value
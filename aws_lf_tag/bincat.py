@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compact binary Glue Data Catalog snapshot, and a memory mapped loader.
+
+File layout, all integers are little endian ``uint32``::
+
+    header      magic (8 bytes), n_string, n_database, n_table, n_column,
+                account_id string index, region string index
+    strings     offset[n_string + 1], utf-8 blob
+    databases   name[n_database], table_start[n_database + 1]
+    tables      name[n_table], database[n_table], column_start[n_table + 1]
+    columns     name[n_column], table[n_column]
+
+Strings are de-duplicated. Tables are grouped by database and columns by
+table, sorted by name within the group. ``table_start`` / ``column_start``
+give the children range of a parent, ``database`` / ``table`` are the parent
+index arrays. A name lookup is a binary search inside the children range, so
+only the touched pages of the file are read.
+"""
+
+import mmap
+import struct
+from pathlib import Path
+from typing import List, Dict, Tuple, Iterable, Union
+
+from .core import Resource, Database, Table, Column
+
+MAGIC = b"LFCAT\x00\x01\x00"
+HEADER = struct.Struct("<8s6I")
+UINT32 = struct.Struct("<I")
+
+
+class _StringTable:
+    def __init__(self):
+        self.index: Dict[str, int] = dict()
+        self.strings: List[bytes] = list()
+
+    def add(self, s: str) -> int:
+        try:
+            return self.index[s]
+        except KeyError:
+            ind = len(self.strings)
+            self.index[s] = ind
+            self.strings.append(s.encode("utf-8"))
+            return ind
+
+
+def _pack(values: List[int]) -> bytes:
+    return struct.pack(f"<{len(values)}I", *values)
+
+
+def write_binary_catalog(
+    database_list: Iterable[Database],
+    path: Union[str, Path],
+):
+    """
+    Dump databases, with all tables and columns in ``database.t`` and
+    ``table.c``, into a binary catalog file.
+    """
+    database_list = sorted(database_list, key=lambda db: db.name)
+    st = _StringTable()
+    if len(database_list):
+        account_id = st.add(database_list[0].account_id)
+        region = st.add(database_list[0].region)
+    else:
+        account_id = region = st.add("")
+
+    db_name, db_table_start = list(), [0, ]
+    tb_name, tb_database, tb_column_start = list(), list(), [0, ]
+    col_name, col_table = list(), list()
+    for db_ind, database in enumerate(database_list):
+        db_name.append(st.add(database.name))
+        for table in sorted(database.t.values(), key=lambda tb: tb.name):
+            tb_ind = len(tb_name)
+            tb_name.append(st.add(table.name))
+            tb_database.append(db_ind)
+            for column in sorted(table.c.values(), key=lambda col: col.name):
+                col_name.append(st.add(column.name))
+                col_table.append(tb_ind)
+            tb_column_start.append(len(col_name))
+        db_table_start.append(len(tb_name))
+
+    string_offset = [0, ]
+    for s in st.strings:
+        string_offset.append(string_offset[-1] + len(s))
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(
+            MAGIC,
+            len(st.strings), len(db_name), len(tb_name), len(col_name),
+            account_id, region,
+        ))
+        f.write(_pack(string_offset))
+        f.write(b"".join(st.strings))
+        for values in [
+            db_name, db_table_start,
+            tb_name, tb_database, tb_column_start,
+            col_name, col_table,
+        ]:
+            f.write(_pack(values))
+
+
+class BinaryCatalog:
+    """
+    Memory mapped reader of a binary catalog file. ``Database``, ``Table``
+    and ``Column`` objects are created on demand, parent objects are cached
+    so all tables of a database share the same ``Database`` object.
+
+    .. note::
+
+        ``database.t`` and ``table.c`` of the returned objects are not
+        populated, use :meth:`tables` and :meth:`columns` to list children.
+
+    Usage::
+
+        with BinaryCatalog(path) as catalog:
+            col = catalog.column("db", "users", "ssn")
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < HEADER.size or self._mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a binary catalog file")
+        (
+            _,
+            self.n_string, self.n_database, self.n_table, self.n_column,
+            account_id, region,
+        ) = HEADER.unpack_from(self._mm, 0)
+
+        offset = HEADER.size
+        self._string_offset = offset
+        offset += 4 * (self.n_string + 1)
+        self._blob = offset
+        offset += self._uint32(self._string_offset, self.n_string)
+        self._db_name = offset
+        offset += 4 * self.n_database
+        self._db_table_start = offset
+        offset += 4 * (self.n_database + 1)
+        self._tb_name = offset
+        offset += 4 * self.n_table
+        self._tb_database = offset
+        offset += 4 * self.n_table
+        self._tb_column_start = offset
+        offset += 4 * (self.n_table + 1)
+        self._col_name = offset
+        offset += 4 * self.n_column
+        self._col_table = offset
+
+        self.account_id = self._string(account_id)
+        self.region = self._string(region)
+        self._databases: Dict[int, Database] = dict()
+        self._tables: Dict[int, Table] = dict()
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _uint32(self, array_offset: int, ind: int) -> int:
+        return UINT32.unpack_from(self._mm, array_offset + 4 * ind)[0]
+
+    def _string(self, ind: int) -> str:
+        start = self._uint32(self._string_offset, ind)
+        end = self._uint32(self._string_offset, ind + 1)
+        return self._mm[self._blob + start:self._blob + end].decode("utf-8")
+
+    def _bisect(self, name_array: int, lo: int, hi: int, name: str) -> int:
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._string(self._uint32(name_array, mid)) < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find(self, name_array: int, lo: int, hi: int, name: str) -> int:
+        ind = self._bisect(name_array, lo, hi, name)
+        if ind < hi and self._string(self._uint32(name_array, ind)) == name:
+            return ind
+        raise KeyError(name)
+
+    # --- index based access
+    def _get_database(self, db_ind: int) -> Database:
+        try:
+            return self._databases[db_ind]
+        except KeyError:
+            database = Database(
+                account_id=self.account_id,
+                region=self.region,
+                name=self._string(self._uint32(self._db_name, db_ind)),
+            )
+            self._databases[db_ind] = database
+            return database
+
+    def _get_table(self, tb_ind: int) -> Table:
+        try:
+            return self._tables[tb_ind]
+        except KeyError:
+            table = Table(
+                name=self._string(self._uint32(self._tb_name, tb_ind)),
+                database=self._get_database(self._uint32(self._tb_database, tb_ind)),
+            )
+            self._tables[tb_ind] = table
+            return table
+
+    def _get_column(self, col_ind: int) -> Column:
+        return Column(
+            name=self._string(self._uint32(self._col_name, col_ind)),
+            table=self._get_table(self._uint32(self._col_table, col_ind)),
+        )
+
+    def _table_range(self, db_ind: int) -> Tuple[int, int]:
+        return (
+            self._uint32(self._db_table_start, db_ind),
+            self._uint32(self._db_table_start, db_ind + 1),
+        )
+
+    def _column_range(self, tb_ind: int) -> Tuple[int, int]:
+        return (
+            self._uint32(self._tb_column_start, tb_ind),
+            self._uint32(self._tb_column_start, tb_ind + 1),
+        )
+
+    def _database_index(self, database: str) -> int:
+        return self._find(self._db_name, 0, self.n_database, database)
+
+    def _table_index(self, database: str, table: str) -> int:
+        lo, hi = self._table_range(self._database_index(database))
+        return self._find(self._tb_name, lo, hi, table)
+
+    # --- name based access
+    def database(self, database: str) -> Database:
+        return self._get_database(self._database_index(database))
+
+    def table(self, database: str, table: str) -> Table:
+        return self._get_table(self._table_index(database, table))
+
+    def column(self, database: str, table: str, column: str) -> Column:
+        lo, hi = self._column_range(self._table_index(database, table))
+        return self._get_column(self._find(self._col_name, lo, hi, column))
+
+    def databases(self) -> Iterable[Database]:
+        for db_ind in range(self.n_database):
+            yield self._get_database(db_ind)
+
+    def tables(self, database: str) -> Iterable[Table]:
+        for tb_ind in range(*self._table_range(self._database_index(database))):
+            yield self._get_table(tb_ind)
+
+    def columns(self, database: str, table: str) -> Iterable[Column]:
+        for col_ind in range(*self._column_range(self._table_index(database, table))):
+            yield self._get_column(col_ind)
+
+    def iter_resources(self) -> Iterable[Resource]:
+        """
+        Iterate all databases, tables and columns, parent first.
+        """
+        for db_ind in range(self.n_database):
+            yield self._get_database(db_ind)
+            for tb_ind in range(*self._table_range(db_ind)):
+                yield self._get_table(tb_ind)
+                for col_ind in range(*self._column_range(tb_ind)):
+                    yield self._get_column(col_ind)
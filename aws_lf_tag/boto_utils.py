@@ -109,3 +109,50 @@ def delete_tag(
         CatalogId=account_id,
         TagKey=key,
     )
+
+
+def _list_iam_entities(
+    method,
+    key: str,
+    path_prefix: str = "/",
+) -> List[dict]:
+    marker = None
+    entities: List[dict] = list()
+    while 1:
+        kwargs = dict(
+            PathPrefix=path_prefix,
+            MaxItems=1000,
+        )
+        if marker:
+            kwargs["Marker"] = marker
+        res = method(**kwargs)
+        entities.extend(res.get(key, list()))
+        if res.get("IsTruncated"):
+            marker = res["Marker"]
+        else:
+            break
+    return entities
+
+
+def list_iam_users(
+    iam_client,
+    path_prefix: str = "/",
+) -> List[dict]:
+    """
+    Call ``list_users`` api recursively to get all IAM users.
+
+    Ref: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/iam.html#IAM.Client.list_users
+    """
+    return _list_iam_entities(iam_client.list_users, "Users", path_prefix)
+
+
+def list_iam_roles(
+    iam_client,
+    path_prefix: str = "/",
+) -> List[dict]:
+    """
+    Call ``list_roles`` api recursively to get all IAM roles.
+
+    Ref: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/iam.html#IAM.Client.list_roles
+    """
+    return _list_iam_entities(iam_client.list_roles, "Roles", path_prefix)
@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
 
+import copy
 import enum
-import json
 import uuid
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import List, Dict, Union, Set, Tuple, Iterable, Type, Any
+from typing import List, Dict, Union, Set, Tuple, Iterable, Type, Any, Callable
 
 import boto3
 from box import Box
@@ -13,38 +13,112 @@ from colorama import Fore, Back, Style
 
 from . import boto_utils
 from .logger import logger
+from .executor import ApplyExecutor, make_boto_config
+from .scheduler import Dag, Node, STATUS_DONE
 
 DELIMITER = "____"
 
 
 class Hashable:
+    """
+    The ``id`` and its hash are computed once at construction, and the
+    fields that make up the identity should not be changed afterwards.
+    """
+    __slots__ = ()
+
     id: str
+    _hash: int
+
+    def _set_id(self, id: str):
+        self.id = id
+        self._hash = hash(id)
 
     def __eq__(self, other: 'Hashable') -> bool:
-        return self.id == other.id
+        return self is other or self.id == other.id
 
     def __hash__(self):
-        return hash(self.id)
+        return self._hash
 
 
 class Serializable:
+    __slots__ = ()
+
     def serialize(self) -> dict:
         raise NotImplementedError
 
     @classmethod
-    def deserialize(cls, data) -> 'Serializable':
+    def deserialize(cls, data, interner: 'Interner' = None) -> 'Serializable':
         raise NotImplementedError
 
 
+class Interner:
+    """
+    Flyweight registry, keeps a single shared object per ``(class, id)``.
+
+    Pass it to ``deserialize`` so that, for example, one database
+    referenced by 10k attachments is a single ``Database`` object. It can
+    also be used with objects created by constructors::
+
+        interner = Interner()
+        db = interner.intern(Database(account_id, region, "db"))
+    """
+    __slots__ = ("_pool",)
+
+    def __init__(self):
+        self._pool: Dict[Tuple[type, str], Hashable] = dict()
+
+    def __len__(self):
+        return len(self._pool)
+
+    def intern(self, obj: 'Hashable') -> 'Hashable':
+        """
+        Return the registered object that has the same identity, or register
+        this one.
+        """
+        return self._pool.setdefault((obj.__class__, obj.id), obj)
+
+    def get_or_create(
+        self,
+        cls: type,
+        id: str,
+        factory: Callable[[], 'Hashable'],
+    ) -> 'Hashable':
+        """
+        Return the registered object, only call ``factory`` when it's not
+        registered yet.
+        """
+        key = (cls, id)
+        try:
+            return self._pool[key]
+        except KeyError:
+            obj = factory()
+            self._pool[key] = obj
+            return obj
+
+
+def _get_or_create(
+    interner: Union[Interner, None],
+    cls: type,
+    id: str,
+    factory: Callable[[], 'Hashable'],
+) -> 'Hashable':
+    if interner is None:
+        return factory()
+    return interner.get_or_create(cls, id, factory)
+
+
 # ------------------------------------------------------------------------------
 # Principal
 # ------------------------------------------------------------------------------
 class Principal(Hashable, Serializable):
+    __slots__ = ("arn", "id", "_hash", "attachments")
+
     def __init__(
         self,
         arn: str,
     ):
         self.arn = arn
+        self._set_id(arn)
         self.attachments: Dict[str, PrincipalAttachment] = dict()
 
     def __repr__(self):
@@ -55,30 +129,52 @@ class Principal(Hashable, Serializable):
         return self.arn.split("/", 1)[1].replace("-", "_").replace(".", "_").replace("/", "__")
 
     @property
-    def id(self) -> str:
-        return self.arn
+    def var_name(self) -> str:
+        """
+        Variable name of this principal in the generated principal module.
+        """
+        raise NotImplementedError
 
     def render_define(self) -> str:
         raise NotImplementedError
 
+    def render_lazy_define(self) -> str:
+        """
+        Entry of the ``_definitions`` table in the lazy principal module.
+        """
+        return f'"{self.var_name}": ("{self.__class__.__name__}", "{self.arn}"),'
+
     def serialize(self) -> dict:
         return dict(
             arn=self.arn,
         )
 
     @classmethod
-    def deserialize(cls, data: dict) -> 'Principal':
-        return cls(arn=data["arn"])
+    def deserialize(cls, data: dict, interner: Interner = None) -> 'Principal':
+        arn = data["arn"]
+        return _get_or_create(interner, cls, arn, lambda: cls(arn=arn))
 
 
 class IamUser(Principal):
+    __slots__ = ()
+
+    @property
+    def var_name(self) -> str:
+        return f"user_{self.attr_safe_name}"
+
     def render_define(self) -> str:
-        return f'user_{self.attr_safe_name} = IamUser(arn="{self.arn}")'
+        return f'{self.var_name} = IamUser(arn="{self.arn}")'
 
 
 class IamRole(Principal):
+    __slots__ = ()
+
+    @property
+    def var_name(self) -> str:
+        return f"role_{self.attr_safe_name}"
+
     def render_define(self) -> str:
-        return f'role_{self.attr_safe_name} = IamRole(arn="{self.arn}")'
+        return f'{self.var_name} = IamRole(arn="{self.arn}")'
 
 
 # ------------------------------------------------------------------------------
@@ -89,35 +185,58 @@ def to_attr_safe_name(name):
 
 
 class Resource(Hashable, Serializable):
+    __slots__ = (
+        "name", "id", "_hash", "attr_safe_name", "_fullname",
+        "tags", "attachments",
+    )
+
     name: str
+    attr_safe_name: str
     tags: Dict[str, 'Tag']
     attachments: Dict[str, 'ResourceAttachment']
     get_add_remove_lf_tags_arg_name: str
 
-    @property
-    def attr_safe_name(self) -> str:
-        return to_attr_safe_name(self.name)
+    def _make_fullname(self) -> str:
+        raise NotImplementedError
 
     @property
     def fullname(self) -> str:
-        raise NotImplementedError
+        """
+        Only used in code generation, so it is computed on first access
+        and then cached.
+        """
+        if self._fullname is None:
+            self._fullname = self._make_fullname()
+        return self._fullname
 
     @property
-    def id(self) -> str:
+    def var_name(self) -> str:
+        """
+        Variable name of this resource in the generated resource module.
+        """
         raise NotImplementedError
 
-    @property
     def render_define(self) -> str:
         raise NotImplementedError
 
+    def render_lazy_define(self) -> str:
+        """
+        Entry of the ``_definitions`` table in the lazy resource module.
+        """
+        raise NotImplementedError
+
     @classmethod
-    def deserialize(cls, data: dict) -> Union['Database', 'Table', 'Column']:
+    def deserialize(
+        cls,
+        data: dict,
+        interner: Interner = None,
+    ) -> Union['Database', 'Table', 'Column']:
         if "account_id" in data:
-            return Database.deserialize(data)
+            return Database.deserialize(data, interner)
         elif "database" in data:
-            return Table.deserialize(data)
+            return Table.deserialize(data, interner)
         elif "table" in data:
-            return Column.deserialize(data)
+            return Column.deserialize(data, interner)
         else:
             raise Exception
 
@@ -127,6 +246,8 @@ class Resource(Hashable, Serializable):
 
 
 class Database(Resource):
+    __slots__ = ("account_id", "region", "t")
+
     get_add_remove_lf_tags_arg_name = "Database"
 
     def __init__(
@@ -138,6 +259,9 @@ class Database(Resource):
         self.account_id = account_id
         self.region = region
         self.name = name
+        self.attr_safe_name = to_attr_safe_name(name)
+        self._fullname = None
+        self._set_id(f'{account_id}{DELIMITER}{region}{DELIMITER}{name}')
         self.t: Dict[str, Table] = Box()
         self.tags: Dict[str: Tag] = dict()
         self.attachments: Dict[str, ResourceAttachment] = dict()
@@ -149,16 +273,18 @@ class Database(Resource):
     def attr_safe_region(self) -> str:
         return self.region.replace("-", "_")
 
-    @property
-    def fullname(self) -> str:
+    def _make_fullname(self) -> str:
         return f'{self.account_id}{DELIMITER}{self.attr_safe_region}{DELIMITER}{self.attr_safe_name}'
 
     @property
-    def id(self) -> str:
-        return f'{self.account_id}{DELIMITER}{self.region}{DELIMITER}{self.name}'
+    def var_name(self) -> str:
+        return f"db_{self.fullname}"
 
     def render_define(self) -> str:
-        return f'db_{self.fullname} = Database(account_id=account_id, region=region, name="{self.name}")'
+        return f'{self.var_name} = Database(account_id=account_id, region=region, name="{self.name}")'
+
+    def render_lazy_define(self) -> str:
+        return f'"{self.var_name}": ("{self.name}", None),'
 
     def serialize(self) -> dict:
         return dict(
@@ -168,11 +294,13 @@ class Database(Resource):
         )
 
     @classmethod
-    def deserialize(cls, data: dict) -> 'Database':
-        return cls(
-            account_id=data["account_id"],
-            region=data["region"],
-            name=data["name"],
+    def deserialize(cls, data: dict, interner: Interner = None) -> 'Database':
+        account_id, region, name = data["account_id"], data["region"], data["name"]
+        return _get_or_create(
+            interner,
+            cls,
+            f'{account_id}{DELIMITER}{region}{DELIMITER}{name}',
+            lambda: cls(account_id=account_id, region=region, name=name),
         )
 
     @property
@@ -184,6 +312,8 @@ class Database(Resource):
 
 
 class Table(Resource):
+    __slots__ = ("database", "c")
+
     get_add_remove_lf_tags_arg_name = "Table"
 
     def __init__(
@@ -196,6 +326,10 @@ class Table(Resource):
 
         assert isinstance(database, Database)
 
+        self.attr_safe_name = to_attr_safe_name(name)
+        self._fullname = None
+        self._set_id(f'{database.id}{DELIMITER}{name}')
+
         self.c: Dict[str, Column] = Box()
         self.tags: Dict[str: Tag] = dict()
         self.attachments: Dict[str, ResourceAttachment] = dict()
@@ -203,16 +337,18 @@ class Table(Resource):
     def __repr__(self):
         return f'Table(database={self.database!r}, name="{self.name}")'
 
-    @property
-    def fullname(self) -> str:
+    def _make_fullname(self) -> str:
         return f'{self.database.fullname}{DELIMITER}{self.attr_safe_name}'
 
     @property
-    def id(self) -> str:
-        return f'{self.database.id}{DELIMITER}{self.name}'
+    def var_name(self) -> str:
+        return f"tb_{self.fullname}"
 
     def render_define(self) -> str:
-        return f'tb_{self.fullname} = Table(name="{self.name}", database=db_{self.database.fullname})'
+        return f'{self.var_name} = Table(name="{self.name}", database={self.database.var_name})'
+
+    def render_lazy_define(self) -> str:
+        return f'"{self.var_name}": ("{self.name}", "{self.database.var_name}"),'
 
     def serialize(self) -> dict:
         return dict(
@@ -221,10 +357,14 @@ class Table(Resource):
         )
 
     @classmethod
-    def deserialize(cls, data: dict) -> 'Table':
-        return cls(
-            name=data["name"],
-            database=Database.deserialize(data["database"]),
+    def deserialize(cls, data: dict, interner: Interner = None) -> 'Table':
+        name = data["name"]
+        database = Database.deserialize(data["database"], interner)
+        return _get_or_create(
+            interner,
+            cls,
+            f'{database.id}{DELIMITER}{name}',
+            lambda: cls(name=name, database=database),
         )
 
     @property
@@ -237,6 +377,8 @@ class Table(Resource):
 
 
 class Column(Resource):
+    __slots__ = ("table",)
+
     get_add_remove_lf_tags_arg_name = "TableWithColumns"
 
     def __init__(
@@ -249,22 +391,28 @@ class Column(Resource):
 
         assert isinstance(table, Table)
 
+        self.attr_safe_name = to_attr_safe_name(name)
+        self._fullname = None
+        self._set_id(f'{table.id}{DELIMITER}{name}')
+
         self.tags: Dict[str: Tag] = dict()
         self.attachments: Dict[str, ResourceAttachment] = dict()
 
     def __repr__(self):
         return f'Column(table={self.table!r}, name="{self.name}")'
 
-    @property
-    def fullname(self) -> str:
+    def _make_fullname(self) -> str:
         return f'{self.table.fullname}{DELIMITER}{self.attr_safe_name}'
 
     @property
-    def id(self) -> str:
-        return f'{self.table.id}{DELIMITER}{self.name}'
+    def var_name(self) -> str:
+        return f"col_{self.fullname}"
 
     def render_define(self) -> str:
-        return f'col_{self.fullname} = Column(name="{self.name}", table=tb_{self.table.fullname})'
+        return f'{self.var_name} = Column(name="{self.name}", table={self.table.var_name})'
+
+    def render_lazy_define(self) -> str:
+        return f'"{self.var_name}": ("{self.name}", "{self.table.var_name}"),'
 
     def serialize(self) -> dict:
         return dict(
@@ -273,10 +421,14 @@ class Column(Resource):
         )
 
     @classmethod
-    def deserialize(cls, data: dict) -> 'Column':
-        return cls(
-            name=data["name"],
-            table=Table.deserialize(data["table"]),
+    def deserialize(cls, data: dict, interner: Interner = None) -> 'Column':
+        name = data["name"]
+        table = Table.deserialize(data["table"], interner)
+        return _get_or_create(
+            interner,
+            cls,
+            f'{table.id}{DELIMITER}{name}',
+            lambda: cls(name=name, table=table),
         )
 
     @property
@@ -296,6 +448,7 @@ class Permission(Hashable, Serializable):
     """
 
     """
+    __slots__ = ("id", "_hash", "resource_type", "permission", "grantable")
 
     def __init__(
         self,
@@ -304,7 +457,7 @@ class Permission(Hashable, Serializable):
         permission: str,
         grantable: bool,
     ):
-        self.id = id
+        self._set_id(id)
         self.resource_type = resource_type
         self.permission = permission
         self.grantable = grantable
@@ -321,7 +474,7 @@ class Permission(Hashable, Serializable):
         )
 
     @classmethod
-    def deserialize(cls, data: dict) -> 'Permission':
+    def deserialize(cls, data: dict, interner: Interner = None) -> 'Permission':
         return PermissionEnum[data["id"]].value
 
 
@@ -520,11 +673,140 @@ class PermissionEnum(enum.Enum):
 
 PermissionEnum._validate()
 
+# lakeformation permission name -> bit, in the order of ``PermissionEnum``
+_permission_bit: Dict[str, int] = dict()
+# (resource_type, permission name, grantable) -> ``Permission``
+_permission_lookup: Dict[Tuple[str, str, bool], Permission] = dict()
+for _member in PermissionEnum:
+    _permission_bit.setdefault(_member.value.permission, 1 << len(_permission_bit))
+    _permission_lookup[(
+        _member.value.resource_type,
+        _member.value.permission,
+        _member.value.grantable,
+    )] = _member.value
+_permission_names: List[str] = list(_permission_bit)
+
+
+class PermissionSet:
+    """
+    A set of permissions on one resource type, as two int bit flags over the
+    lakeformation permission names. ``mask`` is the ``Permissions`` and
+    ``grantable_mask`` is the ``PermissionsWithGrantOption`` of a grant
+    entry. Union, difference and intersection are bitwise operations.
+    """
+    __slots__ = ("mask", "grantable_mask")
+
+    def __init__(self, mask: int = 0, grantable_mask: int = 0):
+        self.mask = mask
+        self.grantable_mask = grantable_mask
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}("
+            f"permissions={self.permissions}, "
+            f"permissions_with_grant_option={self.permissions_with_grant_option})"
+        )
+
+    @classmethod
+    def from_permissions(cls, permissions: Iterable[Permission]) -> 'PermissionSet':
+        permission_set = cls()
+        for permission in permissions:
+            permission_set.add(permission)
+        return permission_set
+
+    def add(self, permission: Permission):
+        if permission.grantable:
+            self.grantable_mask |= _permission_bit[permission.permission]
+        else:
+            self.mask |= _permission_bit[permission.permission]
+
+    def __or__(self, other: 'PermissionSet') -> 'PermissionSet':
+        return PermissionSet(
+            self.mask | other.mask,
+            self.grantable_mask | other.grantable_mask,
+        )
+
+    def __and__(self, other: 'PermissionSet') -> 'PermissionSet':
+        return PermissionSet(
+            self.mask & other.mask,
+            self.grantable_mask & other.grantable_mask,
+        )
+
+    def __sub__(self, other: 'PermissionSet') -> 'PermissionSet':
+        return PermissionSet(
+            self.mask & ~other.mask,
+            self.grantable_mask & ~other.grantable_mask,
+        )
+
+    def __eq__(self, other: 'PermissionSet') -> bool:
+        return (
+            self.mask == other.mask
+            and self.grantable_mask == other.grantable_mask
+        )
+
+    def __bool__(self):
+        return bool(self.mask or self.grantable_mask)
+
+    @staticmethod
+    def _names(mask: int) -> List[str]:
+        return [
+            name
+            for name in _permission_names
+            if mask & _permission_bit[name]
+        ]
+
+    @property
+    def permissions(self) -> List[str]:
+        return self._names(self.mask)
+
+    @property
+    def permissions_with_grant_option(self) -> List[str]:
+        return self._names(self.grantable_mask)
+
+    def to_permissions(self, resource_type: str) -> List[Permission]:
+        """
+        Convert back to ``PermissionEnum`` members of a resource type.
+        """
+        return [
+            _permission_lookup[(resource_type, name, grantable)]
+            for grantable, mask in [
+                (False, self.mask),
+                (True, self.grantable_mask),
+            ]
+            for name in self._names(mask)
+        ]
+
+
+GrantKey = Tuple[str, str, str, str]
+
+
+def group_permissions(
+    tags: Iterable['Tag'],
+) -> Dict[GrantKey, PermissionSet]:
+    """
+    Aggregate the principal attachments of tags by
+    ``(principal_id, tag_key, tag_value, resource_type)``.
+    """
+    groups: Dict[GrantKey, PermissionSet] = dict()
+    for tag in tags:
+        for pa in tag.principal_attachments.values():
+            key = (pa.principal.id, tag.key, tag.value, pa.permission.resource_type)
+            try:
+                groups[key].add(pa.permission)
+            except KeyError:
+                groups[key] = PermissionSet.from_permissions([pa.permission, ])
+    return groups
+
 
 # ------------------------------------------------------------------------------
 # LakeFormation Tag
 # ------------------------------------------------------------------------------
 class Tag(Hashable, Serializable):
+    __slots__ = (
+        "key", "value", "id", "_hash",
+        "principal_attachments", "resource_attachments", "playbooks",
+    )
+
     def __init__(
         self,
         key: str,
@@ -533,19 +815,19 @@ class Tag(Hashable, Serializable):
     ):
         self.key = key
         self.value = value
-        if pb is not None:  # pragma: no cover
-            pb.add_tag(self)
+        self._set_id(f"{key}{DELIMITER}{value}")
 
         self.principal_attachments: Dict[str, PrincipalAttachment] = dict()
         self.resource_attachments: Dict[str, ResourceAttachment] = dict()
+        # playbooks this tag is added to, they index new attachments
+        self.playbooks: List['Playbook'] = list()
+
+        if pb is not None:  # pragma: no cover
+            pb.add_tag(self)
 
     def __repr__(self):
         return f'{self.__class__.__name__}(key="{self.key}", value="{self.value}")'
 
-    @property
-    def id(self):
-        return f"{self.key}{DELIMITER}{self.value}"
-
     def serialize(self) -> dict:
         return dict(
             key=self.key,
@@ -553,12 +835,14 @@ class Tag(Hashable, Serializable):
         )
 
     @classmethod
-    def deserialize(cls, data: dict) -> 'Tag':
-        tag = cls(
-            key=data["key"],
-            value=data["value"],
+    def deserialize(cls, data: dict, interner: Interner = None) -> 'Tag':
+        key, value = data["key"], data["value"]
+        return _get_or_create(
+            interner,
+            cls,
+            f"{key}{DELIMITER}{value}",
+            lambda: cls(key=key, value=value),
         )
-        return tag
 
     def attach_to_principal(
         self,
@@ -585,6 +869,8 @@ class Tag(Hashable, Serializable):
             )
             self.principal_attachments[pa.id] = pa
             principal.attachments[pa.id] = pa
+            for pb in self.playbooks:
+                pb._pa_mapper[pa.id] = pa
 
     def attach_to_resource(
         self,
@@ -597,9 +883,63 @@ class Tag(Hashable, Serializable):
         )
         self.resource_attachments[ra.id] = ra
         resource.attachments[ra.id] = ra
+        for pb in self.playbooks:
+            pb._ra_mapper[ra.id] = ra
+
+    def attach_to_resources(
+        self,
+        resources: Union[str, Iterable[Resource]],
+        index: 'ResourceIndex' = None,
+    ):
+        """
+        Attach this tag to many resources at once, for example::
+
+            index = ResourceIndex.from_module(resource_module)
+            tag.attach_to_resources("db_*.*.ssn", index=index)
+            tag.attach_to_resources(index.select("db_*.*.ssn"))
+
+        :param resources: a ``database[.table[.column]]`` glob selector
+            resolved with ``index``, or an iterable of resources.
+        :param index: a :class:`~aws_lf_tag.search.ResourceIndex`, required
+            when ``resources`` is a selector.
+        """
+        if isinstance(resources, str):
+            if index is None:
+                raise TypeError(
+                    f"selector {resources!r} needs a ResourceIndex, use "
+                    f"attach_to_resources(selector, index=index) or "
+                    f"attach_to_resources(index.select(selector))"
+                )
+            resources = index.select(resources)
+        for resource in resources:
+            self.attach_to_resource(resource)
+
+    def detach_from_principal(
+        self,
+        principal: 'Principal',
+        permissions: List['Permission'],
+    ):
+        for permission in permissions:
+            pa_id = DELIMITER.join([self.id, principal.id, permission.id])
+            self.principal_attachments.pop(pa_id, None)
+            principal.attachments.pop(pa_id, None)
+            for pb in self.playbooks:
+                pb._pa_mapper.pop(pa_id, None)
+
+    def detach_from_resource(
+        self,
+        resource: Resource,
+    ):
+        ra_id = DELIMITER.join([self.id, resource.id])
+        self.resource_attachments.pop(ra_id, None)
+        resource.attachments.pop(ra_id, None)
+        for pb in self.playbooks:
+            pb._ra_mapper.pop(ra_id, None)
 
 
 class PrincipalAttachment(Hashable, Serializable):
+    __slots__ = ("tag", "principal", "permission", "id", "_hash")
+
     def __init__(
         self,
         tag: Tag,
@@ -609,12 +949,9 @@ class PrincipalAttachment(Hashable, Serializable):
         self.tag = tag
         self.principal = principal
         self.permission = permission
-
-    @property
-    def id(self):
-        return DELIMITER.join([
-            self.tag.id, self.principal.id, self.permission.id,
-        ])
+        self._set_id(DELIMITER.join([
+            tag.id, principal.id, permission.id,
+        ]))
 
     def serialize(self) -> dict:
         return dict(
@@ -624,15 +961,17 @@ class PrincipalAttachment(Hashable, Serializable):
         )
 
     @classmethod
-    def deserialize(cls, data: dict) -> 'PrincipalAttachment':
+    def deserialize(cls, data: dict, interner: Interner = None) -> 'PrincipalAttachment':
         return cls(
-            tag=Tag.deserialize(data["tag"]),
-            principal=Principal.deserialize(data["principal"]),
+            tag=Tag.deserialize(data["tag"], interner),
+            principal=Principal.deserialize(data["principal"], interner),
             permission=Permission.deserialize(data["permission"]),
         )
 
 
 class ResourceAttachment(Hashable, Serializable):
+    __slots__ = ("tag", "resource", "id", "_hash")
+
     def __init__(
         self,
         tag: Tag,
@@ -640,12 +979,9 @@ class ResourceAttachment(Hashable, Serializable):
     ):
         self.tag = tag
         self.resource = resource
-
-    @property
-    def id(self):
-        return DELIMITER.join([
-            self.tag.id, self.resource.id
-        ])
+        self._set_id(DELIMITER.join([
+            tag.id, resource.id
+        ]))
 
     def serialize(self) -> dict:
         return dict(
@@ -654,10 +990,10 @@ class ResourceAttachment(Hashable, Serializable):
         )
 
     @classmethod
-    def deserialize(cls, data: dict) -> 'ResourceAttachment':
+    def deserialize(cls, data: dict, interner: Interner = None) -> 'ResourceAttachment':
         return cls(
-            tag=Tag.deserialize(data["tag"]),
-            resource=Resource.deserialize(data["resource"]),
+            tag=Tag.deserialize(data["tag"], interner),
+            resource=Resource.deserialize(data["resource"], interner),
         )
 
 
@@ -675,6 +1011,22 @@ def get_local_and_utc_now() -> Tuple[datetime, datetime]:
     return (local_now, utc_now)
 
 
+def get_deploy_metadata() -> Dict[str, str]:
+    """
+    Who deployed and when, the header of the deployed state file.
+    """
+    local_now, utc_now = get_local_and_utc_now()
+    try:
+        username = Path.home().name
+    except:
+        username = "unknown"
+    return {
+        "deployed_by": username,
+        "deployed_at_local_time": local_now.isoformat(),
+        "deployed_at_utc_time": utc_now.isoformat(),
+    }
+
+
 def get_diff_and_inter(
     dct1: Dict[str, Any],
     dct2: Dict[str, Any],
@@ -730,13 +1082,46 @@ def grouper_list(l: Iterable, n: int) -> List[list]:
     if len(chunk) > 0:
         yield chunk
 
+class NotApplied:
+    """
+    Tags and attachments that ``Playbook.apply`` failed to add or remove,
+    they are left out of (or kept in) the saved deployed state accordingly,
+    so the next apply tries again.
+    """
+    __slots__ = ("not_added", "not_removed", "errors", "exception")
+
+    def __init__(self):
+        self.not_added: Dict[str, Union[Tag, PrincipalAttachment, ResourceAttachment]] = dict()
+        self.not_removed: Dict[str, Union[Tag, PrincipalAttachment, ResourceAttachment]] = dict()
+        # the ``Failures`` items of the api responses
+        self.errors: List[dict] = list()
+        # the first error raised by an api call
+        self.exception: Union[Exception, None] = None
+
+    def __bool__(self):
+        return bool(self.not_added) or bool(self.not_removed)
+
+
 class Playbook:
     def __init__(
         self,
         boto_ses: boto3.session.Session = None,
         workspace_dir: str = None,
+        state_backend: 'StateBackend' = None,
+        executor: ApplyExecutor = None,
         _skip_validation: bool = False
     ):
+        """
+        :param state_backend: where the deployed state is loaded from and
+            saved to, default is a :class:`~aws_lf_tag.journal.JournalStateBackend`
+            on ``deployed-<account_id>-<region>.json`` in the workspace
+        :param executor: runs the lakeformation api calls, share one executor
+            between playbooks of the same account to share its rate limits
+        """
+        if executor is None:
+            executor = ApplyExecutor()
+        self.executor: ApplyExecutor = executor
+
         if not _skip_validation:
             assert isinstance(boto_ses, boto3.session.Session)
             workspace_dir = Path(workspace_dir)
@@ -746,39 +1131,94 @@ class Playbook:
 
         if not _skip_validation:
             self.glue_client = boto_ses.client("glue")
-            self.lf_client = boto_ses.client("lakeformation")
+            self.lf_client = boto_ses.client(
+                "lakeformation",
+                config=make_boto_config(executor.max_workers),
+            )
             self.sts_client = boto_ses.client("sts")
             self.region: str = self.boto_ses.region_name
             self.account_id: str = self.sts_client.get_caller_identity()["Account"]
 
             self.workspace_dir: Path = Path(workspace_dir)
             self.p_deployed: Path = Path(self.workspace_dir, f"deployed-{self.account_id}-{self.region}.json")
+            if state_backend is None:
+                from .journal import JournalStateBackend  # journal imports core
+
+                state_backend = JournalStateBackend(self.p_deployed)
+
+        self.state_backend: 'StateBackend' = state_backend
 
         self.deployed_pb: Union[Playbook, None] = None
+        self.not_applied = NotApplied()
+        # None means all tags, see :meth:`subset`
+        self.tag_keys: Union[Set[str], None] = None
 
         self.tags: Dict[str, Tag] = dict()
 
+        # indexes maintained by ``add_tag`` and ``Tag.attach_to_*``
+        self._tag_mapper: Dict[str, Set[str]] = dict()
+        self._pa_mapper: Dict[str, PrincipalAttachment] = dict()
+        self._ra_mapper: Dict[str, ResourceAttachment] = dict()
+
     def add_tag(self, tag: Tag):
+        """
+        Add a tag and index its attachments. Attachments created later by
+        ``Tag.attach_to_principal`` / ``Tag.attach_to_resource`` are indexed
+        as well.
+        """
+        if self.tags.get(tag.id) is tag:
+            return
+        self._index_tag(tag)
+        tag.playbooks.append(self)
+
+    def _index_tag(self, tag: Tag):
+        """
+        Add a tag and index its attachments, without registering this
+        playbook on the tag. For short lived playbooks built from the tags
+        of another one (:meth:`subset`, a state backend merge), so they
+        don't stay referenced by the tags.
+        """
+        existing_tag = self.tags.get(tag.id)
+        if existing_tag is tag:
+            return
+        if existing_tag is not None:
+            self.remove_tag(tag.id)
+
         self.tags[tag.id] = tag
+        try:
+            self._tag_mapper[tag.key].add(tag.value)
+        except KeyError:
+            self._tag_mapper[tag.key] = {tag.value, }
+        self._pa_mapper.update(tag.principal_attachments)
+        self._ra_mapper.update(tag.resource_attachments)
+
+    def remove_tag(self, tag_id: str):
+        """
+        Remove a tag and all its attachments from this playbook.
+        """
+        tag = self.tags.pop(tag_id, None)
+        if tag is None:
+            return
+        if self in tag.playbooks:
+            tag.playbooks.remove(self)
+        values = self._tag_mapper[tag.key]
+        values.discard(tag.value)
+        if len(values) == 0:
+            del self._tag_mapper[tag.key]
+        for pa_id in tag.principal_attachments:
+            self._pa_mapper.pop(pa_id, None)
+        for ra_id in tag.resource_attachments:
+            self._ra_mapper.pop(ra_id, None)
 
     def serialize(self) -> dict:
-        local_now, utc_now = get_local_and_utc_now()
-        try:
-            username = Path.home().name
-        except:
-            username = "unknown"
         data: Dict[
             str, Dict[
                 str, Dict[
                     str, Union[Tag, Principal, Resource]
                 ]
             ]
-        ] = {
-            "deployed_by": username,
-            "deployed_at_local_time": local_now.isoformat(),
-            "deployed_at_utc_time": utc_now.isoformat(),
-            "tags": {},
-        }
+        ] = get_deploy_metadata()
+        data["tags"] = {}
 
         for tag_id, tag in self.tags.items():
             tag_dct = tag.serialize()
@@ -795,15 +1235,30 @@ class Playbook:
         return data
 
     @classmethod
-    def deserialize(cls, data: dict) -> 'Playbook':
+    def deserialize(cls, data: dict, interner: Interner = None) -> 'Playbook':
+        """
+        All principals and resources are interned, each logical entity is a
+        single shared object no matter how many attachments refer to it. Tags
+        hold the attachments of a playbook, so they are never shared with
+        another playbook, even if the same ``interner`` is used.
+        """
+        if interner is None:
+            interner = Interner()
         pb = cls(_skip_validation=True)
         for tag_id, tag_dct in data.get("tags", dict()).items():
             tag = Tag.deserialize(tag_dct)
             for pa_id, pa_dct in tag_dct.get("principal_attachments", dict()).items():
-                tag.principal_attachments[pa_id] = PrincipalAttachment.deserialize(pa_dct)
+                tag.principal_attachments[pa_id] = PrincipalAttachment(
+                    tag=tag,
+                    principal=Principal.deserialize(pa_dct["principal"], interner),
+                    permission=Permission.deserialize(pa_dct["permission"]),
+                )
             for ra_id, ra_dct in tag_dct.get("resource_attachments", dict()).items():
-                tag.resource_attachments[ra_id] = ResourceAttachment.deserialize(ra_dct)
-            pb.tags[tag_id] = tag
+                tag.resource_attachments[ra_id] = ResourceAttachment(
+                    tag=tag,
+                    resource=Resource.deserialize(ra_dct["resource"], interner),
+                )
+            pb.add_tag(tag)
         return pb
 
     @property
@@ -811,29 +1266,28 @@ class Playbook:
         """
         Aggregate tag by key, and put values for the same key into a set.
         """
-        mapper = dict()
-        for tag_id, tag in self.tags.items():
-            try:
-                mapper[tag.key].add(tag.value)
-            except KeyError:
-                mapper[tag.key] = {tag.value, }
-        return mapper
+        return self._tag_mapper
 
     @property
     def principal_attachment_mapper(self) -> Dict[str, PrincipalAttachment]:
-        mapper = dict()
-        for tag_id, tag in self.tags.items():
-            for pa_id, pa in tag.principal_attachments.items():
-                mapper[pa_id] = pa
-        return mapper
+        return self._pa_mapper
 
     @property
     def resource_attachment_mapper(self) -> Dict[str, ResourceAttachment]:
-        mapper = dict()
-        for tag_id, tag in self.tags.items():
-            for ra_id, ra in tag.resource_attachments.items():
-                mapper[ra_id] = ra
-        return mapper
+        return self._ra_mapper
+
+    def _get_attachment_stores(self) -> Tuple['AttachmentStore', 'AttachmentStore']:
+        """
+        Integer encoded attachments of this playbook and the deployed one,
+        sharing one codebook so they can be diffed.
+        """
+        from .store import Codebook, AttachmentStore  # store imports core
+
+        codebook = Codebook()
+        return (
+            AttachmentStore.from_tags(self.tags.values(), codebook),
+            AttachmentStore.from_tags(self.deployed_pb.tags.values(), codebook),
+        )
 
     def apply_tags(
         self,
@@ -850,6 +1304,37 @@ class Playbook:
         if not verbose:
             logger.enable_verbose = False
 
+        (
+            to_create_tag_kwargs,
+            to_update_tag_kwargs,
+            to_delete_tag_kwargs,
+        ) = self._diff_tags()
+
+        self._show_tags_to_create(to_create_tag_kwargs)
+        if dry_run is False:
+            self.executor.run(self.lf_client, [
+                ("create_lf_tag", kwargs) for kwargs in to_create_tag_kwargs
+            ])
+
+        self._show_tags_to_update(to_update_tag_kwargs)
+        if dry_run is False:
+            self.executor.run(self.lf_client, [
+                ("update_lf_tag", kwargs) for kwargs in to_update_tag_kwargs
+            ])
+
+        self._show_tags_to_delete(to_delete_tag_kwargs)
+        if dry_run is False:
+            self.executor.run(self.lf_client, [
+                ("delete_lf_tag", kwargs) for kwargs in to_delete_tag_kwargs
+            ])
+
+        logger.enable_verbose = True
+
+    def _diff_tags(self) -> Tuple[List[dict], List[dict], List[dict]]:
+        """
+        :return: the kwargs of ``create_lf_tag``, ``update_lf_tag`` and
+            ``delete_lf_tag`` calls
+        """
         new_tag_mapper = self.tag_mapper
         deployed_tag_mapper = self.deployed_pb.tag_mapper
 
@@ -898,6 +1383,9 @@ class Playbook:
             if len(values_to_add) >= 1 or len(values_to_delete) >= 1:
                 to_update_tag_kwargs.append(kwargs)
 
+        return to_create_tag_kwargs, to_update_tag_kwargs, to_delete_tag_kwargs
+
+    def _show_tags_to_create(self, to_create_tag_kwargs: List[dict]):
         if len(to_create_tag_kwargs):
             msg = f"{Fore.CYAN}[Info] {Style.RESET_ALL}Create tags ..."
             logger.show(msg)
@@ -908,9 +1396,7 @@ class Playbook:
             msg = f"- values: {kwargs['TagValues']!r}"
             logger.show(msg, indent=1)
 
-            if dry_run is False:
-                self.lf_client.create_lf_tag(**kwargs)
-
+    def _show_tags_to_update(self, to_update_tag_kwargs: List[dict]):
         if len(to_update_tag_kwargs):
             msg = f"{Fore.CYAN}[Info] {Style.RESET_ALL}Update tags ..."
             logger.show(msg)
@@ -927,9 +1413,7 @@ class Playbook:
                 msg = f"{Fore.RED}- values to delete{Fore.RESET}: {kwargs['TagValuesToDelete']!r}"
                 logger.show(msg, indent=1)
 
-            if dry_run is False:
-                self.lf_client.update_lf_tag(**kwargs)
-
+    def _show_tags_to_delete(self, to_delete_tag_kwargs: List[dict]):
         if len(to_delete_tag_kwargs):
             msg = f"{Fore.CYAN}[Info] {Style.RESET_ALL}Delete tags ..."
             logger.show(msg)
@@ -941,10 +1425,6 @@ class Playbook:
                 key=kwargs["TagKey"],
             )
             logger.show(msg)
-            if dry_run is False:
-                self.lf_client.delete_lf_tag(**kwargs)
-
-        logger.enable_verbose = True
 
     def apply_resources(
         self,
@@ -965,75 +1445,197 @@ class Playbook:
         if not verbose:
             logger.enable_verbose = False
 
-        new_ra_mapper = self.resource_attachment_mapper
-        deployed_ra_mapper = self.deployed_pb.resource_attachment_mapper
-
-        (
-            to_add_ra_id_set,
-            to_remove_ra_id_set,
-            _,
-        ) = get_diff_and_inter(new_ra_mapper, deployed_ra_mapper)
-
-        to_add_kwargs_list: List[dict] = list()
-        to_remove_kwargs_list: List[dict] = list()
+        to_add_calls, to_remove_calls = self._diff_resources()
 
-        for ra_id in to_add_ra_id_set:
-            ra = new_ra_mapper[ra_id]
-            kwargs = dict(
-                CatalogId=self.account_id,
-                LFTags=[
-                    dict(
-                        CatalogId=self.account_id,
-                        TagKey=ra.tag.key,
-                        TagValues=[ra.tag.value, ],
-                    )
-                ]
+        self._show_resource_calls(to_add_calls, attach=True)
+        if dry_run is False:
+            responses = self.executor.run(self.lf_client, [
+                ("add_lf_tags_to_resource", call.to_kwargs(self.account_id))
+                for call in to_add_calls
+            ])
+            self._add_resource_failures(
+                to_add_calls, responses, self.not_applied.not_added,
             )
-            kwargs["Resource"] = {
-                ra.resource.get_add_remove_lf_tags_arg_name: ra.resource.get_add_remove_lf_tags_arg_value
-            }
-            to_add_kwargs_list.append(kwargs)
 
-        for ra_id in to_remove_ra_id_set:
-            ra = deployed_ra_mapper[ra_id]
-            kwargs = dict(
-                CatalogId=self.account_id,
-                LFTags=[
-                    dict(
-                        CatalogId=self.account_id,
-                        TagKey=ra.tag.key,
-                        TagValues=[ra.tag.value, ],
-                    )
-                ]
+        self._show_resource_calls(to_remove_calls, attach=False)
+        if dry_run is False:
+            responses = self.executor.run(self.lf_client, [
+                ("remove_lf_tags_from_resource", call.to_kwargs(self.account_id))
+                for call in to_remove_calls
+            ])
+            self._add_resource_failures(
+                to_remove_calls, responses, self.not_applied.not_removed,
             )
-            kwargs["Resource"] = {
-                ra.resource.get_add_remove_lf_tags_arg_name: ra.resource.get_add_remove_lf_tags_arg_value
-            }
-            to_remove_kwargs_list.append(kwargs)
 
-        if len(to_add_kwargs_list):
-            msg = f"{Fore.CYAN}[Info] {Style.RESET_ALL}Attach tags ..."
-            logger.show(msg)
-
-        for kwargs in to_add_kwargs_list:
-            msg = f"{Fore.GREEN}+ [Attach Tag] {Style.RESET_ALL}{{{kwargs['LFTags'][0]['TagKey']!r}: {kwargs['LFTags'][0]['TagValues'][0]}}} to {kwargs['Resource']}"
-            logger.show(msg)
+        logger.enable_verbose = True
 
-            if dry_run is False:
-                self.lf_client.add_lf_tags_to_resource(**kwargs)
+    def _diff_resources(
+        self,
+        by_tag_key: bool = False,
+    ) -> Tuple[List['ResourceCall'], List['ResourceCall']]:
+        """
+        :param by_tag_key: one tag key per call, see
+            :func:`~aws_lf_tag.planner.plan_resource_calls`
+        :return: the planned ``add_lf_tags_to_resource`` and
+            ``remove_lf_tags_from_resource`` calls
+        """
+        # planner and store import core
+        from .planner import plan_resource_calls
+        from . import store
+
+        if store.np is None:
+            # the mappers are already maintained, no encoding needed
+            new_mapper = self.resource_attachment_mapper
+            deployed_mapper = self.deployed_pb.resource_attachment_mapper
+            to_add_ra_list = [
+                ra for ra_id, ra in new_mapper.items()
+                if ra_id not in deployed_mapper
+            ]
+            to_remove_ra_list = [
+                ra for ra_id, ra in deployed_mapper.items()
+                if ra_id not in new_mapper
+            ]
+        else:
+            new_store, deployed_store = self._get_attachment_stores()
+            (
+                to_add_ra_list,
+                to_remove_ra_list,
+            ) = new_store.diff_resource_attachments(deployed_store)
+        return (
+            plan_resource_calls(to_add_ra_list, by_tag_key=by_tag_key),
+            plan_resource_calls(to_remove_ra_list, by_tag_key=by_tag_key),
+        )
 
-        if len(to_remove_kwargs_list):
-            msg = f"{Fore.CYAN}[Info] {Style.RESET_ALL}Detach tags ..."
+    def _show_resource_calls(self, calls: List['ResourceCall'], attach: bool):
+        if len(calls):
+            if attach:
+                msg = f"{Fore.CYAN}[Info] {Style.RESET_ALL}Attach tags ..."
+            else:
+                msg = f"{Fore.CYAN}[Info] {Style.RESET_ALL}Detach tags ..."
             logger.show(msg)
 
-        for kwargs in to_remove_kwargs_list:
-            msg = f"{Fore.RED}- [Detach Tag] {Style.RESET_ALL}{{{kwargs['LFTags'][0]['TagKey']!r}: {kwargs['LFTags'][0]['TagValues'][0]}}} from {kwargs['Resource']}"
+        for call in calls:
+            if attach:
+                msg = f"{Fore.GREEN}+ [Attach Tag] {Style.RESET_ALL}{call.describe_tags()} to {call.resource_arg}"
+            else:
+                msg = f"{Fore.RED}- [Detach Tag] {Style.RESET_ALL}{call.describe_tags()} from {call.resource_arg}"
             logger.show(msg)
 
-            if dry_run is False:
-                self.lf_client.remove_lf_tags_from_resource(**kwargs)
+    def _to_permission_entry(
+        self,
+        key: GrantKey,
+        permission_set: PermissionSet,
+        msg_prefix: str,
+    ) -> dict:
+        """
+        Build a ``batch_grant_permissions`` / ``batch_revoke_permissions``
+        entry.
+        """
+        principal_id, tag_key, tag_value, resource_type = key
+        entry = dict(
+            Id=str(uuid.uuid4()),
+            Principal=dict(
+                DataLakePrincipalIdentifier=principal_id,
+            ),
+            Resource=dict(
+                LFTagPolicy=dict(
+                    CatalogId=self.account_id,
+                    ResourceType=resource_type,
+                    Expression=[
+                        dict(
+                            TagKey=tag_key,
+                            TagValues=[tag_value, ],
+                        )
+                    ]
+                )
+            ),
+        )
+        if permission_set.mask:
+            entry["Permissions"] = permission_set.permissions
+        if permission_set.grantable_mask:
+            entry["PermissionsWithGrantOption"] = permission_set.permissions_with_grant_option
+
+        permissions_in_message = ", ".join([
+            permission.id
+            for permission in permission_set.to_permissions(resource_type)
+        ])
+        msgs = [
+            f"{msg_prefix}{Style.RESET_ALL}{principal_id} {{{tag_key!r}: {tag_value!r}}} {permissions_in_message}"
+        ]
+        entry["_msgs"] = msgs
+        return entry
 
-        logger.enable_verbose = True
+    def _add_resource_failures(
+        self,
+        calls: List['ResourceCall'],
+        responses: List[dict],
+        not_applied: Dict[str, Union['PrincipalAttachment', 'ResourceAttachment']],
+    ):
+        """
+        Record the resource attachments of the failed ``LFTags`` of
+        ``add_lf_tags_to_resource`` / ``remove_lf_tags_from_resource`` as
+        not applied.
+        """
+        for call, res in zip(calls, responses):
+            for failure in res.get("Failures", list()):
+                lf_tag = failure.get("LFTag", dict())
+                error = failure.get("Error", dict())
+                self.not_applied.errors.append(failure)
+                msg = (
+                    f"{Fore.RED}[Error] {Style.RESET_ALL}{call.resource_arg} "
+                    f"{lf_tag.get('TagKey')!r} "
+                    f"{error.get('ErrorCode')}: {error.get('ErrorMessage')}"
+                )
+                logger.show(msg)
+                tag_ids = {
+                    f"{lf_tag.get('TagKey')}{DELIMITER}{tag_value}"
+                    for tag_value in lf_tag.get("TagValues", list())
+                }
+                for ra in call.attachments:
+                    if ra.tag.id in tag_ids:
+                        not_applied[ra.id] = ra
+
+    def _add_permission_failures(
+        self,
+        failures: List[dict],
+        entry_mapper: Dict[str, Tuple[GrantKey, PermissionSet]],
+        pa_mapper: Dict[str, 'PrincipalAttachment'],
+        not_applied: Dict[str, Union['PrincipalAttachment', 'ResourceAttachment']],
+    ):
+        """
+        Record the principal attachments of the failed batch entries as not
+        applied.
+        """
+        for failure in failures:
+            key, permission_set = entry_mapper[failure["RequestEntry"]["Id"]]
+            principal_id, tag_key, tag_value, resource_type = key
+            error = failure.get("Error", dict())
+            self.not_applied.errors.append(failure)
+            msg = (
+                f"{Fore.RED}[Error] {Style.RESET_ALL}{principal_id} "
+                f"{{{tag_key!r}: {tag_value!r}}} "
+                f"{error.get('ErrorCode')}: {error.get('ErrorMessage')}"
+            )
+            logger.show(msg)
+            self._add_permission_entry(key, permission_set, pa_mapper, not_applied)
+
+    def _add_permission_entry(
+        self,
+        key: GrantKey,
+        permission_set: PermissionSet,
+        pa_mapper: Dict[str, 'PrincipalAttachment'],
+        not_applied: Dict[str, Union['PrincipalAttachment', 'ResourceAttachment']],
+    ):
+        """
+        Record the principal attachments of one batch entry as not applied.
+        """
+        principal_id, tag_key, tag_value, resource_type = key
+        tag_id = f"{tag_key}{DELIMITER}{tag_value}"
+        for permission in permission_set.to_permissions(resource_type):
+            pa_id = DELIMITER.join([tag_id, principal_id, permission.id])
+            pa = pa_mapper.get(pa_id)
+            if pa is not None:
+                not_applied[pa_id] = pa
 
     def apply_principals(
         self,
@@ -1049,184 +1651,517 @@ class Playbook:
         if not verbose:
             logger.enable_verbose = False
 
-        new_pa_mapper = self.principal_attachment_mapper
-        deployed_pa_mapper = self.deployed_pb.principal_attachment_mapper
-
         (
-            to_grant_pa_id_set,
-            to_revoke_pa_id_set,
-            _,
-        ) = get_diff_and_inter(new_pa_mapper, deployed_pa_mapper)
+            to_grant_entry_list,
+            to_revoke_entry_list,
+            entry_mapper,
+        ) = self._diff_principals()
 
-        # we use batch grant / revoke API
-        to_grant_entry_list: List[dict] = list()
-        to_revoke_entry_list: List[dict] = list()
+        self._show_permission_entries(to_grant_entry_list, grant=True)
+        if dry_run is False:
+            failures = self.executor.run_batches(
+                self.lf_client,
+                "batch_grant_permissions",
+                self.account_id,
+                to_grant_entry_list,
+            )
+            self._add_permission_failures(
+                failures, entry_mapper, self._pa_mapper, self.not_applied.not_added,
+            )
 
-        # aggregate by principal and tag and resource type
-        to_grant_pa_by_principal_and_tag_and_resource_type: Dict[str, List[PrincipalAttachment]] = dict()
-        for pa_id in to_grant_pa_id_set:
-            pa = new_pa_mapper[pa_id]
-            key = f"{pa.principal.id}{DELIMITER}{pa.tag.id}{DELIMITER}{pa.permission.resource_type}"
-            try:
-                to_grant_pa_by_principal_and_tag_and_resource_type[key].append(pa)
-            except KeyError:
-                to_grant_pa_by_principal_and_tag_and_resource_type[key] = [pa, ]
-
-        for _, pa_list in to_grant_pa_by_principal_and_tag_and_resource_type.items():
-            pa = pa_list[0]
-            entry = dict(
-                Id=str(uuid.uuid4()),
-                Principal=dict(
-                    DataLakePrincipalIdentifier=pa.principal.id,
-                ),
-                Resource=dict(
-                    LFTagPolicy=dict(
-                        CatalogId=self.account_id,
-                        ResourceType=pa.permission.resource_type,
-                        Expression=[
-                            dict(
-                                TagKey=pa.tag.key,
-                                TagValues=[pa.tag.value, ],
-                            )
-                        ]
-                    )
-                ),
+        self._show_permission_entries(to_revoke_entry_list, grant=False)
+        if dry_run is False:
+            failures = self.executor.run_batches(
+                self.lf_client,
+                "batch_revoke_permissions",
+                self.account_id,
+                to_revoke_entry_list,
             )
-            permissions = [
-                pa.permission.permission
-                for pa in pa_list
-                if pa.permission.grantable is False
-            ]
-            permissions_with_grant_option = [
-                pa.permission.permission
-                for pa in pa_list
-                if pa.permission.grantable is True
-            ]
-            if len(permissions):
-                entry["Permissions"] = permissions
-            if len(permissions_with_grant_option):
-                entry["PermissionsWithGrantOption"] = permissions_with_grant_option
-
-            permissions_in_message = ", ".join([
-                pa.permission.id
-                for pa in pa_list
-            ])
-            msgs = [
-                f"{Fore.GREEN}- [Grant Permission] {Style.RESET_ALL}{pa.principal.id} {{{pa.tag.key!r}: {pa.tag.value!r}}} {permissions_in_message}"
-            ]
-            entry["_msgs"] = msgs
-            to_grant_entry_list.append(entry)
-
-        # aggregate by principal and tag and resource type
-        to_revoke_pa_by_principal_and_tag_and_resource_type: Dict[str, List[PrincipalAttachment]] = dict()
-        for pa_id in to_revoke_pa_id_set:
-            pa = deployed_pa_mapper[pa_id]
-            key = f"{pa.principal.id}{DELIMITER}{pa.tag.id}{DELIMITER}{pa.permission.resource_type}"
-            try:
-                to_revoke_pa_by_principal_and_tag_and_resource_type[key].append(pa)
-            except KeyError:
-                to_revoke_pa_by_principal_and_tag_and_resource_type[key] = [pa, ]
-
-        for _, pa_list in to_revoke_pa_by_principal_and_tag_and_resource_type.items():
-            pa = pa_list[0]
-            entry = dict(
-                Id=str(uuid.uuid4()),
-                Principal=dict(
-                    DataLakePrincipalIdentifier=pa.principal.id,
-                ),
-                Resource=dict(
-                    LFTagPolicy=dict(
-                        CatalogId=self.account_id,
-                        ResourceType=pa.permission.resource_type,
-                        Expression=[
-                            dict(
-                                TagKey=pa.tag.key,
-                                TagValues=[pa.tag.value, ],
-                            )
-                        ]
-                    )
-                ),
+            self._add_permission_failures(
+                failures, entry_mapper,
+                self.deployed_pb.principal_attachment_mapper,
+                self.not_applied.not_removed,
             )
-            permissions = [
-                pa.permission.permission
-                for pa in pa_list
-                if pa.permission.grantable is False
-            ]
-            permissions_with_grant_option = [
-                pa.permission.permission
-                for pa in pa_list
-                if pa.permission.grantable is True
-            ]
-            if len(permissions):
-                entry["Permissions"] = permissions
-            if len(permissions_with_grant_option):
-                entry["PermissionsWithGrantOption"] = permissions_with_grant_option
-
-            permissions_in_message = ", ".join([
-                pa.permission.id
-                for pa in pa_list
-            ])
-            msgs = [
-                f"{Fore.RED}- [Revoke Permission] {Style.RESET_ALL}{pa.principal.id} {{{pa.tag.key!r}: {pa.tag.value!r}}} {permissions_in_message}"
-            ]
-            entry["_msgs"] = msgs
-            to_revoke_entry_list.append(entry)
 
-        if len(to_grant_entry_list):
-            msg = f"{Fore.CYAN}[Info] {Style.RESET_ALL}Grant permissions ..."
-            logger.show(msg)
+        logger.enable_verbose = True
 
-        for to_grant_entry_sub_list in grouper_list(to_grant_entry_list, 20):
-            for entry in to_grant_entry_sub_list:
-                msgs = entry.pop("_msgs")
-                for msg in msgs:
-                    logger.show(msg)
+    def _diff_principals(self) -> Tuple[
+        List[dict],
+        List[dict],
+        Dict[str, Tuple[GrantKey, PermissionSet]],
+    ]:
+        """
+        :return: the ``batch_grant_permissions`` entries, the
+            ``batch_revoke_permissions`` entries, and entry id -> (key,
+            permission set) to find the attachments of a failed entry
+        """
+        new_groups = group_permissions(self.tags.values())
+        deployed_groups = group_permissions(self.deployed_pb.tags.values())
+        empty = PermissionSet()
 
-            if dry_run is False:
-                self.lf_client.batch_grant_permissions(
-                    CatalogId=self.account_id,
-                    Entries=to_grant_entry_sub_list
+        # we use batch grant / revoke API
+        to_grant_entry_list: List[dict] = list()
+        to_revoke_entry_list: List[dict] = list()
+        entry_mapper: Dict[str, Tuple[GrantKey, PermissionSet]] = dict()
+
+        # diff by principal and tag and resource type
+        for key, new_permission_set in new_groups.items():
+            to_grant = new_permission_set - deployed_groups.get(key, empty)
+            if to_grant:
+                entry = self._to_permission_entry(
+                    key, to_grant, f"{Fore.GREEN}- [Grant Permission] ",
+                )
+                entry_mapper[entry["Id"]] = (key, to_grant)
+                to_grant_entry_list.append(entry)
+
+        for key, deployed_permission_set in deployed_groups.items():
+            to_revoke = deployed_permission_set - new_groups.get(key, empty)
+            if to_revoke:
+                entry = self._to_permission_entry(
+                    key, to_revoke, f"{Fore.RED}- [Revoke Permission] ",
                 )
+                entry_mapper[entry["Id"]] = (key, to_revoke)
+                to_revoke_entry_list.append(entry)
 
-        if len(to_revoke_entry_list):
-            msg = f"{Fore.CYAN}[Info] {Style.RESET_ALL}Revoke permissions ..."
+        return to_grant_entry_list, to_revoke_entry_list, entry_mapper
+
+    def _show_permission_entries(self, entries: List[dict], grant: bool):
+        """
+        Show and remove the ``_msgs`` of the entries.
+        """
+        if len(entries):
+            if grant:
+                msg = f"{Fore.CYAN}[Info] {Style.RESET_ALL}Grant permissions ..."
+            else:
+                msg = f"{Fore.CYAN}[Info] {Style.RESET_ALL}Revoke permissions ..."
             logger.show(msg)
 
-        for to_revoke_entry_sub_list in grouper_list(to_revoke_entry_list, 20):
-            for entry in to_revoke_entry_sub_list:
-                msgs = entry.pop("_msgs")
-                for msg in msgs:
-                    logger.show(msg)
+        for entry in entries:
+            for msg in entry.pop("_msgs"):
+                logger.show(msg)
 
-            if dry_run is False:
-                self.lf_client.batch_revoke_permissions(
-                    CatalogId=self.account_id,
-                    Entries=to_revoke_entry_sub_list
-                )
+    def apply_dag(
+        self,
+        phases: Iterable[int] = None,
+        verbose=True,
+        dry_run=False,
+        raise_error=True,
+    ):
+        """
+        Apply tags, resources and principals as one dependency graph of api
+        calls, for each tag key:
+
+        1. create the tag / add the new values
+        2. attach the tag to resources, grant permissions
+        3. detach the tag from resources, revoke permissions
+        4. delete the old values / delete the tag
+
+        Every call whose dependencies are done runs right away, so tag keys
+        don't wait for each other, and a value is only deleted after it is
+        detached and revoked everywhere.
+
+        When a call raises, the calls depending on it are not made, the
+        others still are. The tags and attachments of the failed and
+        skipped calls are recorded in :attr:`not_applied`.
+
+        :param phases: the phases to diff, see :mod:`aws_lf_tag.digest`,
+            default is all
+        :param raise_error: raise the first error once all calls are done,
+            if False it is only recorded in ``not_applied.exception``
+        """
+        # digest imports core
+        from .digest import PHASE_TAGS, PHASE_RESOURCES, PHASE_PRINCIPALS
+
+        if phases is None:
+            phases = {PHASE_TAGS, PHASE_RESOURCES, PHASE_PRINCIPALS}
+
+        if not verbose:
+            logger.enable_verbose = False
+
+        to_create_tag_kwargs, to_update_tag_kwargs, to_delete_tag_kwargs = [], [], []
+        to_add_calls, to_remove_calls = [], []
+        to_grant_entry_list, to_revoke_entry_list, entry_mapper = [], [], dict()
+        if PHASE_TAGS in phases:
+            (
+                to_create_tag_kwargs,
+                to_update_tag_kwargs,
+                to_delete_tag_kwargs,
+            ) = self._diff_tags()
+        if PHASE_RESOURCES in phases:
+            to_add_calls, to_remove_calls = self._diff_resources(by_tag_key=True)
+        if PHASE_PRINCIPALS in phases:
+            (
+                to_grant_entry_list,
+                to_revoke_entry_list,
+                entry_mapper,
+            ) = self._diff_principals()
+
+        self._show_tags_to_create(to_create_tag_kwargs)
+        self._show_tags_to_update(to_update_tag_kwargs)
+        self._show_resource_calls(to_add_calls, attach=True)
+        self._show_permission_entries(to_grant_entry_list, grant=True)
+        self._show_permission_entries(to_revoke_entry_list, grant=False)
+        self._show_resource_calls(to_remove_calls, attach=False)
+        self._show_tags_to_delete(to_delete_tag_kwargs)
 
         logger.enable_verbose = True
+        if dry_run:
+            return
+
+        dag = Dag()
+        client, executor, catalog_id = self.lf_client, self.executor, self.account_id
+
+        def call(api: str, kwargs: dict):
+            return lambda: executor.call(client, api, kwargs)
+
+        def run_batches(api: str, entries: List[dict]):
+            return lambda: executor.run_batches(client, api, catalog_id, entries)
+
+        # tag key -> the nodes of each step
+        add_tag_nodes: Dict[str, Node] = dict()
+        use_tag_nodes: Dict[str, List[Node]] = dict()
+        release_tag_nodes: Dict[str, List[Node]] = dict()
+
+        def add_node(id: str, func, tag_keys: Iterable[str], step: int) -> Node:
+            deps = list()
+            for tag_key in tag_keys:
+                if step >= 2 and tag_key in add_tag_nodes:
+                    deps.append(add_tag_nodes[tag_key])
+                if step >= 3:
+                    deps.extend(use_tag_nodes.get(tag_key, list()))
+                if step >= 4:
+                    deps.extend(release_tag_nodes.get(tag_key, list()))
+            node = dag.add(id, func, deps)
+            for tag_key in tag_keys:
+                if step == 1:
+                    add_tag_nodes[tag_key] = node
+                elif step == 2:
+                    use_tag_nodes.setdefault(tag_key, list()).append(node)
+                elif step == 3:
+                    release_tag_nodes.setdefault(tag_key, list()).append(node)
+            return node
+
+        def get_entry_tag_keys(entries: List[dict]) -> Set[str]:
+            return {entry_mapper[entry["Id"]][0][1] for entry in entries}
+
+        def chunk_entries(entries: List[dict]) -> List[List[dict]]:
+            """
+            Batches of 20 entries, one tag key per batch, like the resource
+            calls.
+            """
+            by_key: Dict[str, List[dict]] = dict()
+            for entry in entries:
+                by_key.setdefault(entry_mapper[entry["Id"]][0][1], list()).append(entry)
+            return [
+                chunk
+                for key_entries in by_key.values()
+                for chunk in grouper_list(key_entries, 20)
+            ]
 
-    def load_deployed_playbook(self):
-        if self.p_deployed.exists():
-            self.deployed_pb = Playbook.deserialize(
-                json.loads(self.p_deployed.read_text())
+        # 1. create tags, add values
+        # (node, tag key, values)
+        add_value_nodes: List[Tuple[Node, str, List[str]]] = list()
+        for kwargs in to_create_tag_kwargs:
+            tag_key = kwargs["TagKey"]
+            node = add_node(f"create_lf_tag {tag_key}", call("create_lf_tag", kwargs), [tag_key], 1)
+            add_value_nodes.append((node, tag_key, kwargs["TagValues"]))
+        to_delete_value_kwargs = list()
+        for kwargs in to_update_tag_kwargs:
+            tag_key = kwargs["TagKey"]
+            if "TagValuesToAdd" in kwargs:
+                add_kwargs = dict(kwargs)
+                add_kwargs.pop("TagValuesToDelete", None)
+                node = add_node(f"update_lf_tag add {tag_key}", call("update_lf_tag", add_kwargs), [tag_key], 1)
+                add_value_nodes.append((node, tag_key, kwargs["TagValuesToAdd"]))
+            if "TagValuesToDelete" in kwargs:
+                delete_kwargs = dict(kwargs)
+                delete_kwargs.pop("TagValuesToAdd", None)
+                to_delete_value_kwargs.append(delete_kwargs)
+
+        # 2. attach, grant
+        add_nodes = [
+            add_node(
+                f"add_lf_tags_to_resource {ind}",
+                call("add_lf_tags_to_resource", resource_call.to_kwargs(catalog_id)),
+                {tag.key for tag in resource_call.tags},
+                2,
             )
-        else:
-            self.deployed_pb = Playbook(_skip_validation=True)
-            self.p_deployed.write_text(
-                json.dumps(self.deployed_pb.serialize(), indent=4)
+            for ind, resource_call in enumerate(to_add_calls)
+        ]
+        grant_nodes = list()
+        grant_chunks = chunk_entries(to_grant_entry_list)
+        for ind, entries in enumerate(grant_chunks):
+            grant_nodes.append(add_node(
+                f"batch_grant_permissions {ind}",
+                run_batches("batch_grant_permissions", entries),
+                get_entry_tag_keys(entries),
+                2,
+            ))
+
+        # 3. revoke, detach
+        revoke_nodes = list()
+        revoke_chunks = chunk_entries(to_revoke_entry_list)
+        for ind, entries in enumerate(revoke_chunks):
+            revoke_nodes.append(add_node(
+                f"batch_revoke_permissions {ind}",
+                run_batches("batch_revoke_permissions", entries),
+                get_entry_tag_keys(entries),
+                3,
+            ))
+        remove_nodes = [
+            add_node(
+                f"remove_lf_tags_from_resource {ind}",
+                call("remove_lf_tags_from_resource", resource_call.to_kwargs(catalog_id)),
+                {tag.key for tag in resource_call.tags},
+                3,
             )
+            for ind, resource_call in enumerate(to_remove_calls)
+        ]
+
+        # 4. delete values, delete tags
+        def get_failed_values(tag_key: str) -> Set[str]:
+            """
+            Values of the tag key still attached or granted somewhere,
+            because a revoke / detach in step 3 failed.
+            """
+            values = set()
+            for node in release_tag_nodes.get(tag_key, list()):
+                if node.status != STATUS_DONE:
+                    continue
+                if isinstance(node.result, dict):  # remove_lf_tags_from_resource
+                    for failure in node.result.get("Failures", list()):
+                        lf_tag = failure.get("LFTag", dict())
+                        if lf_tag.get("TagKey") == tag_key:
+                            values.update(lf_tag.get("TagValues", list()))
+                else:  # batch_revoke_permissions
+                    for failure in node.result:
+                        key = entry_mapper[failure["RequestEntry"]["Id"]][0]
+                        if key[1] == tag_key:
+                            values.add(key[2])
+            return values
+
+        def delete_values(kwargs: dict):
+            def func():
+                failed_values = get_failed_values(kwargs["TagKey"])
+                values = [
+                    value
+                    for value in kwargs["TagValuesToDelete"]
+                    if value not in failed_values
+                ]
+                if values:
+                    return executor.call(
+                        client, "update_lf_tag", dict(kwargs, TagValuesToDelete=values),
+                    )
+
+            return func
+
+        def delete_tag(kwargs: dict):
+            def func():
+                if not get_failed_values(kwargs["TagKey"]):
+                    return executor.call(client, "delete_lf_tag", kwargs)
+
+            return func
+
+        # the values with a failed revoke / detach are not deleted, they
+        # stay in the saved state with the attachments not removed
+        # (node, tag key, values)
+        delete_value_nodes: List[Tuple[Node, str, List[str]]] = list()
+        for kwargs in to_delete_value_kwargs:
+            tag_key = kwargs["TagKey"]
+            node = add_node(f"update_lf_tag delete {tag_key}", delete_values(kwargs), [tag_key], 4)
+            delete_value_nodes.append((node, tag_key, kwargs["TagValuesToDelete"]))
+        for kwargs in to_delete_tag_kwargs:
+            tag_key = kwargs["TagKey"]
+            node = add_node(f"delete_lf_tag {tag_key}", delete_tag(kwargs), [tag_key], 4)
+            delete_value_nodes.append((node, tag_key, [
+                tag.value
+                for tag in self.deployed_pb.tags.values()
+                if tag.key == tag_key
+            ]))
+
+        # the other calls still run when one fails, record what is done
+        # so the state can be saved before the error is raised
+        dag.run(max_workers=executor.max_workers, raise_error=False)
+        not_added, not_removed = self.not_applied.not_added, self.not_applied.not_removed
+
+        for node, tag_key, values in add_value_nodes:
+            if node.status != STATUS_DONE:
+                for value in values:
+                    tag = self.tags[f"{tag_key}{DELIMITER}{value}"]
+                    not_added[tag.id] = tag
+        for node, tag_key, values in delete_value_nodes:
+            # if the call is made, only the values still in use are not
+            # deleted, else none of them is
+            if node.status == STATUS_DONE and node.result is not None:
+                values = get_failed_values(tag_key).intersection(values)
+            for value in values:
+                tag = self.deployed_pb.tags[f"{tag_key}{DELIMITER}{value}"]
+                not_removed[tag.id] = tag
+
+        for calls, nodes, not_applied in [
+            (to_add_calls, add_nodes, not_added),
+            (to_remove_calls, remove_nodes, not_removed),
+        ]:
+            done_calls, responses = list(), list()
+            for resource_call, node in zip(calls, nodes):
+                if node.status == STATUS_DONE:
+                    done_calls.append(resource_call)
+                    responses.append(node.result)
+                else:
+                    for ra in resource_call.attachments:
+                        not_applied[ra.id] = ra
+            self._add_resource_failures(done_calls, responses, not_applied)
+
+        for chunks, nodes, pa_mapper, not_applied in [
+            (grant_chunks, grant_nodes, self._pa_mapper, not_added),
+            (
+                revoke_chunks, revoke_nodes,
+                self.deployed_pb.principal_attachment_mapper, not_removed,
+            ),
+        ]:
+            for entries, node in zip(chunks, nodes):
+                if node.status == STATUS_DONE:
+                    self._add_permission_failures(
+                        node.result, entry_mapper, pa_mapper, not_applied,
+                    )
+                else:
+                    for entry in entries:
+                        key, permission_set = entry_mapper[entry["Id"]]
+                        self._add_permission_entry(
+                            key, permission_set, pa_mapper, not_applied,
+                        )
+
+        self.not_applied.exception = dag.get_error()
+        if raise_error and self.not_applied.exception is not None:
+            raise self.not_applied.exception
+
+    def get_applied_playbook(self) -> 'Playbook':
+        """
+        What is actually deployed after an apply: this playbook, minus the
+        tags and attachments that failed to be added, plus the ones that
+        failed to be removed. It is this playbook itself if nothing failed.
+        """
+        if not self.not_applied:
+            return self
+        not_added = self.not_applied.not_added
+        pb = Playbook(_skip_validation=True)
+        pb.tag_keys = self.tag_keys
+        tags: Dict[str, Tag] = dict()
+
+        def copy_tag(tag: Tag) -> Tag:
+            try:
+                return tags[tag.id]
+            except KeyError:
+                new_tag = Tag(key=tag.key, value=tag.value)
+                tags[tag.id] = new_tag
+                return new_tag
+
+        def copy_attachment(attachment: Union[PrincipalAttachment, ResourceAttachment]):
+            new_tag = copy_tag(attachment.tag)
+            if isinstance(attachment, PrincipalAttachment):
+                new_tag.principal_attachments[attachment.id] = PrincipalAttachment(
+                    tag=new_tag,
+                    principal=attachment.principal,
+                    permission=attachment.permission,
+                )
+            else:
+                new_tag.resource_attachments[attachment.id] = ResourceAttachment(
+                    tag=new_tag,
+                    resource=attachment.resource,
+                )
+
+        for tag in self.tags.values():
+            # the tag value is not created, nor any of its attachments
+            if tag.id in not_added:
+                continue
+            copy_tag(tag)
+            for pa_id, pa in tag.principal_attachments.items():
+                if pa_id not in not_added:
+                    copy_attachment(pa)
+            for ra_id, ra in tag.resource_attachments.items():
+                if ra_id not in not_added:
+                    copy_attachment(ra)
+        for item in self.not_applied.not_removed.values():
+            if isinstance(item, Tag):
+                copy_tag(item)
+            else:
+                copy_attachment(item)
+        for tag in tags.values():
+            pb.add_tag(tag)
+        return pb
+
+    def load_deployed_playbook(self, tag_keys: Iterable[str] = None):
+        self.deployed_pb = self.state_backend.load(tag_keys=tag_keys)
+
+    def subset(self, tag_keys: Iterable[str]) -> 'Playbook':
+        """
+        A playbook that only has the tags of the given keys, it shares the
+        clients, the state backend and the tag objects with this playbook.
+        """
+        tag_keys = set(tag_keys)
+        pb = copy.copy(self)
+        pb.tag_keys = tag_keys
+        pb.deployed_pb = None
+        pb.not_applied = NotApplied()
+        pb.tags = dict()
+        pb._tag_mapper = dict()
+        pb._pa_mapper = dict()
+        pb._ra_mapper = dict()
+        for tag in self.tags.values():
+            if tag.key in tag_keys:
+                pb._index_tag(tag)
+        return pb
 
     def apply(
         self,
         verbose=True,
         dry_run=False,
+        tag_keys: Iterable[str] = None,
+        force=False,
     ):
-        self.load_deployed_playbook()
-        self.apply_tags(verbose=verbose, dry_run=dry_run)
-        self.apply_resources(verbose=verbose, dry_run=dry_run)
-        self.apply_principals(verbose=verbose, dry_run=dry_run)
+        """
+        :param tag_keys: only apply the tags of these keys, other tags and
+            their deployed state are left untouched
+        :param force: by default only the tag keys and the phases whose
+            digest differs from the deployed digest are applied, use
+            ``force=True`` to diff everything against the deployed state.
+            A deployed state without digests, a version 1 state for
+            example, is always diffed in full.
+        """
+        # digest imports core
+        from .digest import (
+            compute_digests, get_changed_phases,
+            PHASE_TAGS, PHASE_RESOURCES, PHASE_PRINCIPALS,
+        )
+
+        self.not_applied = NotApplied()
+        phases = {PHASE_TAGS, PHASE_RESOURCES, PHASE_PRINCIPALS}
+        # empty deployed digests are unknown, not "no tag key deployed",
+        # the deployed tag keys not in this playbook would be missed
+        deployed_digests = dict() if force else self.state_backend.load_digests()
+        if len(deployed_digests):
+            changed = get_changed_phases(
+                compute_digests(self),
+                deployed_digests,
+                tag_keys=tag_keys,
+            )
+            if len(changed) == 0:
+                if verbose:
+                    msg = f"{Fore.CYAN}[Info] {Style.RESET_ALL}Nothing changed ..."
+                    logger.show(msg)
+                return
+            phases = set()
+            for phase_list in changed.values():
+                phases.update(phase_list)
+            tag_keys = changed
+        pb = self if tag_keys is None else self.subset(tag_keys)
+        pb.load_deployed_playbook(tag_keys=pb.tag_keys)
+        pb.apply_dag(phases, verbose=verbose, dry_run=dry_run, raise_error=False)
+        # what failed in the subset
+        self.not_applied = pb.not_applied
 
-        # pb = self.from
         if dry_run is False:
-            self.p_deployed.write_text(json.dumps(self.serialize(), indent=4))
+            # what succeeded is saved even if a call raised
+            pb.state_backend.save(pb.get_applied_playbook(), pb.deployed_pb)
+            if pb.not_applied.exception is not None:
+                raise pb.not_applied.exception
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""
+Crawl the Glue Data Catalog.
+
+Every ``get_databases`` / ``get_tables`` page is followed via ``NextToken``.
+Databases are listed first, then each ``get_tables`` page is a task on a
+bounded thread pool. When a page comes back with a ``NextToken``, the next
+page of the same database is submitted right away, so a database with many
+pages doesn't block the others.
+
+boto3 low level clients are thread safe, so one client is shared by all
+workers.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Tuple, Iterable
+
+from .core import Database, Table, Column
+
+DEFAULT_MAX_WORKERS = 10
+
+
+def get_databases(
+    glue_client,
+    catalog_id: str,
+) -> List[dict]:
+    """
+    Call ``get_databases`` api recursively to get all glue databases.
+
+    Ref: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/glue.html#Glue.Client.get_databases
+    """
+    next_token = None
+    db_dct_list: List[dict] = list()
+    while 1:
+        kwargs = dict(
+            CatalogId=catalog_id,
+            MaxResults=1000,
+        )
+        if next_token:
+            kwargs["NextToken"] = next_token
+        res = glue_client.get_databases(**kwargs)
+        db_dct_list.extend(res.get("DatabaseList", list()))
+        next_token = res.get("NextToken")
+        if not next_token:
+            break
+    return db_dct_list
+
+
+def get_tables_page(
+    glue_client,
+    catalog_id: str,
+    database_name: str,
+    next_token: str = None,
+) -> Tuple[List[dict], str]:
+    """
+    Call ``get_tables`` api once, returns the table list and the next token.
+
+    Ref: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/glue.html#Glue.Client.get_tables
+    """
+    kwargs = dict(
+        CatalogId=catalog_id,
+        DatabaseName=database_name,
+        MaxResults=1000,
+    )
+    if next_token:
+        kwargs["NextToken"] = next_token
+    res = glue_client.get_tables(**kwargs)
+    return res.get("TableList", list()), res.get("NextToken")
+
+
+def iter_catalog(
+    glue_client,
+    catalog_id: str,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> Iterable[Tuple[dict, List[dict]]]:
+    """
+    Crawl all tables of all databases concurrently.
+
+    Yield ``(database_dict, table_dict_list)`` tuples in the order of
+    ``get_databases`` response, as soon as a database and all databases
+    before it are fully crawled.
+
+    :param glue_client: boto3 glue client, or anything has the same
+        ``get_databases`` and ``get_tables`` method
+    :param catalog_id: aws account id
+    :param max_workers: number of concurrent ``get_tables`` calls
+    """
+    db_dct_list = get_databases(glue_client, catalog_id)
+    if len(db_dct_list) == 0:
+        return
+
+    tb_dct_list_by_index: Dict[int, List[dict]] = {
+        ind: list()
+        for ind in range(len(db_dct_list))
+    }
+    finished: Dict[int, bool] = dict()
+    next_to_yield = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = dict()
+        for ind, db_dct in enumerate(db_dct_list):
+            future = executor.submit(
+                get_tables_page, glue_client, catalog_id, db_dct["Name"],
+            )
+            futures[future] = ind
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                ind = futures.pop(future)
+                tb_dct_list, next_token = future.result()
+                tb_dct_list_by_index[ind].extend(tb_dct_list)
+                if next_token:
+                    future = executor.submit(
+                        get_tables_page,
+                        glue_client,
+                        catalog_id,
+                        db_dct_list[ind]["Name"],
+                        next_token,
+                    )
+                    futures[future] = ind
+                else:
+                    finished[ind] = True
+
+            while finished.pop(next_to_yield, False):
+                yield (
+                    db_dct_list[next_to_yield],
+                    tb_dct_list_by_index.pop(next_to_yield),
+                )
+                next_to_yield += 1
+
+
+def to_database(
+    account_id: str,
+    region: str,
+    db_dct: dict,
+    tb_dct_list: List[dict],
+) -> Database:
+    """
+    Convert ``get_databases`` / ``get_tables`` response data into a
+    :class:`~aws_lf_tag.core.Database` object, with all tables and columns
+    in ``database.t`` and ``table.c``.
+    """
+    database = Database(
+        account_id=account_id,
+        region=region,
+        name=db_dct["Name"],
+    )
+    for tb_dct in tb_dct_list:
+        table = Table(name=tb_dct["Name"], database=database)
+        for col_dct in tb_dct.get("StorageDescriptor", dict()).get("Columns", list()):
+            column = Column(name=col_dct["Name"], table=table)
+            table.c[column.name] = column
+        database.t[table.name] = table
+    return database
+
+
+def iter_databases(
+    glue_client,
+    account_id: str,
+    region: str,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> Iterable[Database]:
+    """
+    Crawl the entire Glue Data Catalog of an account / region, yield
+    :class:`~aws_lf_tag.core.Database` objects as soon as they are crawled.
+    """
+    for db_dct, tb_dct_list in iter_catalog(
+        glue_client, account_id, max_workers=max_workers,
+    ):
+        yield to_database(account_id, region, db_dct, tb_dct_list)
+
+
+def crawl_catalog(
+    glue_client,
+    account_id: str,
+    region: str,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> List[Database]:
+    """
+    Crawl the entire Glue Data Catalog of an account / region.
+    """
+    return list(iter_databases(
+        glue_client, account_id, region, max_workers=max_workers,
+    ))
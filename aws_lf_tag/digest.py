@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""
+Content digest of a playbook, used by ``Playbook.apply`` to skip the work
+when nothing changed since the last deploy.
+
+There is one digest per tag key, made of three parts, one per apply phase:
+
+- tags: the values of the key, for ``apply_tags``
+- resources: the resource attachments, for ``apply_resources``
+- principals: the principal attachments, for ``apply_principals``
+
+Each part is the sum (mod 2^64) of a 64 bits blake2b hash of every member
+id. A sum doesn't depend on the order, so no sorting is needed and the
+digest is the same however the playbook was built.
+"""
+
+from hashlib import blake2b
+from typing import List, Dict, Iterable
+
+from .core import Playbook
+
+PHASE_TAGS = 0
+PHASE_RESOURCES = 1
+PHASE_PRINCIPALS = 2
+
+_mask = (1 << 64) - 1
+
+# tag key -> [tags digest, resources digest, principals digest]
+Digests = Dict[str, List[str]]
+
+
+def _hash(s: str) -> int:
+    return int.from_bytes(blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _sum(ids: Iterable[str]) -> int:
+    total = 0
+    for id in ids:
+        total += _hash(id)
+    return total & _mask
+
+
+def compute_digests(pb: Playbook) -> Digests:
+    """
+    Digests of every tag key in a playbook.
+    """
+    sums: Dict[str, List[int]] = dict()
+    for tag in pb.tags.values():
+        try:
+            sum_list = sums[tag.key]
+        except KeyError:
+            sum_list = [0, 0, 0]
+            sums[tag.key] = sum_list
+        sum_list[PHASE_TAGS] += _hash(tag.id)
+        sum_list[PHASE_RESOURCES] += _sum(tag.resource_attachments)
+        sum_list[PHASE_PRINCIPALS] += _sum(tag.principal_attachments)
+    return {
+        key: [f"{value & _mask:016x}" for value in sum_list]
+        for key, sum_list in sums.items()
+    }
+
+
+def merge_digests(
+    digests: Digests,
+    new_digests: Digests,
+    tag_keys: Iterable[str] = None,
+) -> Digests:
+    """
+    Replace the digests of ``tag_keys`` (all keys if None) with
+    ``new_digests``.
+    """
+    if tag_keys is None:
+        return dict(new_digests)
+    merged = {
+        key: value
+        for key, value in digests.items()
+        if key not in set(tag_keys)
+    }
+    merged.update(new_digests)
+    return merged
+
+
+def get_changed_phases(
+    digests: Digests,
+    deployed_digests: Digests,
+    tag_keys: Iterable[str] = None,
+) -> Dict[str, List[int]]:
+    """
+    :return: tag key -> list of phases whose digest differs
+    """
+    if tag_keys is None:
+        tag_keys = set(digests).union(deployed_digests)
+    changed = dict()
+    missing = [None, None, None]
+    for key in tag_keys:
+        new = digests.get(key, missing)
+        old = deployed_digests.get(key, missing)
+        phases = [
+            phase
+            for phase in (PHASE_TAGS, PHASE_RESOURCES, PHASE_PRINCIPALS)
+            if new[phase] != old[phase]
+        ]
+        if phases:
+            changed[key] = phases
+    return changed
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+
+"""
+Run Lake Formation write api calls on a thread pool.
+
+The calls of one apply step (create tags, attach tags, grant permissions,
+...) are independent from each other, so they run concurrently. The steps
+still run one after another, :meth:`ApplyExecutor.run` returns only when
+all calls of the step are done.
+
+Every api belongs to a family, all calls of a family share one
+:class:`TokenBucket`, whichever thread or playbook makes them, so the
+account stays under the Lake Formation quotas. boto3 low level clients are
+thread safe, the client just needs a connection pool as big as the worker
+pool, see :func:`make_boto_config`.
+
+Throttling and concurrent modification errors are retried with a jittered
+exponential backoff. The number of calls in flight is controlled by an
+:class:`AimdLimiter`: it is halved when a call is throttled and grows back
+by about one per round of successful calls. Per api counters are in
+:attr:`ApplyExecutor.stats`.
+"""
+
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Any, Callable
+
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+
+DEFAULT_MAX_WORKERS = 10
+
+API_FAMILY_TAG = "tag"
+API_FAMILY_RESOURCE = "resource"
+API_FAMILY_PERMISSION = "permission"
+
+api_family_mapper = {
+    "create_lf_tag": API_FAMILY_TAG,
+    "update_lf_tag": API_FAMILY_TAG,
+    "delete_lf_tag": API_FAMILY_TAG,
+    "add_lf_tags_to_resource": API_FAMILY_RESOURCE,
+    "remove_lf_tags_from_resource": API_FAMILY_RESOURCE,
+    "batch_grant_permissions": API_FAMILY_PERMISSION,
+    "batch_revoke_permissions": API_FAMILY_PERMISSION,
+}
+
+THROTTLE_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+}
+
+RETRYABLE_ERROR_CODES = THROTTLE_ERROR_CODES | {
+    "ConcurrentModificationException",
+    "InternalServiceException",
+}
+
+# api family -> (calls per second, burst)
+DEFAULT_RATES: Dict[str, Tuple[float, int]] = {
+    API_FAMILY_TAG: (5, 5),
+    API_FAMILY_RESOURCE: (20, 20),
+    API_FAMILY_PERMISSION: (10, 10),
+}
+
+
+class TokenBucket:
+    """
+    A thread safe token bucket, ``rate`` tokens are added per second, up to
+    ``capacity`` tokens.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Any] = time.sleep,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self, n: int = 1) -> float:
+        """
+        Take ``n`` tokens, block until they are available.
+
+        :return: the seconds waited
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self.updated_at) * self.rate,
+            )
+            self.updated_at = now
+            # reserve the tokens now, the bucket goes negative and the
+            # next caller waits longer, so waiters are served in order
+            self.tokens -= n
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        if wait:
+            self.sleep(wait)
+        return wait
+
+
+class AimdLimiter:
+    """
+    Limit the number of calls in flight, additive increase on success,
+    multiplicative decrease on throttle.
+
+    The calls in flight when the service starts throttling are usually all
+    throttled together, so the limit is decreased once per window: a
+    throttled call acquired before the last decrease is ignored, it saw the
+    same congestion.
+
+    :param max_limit: the limit never goes above it, usually the number of
+        workers
+    :param min_limit: the limit never goes below it
+    :param decrease_factor: the limit is multiplied by it on throttle
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        decrease_factor: float = 0.5,
+    ):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.decrease_factor = decrease_factor
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        # incremented on each decrease
+        self.generation = 0
+        self.condition = threading.Condition()
+
+    def acquire(self) -> int:
+        """
+        :return: the current generation, give it back to :meth:`release`
+        """
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+            return self.generation
+
+    def release(self, throttled: bool = False, generation: int = None):
+        """
+        :param generation: returned by :meth:`acquire`, None is the current
+            generation
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                if generation is None or generation == self.generation:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self.generation += 1
+            else:
+                # + 1 after about ``limit`` successful calls
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+class ApiStats:
+    """
+    Counters of one api, ``retried_entries`` and ``failed_entries`` are for
+    the entries in the ``Failures`` of the batch apis.
+    """
+    __slots__ = (
+        "calls", "retries", "throttles", "failures",
+        "retried_entries", "failed_entries",
+    )
+
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.throttles = 0
+        self.failures = 0
+        self.retried_entries = 0
+        self.failed_entries = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def get_error_code(e: Exception) -> str:
+    if isinstance(e, ClientError):
+        return e.response.get("Error", dict()).get("Code", "")
+    return ""
+
+
+def is_retryable(e: Exception) -> bool:
+    if isinstance(e, (ConnectionError, HTTPClientError)):
+        return True
+    return get_error_code(e) in RETRYABLE_ERROR_CODES
+
+
+def is_throttle(e: Exception) -> bool:
+    return get_error_code(e) in THROTTLE_ERROR_CODES
+
+
+def make_boto_config(max_workers: int = DEFAULT_MAX_WORKERS) -> Config:
+    """
+    A botocore config with a connection pool for ``max_workers`` threads,
+    the default pool of 10 connections would make the extra workers wait.
+
+    botocore doesn't retry, :class:`ApplyExecutor` does, so the throttles
+    are seen by the :class:`AimdLimiter` and counted.
+    """
+    return Config(
+        max_pool_connections=max(10, max_workers),
+        retries=dict(mode="standard", total_max_attempts=1),
+    )
+
+
+class ApplyExecutor:
+    """
+    :param max_workers: number of concurrent api calls, 1 runs every call
+        on the calling thread
+    :param rates: api family -> (calls per second, burst), override
+        :data:`DEFAULT_RATES`
+    :param max_attempts: max number of attempts of a call, including the
+        first one
+    :param base_delay: the backoff before the n-th retry is a random
+        number between 0 and ``base_delay * 2 ** (n - 1)``
+    :param max_delay: cap of the backoff
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        rates: Dict[str, Tuple[float, int]] = None,
+        max_attempts: int = 8,
+        base_delay: float = 0.2,
+        max_delay: float = 20.0,
+        sleep: Callable[[float], Any] = time.sleep,
+    ):
+        self.max_workers = max_workers
+        rates = {**DEFAULT_RATES, **(rates or dict())}
+        self.buckets: Dict[str, TokenBucket] = {
+            family: TokenBucket(rate=rate, capacity=capacity)
+            for family, (rate, capacity) in rates.items()
+        }
+        self.limiter = AimdLimiter(max_limit=max_workers)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.random = random.Random()
+        self.stats: Dict[str, ApiStats] = dict()
+        self.stats_lock = threading.Lock()
+
+    def _get_stats(self, api: str) -> ApiStats:
+        with self.stats_lock:
+            try:
+                return self.stats[api]
+            except KeyError:
+                stats = ApiStats()
+                self.stats[api] = stats
+                return stats
+
+    def _incr(self, stats: ApiStats, name: str, n: int = 1):
+        with self.stats_lock:
+            setattr(stats, name, getattr(stats, name) + n)
+
+    def get_backoff(self, attempt: int) -> float:
+        """
+        :param attempt: the attempt that just failed, starts from 1
+        """
+        cap = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return self.random.uniform(0, cap)
+
+    def call(self, client, api: str, kwargs: dict) -> dict:
+        """
+        Make one api call, retry on throttling and transient errors.
+        """
+        stats = self._get_stats(api)
+        bucket = self.buckets.get(api_family_mapper.get(api))
+        method = getattr(client, api)
+        attempt = 0
+        while True:
+            attempt += 1
+            if bucket is not None:
+                bucket.acquire()
+            generation = self.limiter.acquire()
+            self._incr(stats, "calls")
+            throttled = False
+            try:
+                return method(**kwargs)
+            except Exception as e:
+                throttled = is_throttle(e)
+                if throttled:
+                    self._incr(stats, "throttles")
+                if not is_retryable(e) or attempt >= self.max_attempts:
+                    self._incr(stats, "failures")
+                    raise
+                self._incr(stats, "retries")
+            finally:
+                self.limiter.release(throttled=throttled, generation=generation)
+            self.sleep(self.get_backoff(attempt))
+
+    def run_batches(
+        self,
+        client,
+        api: str,
+        catalog_id: str,
+        entries: List[dict],
+        batch_size: int = 20,
+    ) -> List[dict]:
+        """
+        Send ``batch_grant_permissions`` / ``batch_revoke_permissions``
+        entries in batches. The entries in the ``Failures`` of the responses
+        with a retryable error code are sent again, and only them, with a
+        backoff.
+
+        :return: the ``Failures`` items of the entries that are not applied
+        """
+        stats = self._get_stats(api)
+        failures: List[dict] = list()
+        pending = entries
+        attempt = 0
+        while pending:
+            attempt += 1
+            calls = [
+                (api, dict(CatalogId=catalog_id, Entries=pending[i:i + batch_size]))
+                for i in range(0, len(pending), batch_size)
+            ]
+            entry_mapper = {entry["Id"]: entry for entry in pending}
+            pending = list()
+            for res in self.run(client, calls):
+                for failure in res.get("Failures", list()):
+                    error_code = failure.get("Error", dict()).get("ErrorCode", "")
+                    entry = entry_mapper[failure["RequestEntry"]["Id"]]
+                    if (
+                        error_code in RETRYABLE_ERROR_CODES
+                        and attempt < self.max_attempts
+                    ):
+                        pending.append(entry)
+                    else:
+                        failures.append(failure)
+            if pending:
+                self._incr(stats, "retried_entries", len(pending))
+                self.sleep(self.get_backoff(attempt))
+        self._incr(stats, "failed_entries", len(failures))
+        return failures
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        :return: api name -> counters, for example
+            ``{"add_lf_tags_to_resource": {"calls": 12, "retries": 2, "throttles": 2, "failures": 0}}``
+        """
+        with self.stats_lock:
+            return {api: stats.to_dict() for api, stats in self.stats.items()}
+
+    def run(
+        self,
+        client,
+        calls: List[Tuple[str, dict]],
+    ) -> List[dict]:
+        """
+        Run ``(api_name, kwargs)`` calls and wait for all of them.
+
+        :return: the responses, in the same order as ``calls``. The first
+            error is raised, on a pool it is raised after the other calls
+            are done.
+        """
+        if self.max_workers <= 1 or len(calls) <= 1:
+            return [self.call(client, api, kwargs) for api, kwargs in calls]
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(calls)),
+        ) as executor:
+            futures = [
+                executor.submit(self.call, client, api, kwargs)
+                for api, kwargs in calls
+            ]
+        return [future.result() for future in futures]
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""
+Generate resource / principal modules for many account / region pairs in
+parallel.
+
+Each target is an existing ``boto3.session.Session`` or a
+``(profile_name, region_name)`` tuple. Only tuples can be used with the
+process pool, because a boto session can't be sent to another process.
+
+The principal module is per account, so it is generated only once per
+account, by the first target of that account.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List, Tuple, Union, Iterable
+
+import attr
+import boto3
+
+from .gen_code import gen_resource, gen_principal
+
+Target = Union[boto3.session.Session, Tuple[str, str]]
+
+
+@attr.define
+class GenReport:
+    """
+    Timing and result of one ``gen_resource`` / ``gen_principal`` call.
+
+    :param kind: "resource" or "principal"
+    :param path: path of the generated file, None if failed
+    :param elapsed: seconds
+    :param error: error message, None if succeeded
+    """
+    kind: str = attr.ib()
+    account_id: str = attr.ib()
+    region: str = attr.ib()
+    path: Union[str, None] = attr.ib(default=None)
+    elapsed: float = attr.ib(default=0.0)
+    error: Union[str, None] = attr.ib(default=None)
+
+
+def _to_boto_ses(target: Target) -> boto3.session.Session:
+    if isinstance(target, tuple):
+        profile_name, region_name = target
+        return boto3.session.Session(
+            profile_name=profile_name,
+            region_name=region_name,
+        )
+    return target
+
+
+def _get_region(target: Target) -> str:
+    if isinstance(target, tuple):
+        return target[1]
+    return target.region_name
+
+
+def _get_account_id(target: Target) -> Tuple[Union[str, None], Union[str, None]]:
+    """
+    :return: ``(account_id, None)``, or ``(None, error message)`` if the
+        target can't be resolved
+    """
+    try:
+        boto_ses = _to_boto_ses(target)
+        return boto_ses.client("sts").get_caller_identity()["Account"], None
+    except Exception as e:
+        return None, f"{e.__class__.__name__}: {e}"
+
+
+def _run(
+    func,
+    kind: str,
+    boto_ses,
+    account_id: str,
+    workspace_dir: str,
+    kwargs: dict,
+) -> GenReport:
+    report = GenReport(
+        kind=kind,
+        account_id=account_id,
+        region=boto_ses.region_name,
+    )
+    st = time.time()
+    try:
+        report.path = str(func(boto_ses, workspace_dir, **kwargs))
+    except Exception as e:
+        report.error = f"{e.__class__.__name__}: {e}"
+    report.elapsed = time.time() - st
+    return report
+
+
+def _gen_target(
+    target: Target,
+    account_id: str,
+    workspace_dir: str,
+    resource_kwargs: Union[dict, None],
+    principal_kwargs: Union[dict, None],
+) -> List[GenReport]:
+    """
+    Generate code for one target. boto session is not thread safe, so all
+    work of one target happens in one worker.
+    """
+    boto_ses = _to_boto_ses(target)
+    reports = list()
+    if resource_kwargs is not None:
+        reports.append(_run(
+            gen_resource, "resource", boto_ses, account_id,
+            workspace_dir, resource_kwargs,
+        ))
+    if principal_kwargs is not None:
+        reports.append(_run(
+            gen_principal, "principal", boto_ses, account_id,
+            workspace_dir, principal_kwargs,
+        ))
+    return reports
+
+
+def gen_all(
+    targets: Iterable[Target],
+    workspace_dir: str,
+    resource: bool = True,
+    principal: bool = True,
+    max_workers: int = None,
+    use_process: bool = False,
+    resource_kwargs: dict = None,
+    principal_kwargs: dict = None,
+) -> List[GenReport]:
+    """
+    Run :func:`~aws_lf_tag.gen_code.gen_resource` and
+    :func:`~aws_lf_tag.gen_code.gen_principal` for many account / region
+    pairs in parallel, a failed target doesn't stop the others.
+
+    :param targets: list of ``boto3.session.Session`` or
+        ``(profile_name, region_name)`` tuple
+    :param resource: generate resource modules
+    :param principal: generate principal modules, once per account
+    :param max_workers: pool size, default is one worker per target
+    :param use_process: use a process pool instead of a thread pool, only
+        ``(profile_name, region_name)`` targets are allowed
+    :param resource_kwargs: extra arguments for ``gen_resource``
+    :param principal_kwargs: extra arguments for ``gen_principal``
+
+    :return: one report per generated file, in target order
+    """
+    targets = list(targets)
+    if len(targets) == 0:
+        return list()
+    if use_process:
+        for target in targets:
+            if not isinstance(target, tuple):
+                raise TypeError(
+                    "only (profile_name, region_name) target can be used "
+                    "with the process pool"
+                )
+    if max_workers is None:
+        max_workers = len(targets)
+    if resource_kwargs is None:
+        resource_kwargs = dict()
+    if principal_kwargs is None:
+        principal_kwargs = dict()
+
+    # resolve account id first, it is a cheap call, and tells which target
+    # generates the principal module of an account
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        resolved = list(executor.map(_get_account_id, targets))
+
+    seen_accounts = set()
+    pool_class = ProcessPoolExecutor if use_process else ThreadPoolExecutor
+    with pool_class(max_workers=max_workers) as executor:
+        futures = list()
+        for target, (account_id, error) in zip(targets, resolved):
+            # the target is skipped, with a failed report for each file
+            # it would have generated
+            if error is not None:
+                futures.append([
+                    GenReport(
+                        kind=kind,
+                        account_id=account_id,
+                        region=_get_region(target),
+                        error=error,
+                    )
+                    for kind, enabled in [("resource", resource), ("principal", principal)]
+                    if enabled
+                ])
+                continue
+            gen_principal_for_this_target = (
+                principal and account_id not in seen_accounts
+            )
+            seen_accounts.add(account_id)
+            futures.append(executor.submit(
+                _gen_target,
+                target,
+                account_id,
+                workspace_dir,
+                resource_kwargs if resource else None,
+                principal_kwargs if gen_principal_for_this_target else None,
+            ))
+        reports: List[GenReport] = list()
+        for future in futures:
+            if isinstance(future, list):
+                reports.extend(future)
+            else:
+                reports.extend(future.result())
+    return reports
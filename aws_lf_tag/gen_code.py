@@ -1,98 +1,254 @@
 # -*- coding: utf-8 -*-
 
+import os
 from pathlib import Path
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Iterable
 
 from jinja2 import Template
 
+from . import boto_utils
 from .core import (
     Resource, Database, Table, Column,
     Principal, IamUser, IamRole,
 )
+from .crawler import iter_catalog, iter_databases, DEFAULT_MAX_WORKERS
+from .snapshot import CatalogSnapshot
+from .bincat import write_binary_catalog
 from rich import print
 
 dir_here = Path(__file__).absolute().parent
 tpl_resource = Path(dir_here, "resource.tpl")
 tpl_principal = Path(dir_here, "principal.tpl")
+tpl_resource_package = Path(dir_here, "resource_package.tpl")
 
 
 # tpl_action = os.path.join(dir_here, "resource.tpl")
 
 
-def gen_resource(boto_ses, workspace_dir: str):
+def render_to_file(
+    tpl: Template,
+    path: Path,
+    **kwargs
+):
+    """
+    Render the template and stream the output to file chunk by chunk,
+    the whole content is never held in memory.
+
+    The output goes to a temp file first then is renamed, an error in the
+    middle (for example a Glue api error while the crawl is streamed)
+    leaves the previous file untouched.
+    """
+    path = Path(path)
+    path_tmp = path.with_name(path.name + ".tmp")
+    try:
+        with open(path_tmp, "w", encoding="utf-8") as f:
+            for chunk in tpl.generate(**kwargs):
+                f.write(chunk)
+    except BaseException:
+        if path_tmp.exists():
+            path_tmp.unlink()
+        raise
+    os.replace(path_tmp, path)
+
+
+def write_resource_package(
+    database_list: Iterable[Database],
+    account_id: str,
+    region: str,
+    dir_package: Path,
+    lazy: bool = False,
+):
+    """
+    Write the resource package, one ``db_<database>.py`` submodule per
+    database plus a lightweight ``__init__.py``. Submodules of databases
+    no longer exist are removed.
+
+    Each submodule is written as soon as its database arrives, so
+    ``database_list`` can be a generator.
+    """
+    dir_package.mkdir(parents=True, exist_ok=True)
+    tpl = Template(source=tpl_resource.read_text(encoding="utf-8"))
+    submodule_list: List[Tuple[str, str]] = list()
+    for database in database_list:
+        submodule_name = f"db_{database.attr_safe_name}"
+        submodule_list.append((database.fullname, submodule_name))
+        render_to_file(
+            tpl,
+            Path(dir_package, f"{submodule_name}.py"),
+            database_list=[database, ],
+            account_id=account_id,
+            region=region,
+            lazy=lazy,
+        )
+
+    filenames = {f"{submodule_name}.py" for _, submodule_name in submodule_list}
+    for p in dir_package.glob("db_*.py"):
+        if p.name not in filenames:
+            p.unlink()
+
+    tpl = Template(source=tpl_resource_package.read_text(encoding="utf-8"))
+    render_to_file(
+        tpl,
+        Path(dir_package, "__init__.py"),
+        submodule_list=submodule_list,
+        account_id=account_id,
+        region=region,
+    )
+
+
+def gen_resource(
+    boto_ses,
+    workspace_dir: str,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    incremental: bool = False,
+    lazy: bool = False,
+    binary: bool = False,
+    split: bool = False,
+) -> Path:
+    """
+    Crawl all Glue databases, tables and columns, generate the
+    ``resource_<account_id>_<region>.py`` module.
+
+    :param max_workers: number of concurrent ``get_tables`` api calls
+    :param incremental: if True, persist a catalog snapshot next to the
+        generated module as ``resource_<account_id>_<region>.snapshot.json``.
+        Next time, only tables whose ``CreateTime`` / ``UpdateTime`` moved
+        are re-parsed, and the module is only re-rendered if the catalog,
+        ``lazy`` or ``split`` changed.
+    :param lazy: if True, generate a lazy module, objects are only created
+        on first access, see :mod:`aws_lf_tag.lazy`
+    :param binary: if True, also dump the catalog to a binary
+        ``resource_<account_id>_<region>.lfcat`` file, it can be loaded
+        with :class:`aws_lf_tag.bincat.BinaryCatalog`
+    :param split: if True, generate a ``resource_<account_id>_<region>``
+        package instead, with one ``db_<database>`` submodule per database.
+        The package ``__init__`` only imports a submodule when a resource
+        of that database is accessed.
+
+    Databases are rendered and streamed to disk as they arrive from the
+    crawler, so the memory usage doesn't grow with the catalog size (unless
+    ``binary`` is used, it needs the whole catalog).
+
+    :return: path of the generated module, or package directory if ``split``
+    """
     sts_client = boto_ses.client("sts")
     glue_client = boto_ses.client("glue")
 
     account_id = sts_client.get_caller_identity()["Account"]
     region_name = boto_ses.region_name
 
-    database_list: List[Database] = list()
-    db_response = glue_client.get_databases(
-        CatalogId=account_id,
-        MaxResults=1000,
-    )
-    for db_dct in db_response.get("DatabaseList", []):
-        database = Database(
+    basename = f"resource_{account_id}_{region_name.replace('-', '_')}"
+    if split:
+        output_path = Path(workspace_dir, basename)
+    else:
+        output_path = Path(workspace_dir, f"{basename}.py")
+    binary_path = Path(workspace_dir, f"{basename}.lfcat")
+
+    if incremental:
+        snapshot_path = Path(workspace_dir, f"{basename}.snapshot.json")
+        if snapshot_path.exists():
+            snapshot = CatalogSnapshot.read(snapshot_path)
+        else:
+            snapshot = CatalogSnapshot(account_id=account_id, region=region_name)
+        diff = snapshot.update(
+            iter_catalog(glue_client, account_id, max_workers=max_workers)
+        )
+        render_options = dict(lazy=lazy, split=split)
+        options_changed = snapshot.render_options != render_options
+        snapshot.render_options = render_options
+        if (
+            diff.is_empty
+            and options_changed is False
+            and output_path.exists()
+            and (binary is False or binary_path.exists())
+        ):
+            return output_path
+        database_list = snapshot.iter_databases()
+    else:
+        database_list = iter_databases(
+            glue_client=glue_client,
             account_id=account_id,
             region=region_name,
-            name=db_dct["Name"],
+            max_workers=max_workers,
         )
 
-        tb_response = glue_client.get_tables(
-            CatalogId=account_id,
-            DatabaseName=db_dct["Name"],
-            MaxResults=1000,
-        )
-
-        for tb_dct in tb_response.get("TableList", []):
-            table = Table(
-                name=tb_dct["Name"],
-                database=database,
-            )
-
-            for col_dct in tb_dct["StorageDescriptor"].get("Columns", []):
-                column = Column(name=col_dct["Name"], table=table)
-                table.c[column.name] = column
-
-            database.t[table.name] = table
+    if binary:
+        database_list: List[Database] = list(database_list)
 
-        database_list.append(database)
-
-    tpl = Template(source=tpl_resource.read_text(encoding="utf-8"))
-    content = tpl.render(database_list=database_list)
-
-    filename = f"resource_{account_id}_{region_name.replace('-', '_')}.py"
-    output_path = Path(workspace_dir, filename)
-    output_path.write_text(content, encoding="utf-8")
-
-
-def gen_principal(boto_ses, workspace_dir: str):
+    if split:
+        write_resource_package(
+            database_list=database_list,
+            account_id=account_id,
+            region=region_name,
+            dir_package=output_path,
+            lazy=lazy,
+        )
+    else:
+        tpl = Template(source=tpl_resource.read_text(encoding="utf-8"))
+        render_to_file(
+            tpl,
+            output_path,
+            database_list=database_list,
+            account_id=account_id,
+            region=region_name,
+            lazy=lazy,
+        )
+    if binary:
+        write_binary_catalog(database_list, binary_path)
+    # only once the module is written, else the next run would see no
+    # change and keep a module that failed to render
+    if incremental:
+        snapshot.write(snapshot_path)
+    return output_path
+
+
+def gen_principal(
+    boto_ses,
+    workspace_dir: str,
+    lazy: bool = False,
+    path_prefix: str = "/",
+) -> Path:
+    """
+    List all IAM users and roles, generate the ``principal_<account_id>.py``
+    module. Users and roles are listed concurrently.
+
+    :param lazy: if True, generate a lazy module, objects are only created
+        on first access, see :mod:`aws_lf_tag.lazy`
+    :param path_prefix: only include users and roles under this IAM path,
+        for example ``/data-team/``
+
+    :return: path of the generated module
+    """
     sts_client = boto_ses.client("sts")
     iam_client = boto_ses.client("iam")
 
     account_id = sts_client.get_caller_identity()["Account"]
-    region_name = boto_ses.region_name
-
-    iam_user_list: List[IamUser] = list()
-    iam_role_list: List[IamRole] = list()
 
-    list_users_response = iam_client.list_users(
-        MaxItems=1000,
-    )
-    for user_dct in list_users_response.get("Users", []):
-        iam_user = IamUser(arn=user_dct["Arn"])
-        iam_user_list.append(iam_user)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        user_future = executor.submit(
+            boto_utils.list_iam_users, iam_client, path_prefix,
+        )
+        role_future = executor.submit(
+            boto_utils.list_iam_roles, iam_client, path_prefix,
+        )
+        iam_user_list: List[IamUser] = [
+            IamUser(arn=user_dct["Arn"])
+            for user_dct in user_future.result()
+        ]
+        iam_role_list: List[IamRole] = [
+            IamRole(arn=role_dct["Arn"])
+            for role_dct in role_future.result()
+        ]
 
-    list_roles_response = iam_client.list_roles(
-        MaxItems=1000,
-    )
-    for role_dct in list_roles_response.get("Roles", []):
-        iam_role = IamRole(arn=role_dct["Arn"])
-        iam_role_list.append(iam_role)
-        
     tpl = Template(source=tpl_principal.read_text(encoding="utf-8"))
-    content = tpl.render(iam_user_list=iam_user_list, iam_role_list=iam_role_list)
-
     filename = f"principal_{account_id}.py"
     output_path = Path(workspace_dir, filename)
-    output_path.write_text(content, encoding="utf-8")
+    render_to_file(
+        tpl,
+        output_path,
+        iam_user_list=iam_user_list,
+        iam_role_list=iam_role_list,
+        lazy=lazy,
+    )
+    return output_path
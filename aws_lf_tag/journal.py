@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+"""
+Append only deployed state journal.
+
+The state is a snapshot file in the :mod:`aws_lf_tag.state` format plus a
+journal file next to it, ``<snapshot>.journal``. Each save appends one
+json line per change between the deployed playbook and the new one::
+
+    {"op": "add_tag", "tag": ["Admin", "y"]}
+    {"op": "remove_resource_attachment", "tag": ["Admin", "y"], "resource": {...}}
+    {"op": "add_principal_attachment", "tag": ["Admin", "y"], "principal": "arn:...", "permission": "Select"}
+    {"op": "digests", "digests": {...}, "tag_keys": null}
+
+so a small apply against a big state only writes a few lines. Loading
+replays the journal on top of the snapshot. When the journal grows too big,
+it is compacted: the full state is written into a new snapshot and the
+journal is deleted. A snapshot in an older state format, a version 1
+``deployed-*.json`` for example, is compacted by the first save, so it is
+upgraded right away.
+
+Every record is idempotent, replaying records that are already in the
+snapshot (a crash in the middle of a compaction) gives the same state. A
+truncated last line (a crash in the middle of an append) is ignored.
+"""
+
+import json
+from pathlib import Path
+from typing import List, Union, Iterable
+
+from .core import (
+    Interner, Principal, Resource, Permission, Tag, Playbook,
+    get_diff_and_inter,
+)
+from .digest import Digests, compute_digests, merge_digests
+from .state import (
+    STATE_VERSION, JsonStateBackend, write_state, read_digests,
+    read_state_version,
+)
+
+OP_ADD_TAG = "add_tag"
+OP_REMOVE_TAG = "remove_tag"
+OP_ADD_RESOURCE_ATTACHMENT = "add_resource_attachment"
+OP_REMOVE_RESOURCE_ATTACHMENT = "remove_resource_attachment"
+OP_ADD_PRINCIPAL_ATTACHMENT = "add_principal_attachment"
+OP_REMOVE_PRINCIPAL_ATTACHMENT = "remove_principal_attachment"
+# not a change, the digests after a save, see :mod:`aws_lf_tag.digest`
+OP_DIGESTS = "digests"
+
+
+def diff_records(pb: Playbook, deployed_pb: Playbook) -> List[dict]:
+    """
+    Journal records that turn ``deployed_pb`` into ``pb``.
+    """
+    records = list()
+
+    to_add_tag_ids, to_remove_tag_ids, _ = get_diff_and_inter(pb.tags, deployed_pb.tags)
+    # removing a tag removes its attachments too
+    for tag_id in to_remove_tag_ids:
+        tag = deployed_pb.tags[tag_id]
+        records.append(dict(op=OP_REMOVE_TAG, tag=[tag.key, tag.value]))
+    for tag_id in to_add_tag_ids:
+        tag = pb.tags[tag_id]
+        records.append(dict(op=OP_ADD_TAG, tag=[tag.key, tag.value]))
+
+    new_ra_mapper = pb.resource_attachment_mapper
+    deployed_ra_mapper = deployed_pb.resource_attachment_mapper
+    to_add_ra_ids, to_remove_ra_ids, _ = get_diff_and_inter(new_ra_mapper, deployed_ra_mapper)
+    for ra_id in to_remove_ra_ids:
+        ra = deployed_ra_mapper[ra_id]
+        if ra.tag.id not in to_remove_tag_ids:
+            records.append(dict(
+                op=OP_REMOVE_RESOURCE_ATTACHMENT,
+                tag=[ra.tag.key, ra.tag.value],
+                resource=ra.resource.serialize(),
+            ))
+    for ra_id in to_add_ra_ids:
+        ra = new_ra_mapper[ra_id]
+        records.append(dict(
+            op=OP_ADD_RESOURCE_ATTACHMENT,
+            tag=[ra.tag.key, ra.tag.value],
+            resource=ra.resource.serialize(),
+        ))
+
+    new_pa_mapper = pb.principal_attachment_mapper
+    deployed_pa_mapper = deployed_pb.principal_attachment_mapper
+    to_add_pa_ids, to_remove_pa_ids, _ = get_diff_and_inter(new_pa_mapper, deployed_pa_mapper)
+    for pa_id in to_remove_pa_ids:
+        pa = deployed_pa_mapper[pa_id]
+        if pa.tag.id not in to_remove_tag_ids:
+            records.append(dict(
+                op=OP_REMOVE_PRINCIPAL_ATTACHMENT,
+                tag=[pa.tag.key, pa.tag.value],
+                principal=pa.principal.arn,
+                permission=pa.permission.id,
+            ))
+    for pa_id in to_add_pa_ids:
+        pa = new_pa_mapper[pa_id]
+        records.append(dict(
+            op=OP_ADD_PRINCIPAL_ATTACHMENT,
+            tag=[pa.tag.key, pa.tag.value],
+            principal=pa.principal.arn,
+            permission=pa.permission.id,
+        ))
+
+    return records
+
+
+def _get_or_add_tag(pb: Playbook, key: str, value: str) -> Tag:
+    tag = Tag(key=key, value=value)
+    try:
+        return pb.tags[tag.id]
+    except KeyError:
+        pb.add_tag(tag)
+        return tag
+
+
+def replay_record(pb: Playbook, record: dict, interner: Interner):
+    """
+    Apply one journal record to a playbook in place.
+    """
+    op = record["op"]
+    key, value = record["tag"]
+    if op == OP_REMOVE_TAG:
+        pb.remove_tag(Tag(key=key, value=value).id)
+        return
+
+    tag = _get_or_add_tag(pb, key, value)
+    if op == OP_ADD_TAG:
+        pass
+    elif op == OP_ADD_RESOURCE_ATTACHMENT:
+        tag.attach_to_resource(Resource.deserialize(record["resource"], interner))
+    elif op == OP_REMOVE_RESOURCE_ATTACHMENT:
+        tag.detach_from_resource(Resource.deserialize(record["resource"], interner))
+    elif op == OP_ADD_PRINCIPAL_ATTACHMENT:
+        tag.attach_to_principal(
+            Principal.deserialize(dict(arn=record["principal"]), interner),
+            [Permission.deserialize(dict(id=record["permission"])), ],
+        )
+    elif op == OP_REMOVE_PRINCIPAL_ATTACHMENT:
+        tag.detach_from_principal(
+            Principal.deserialize(dict(arn=record["principal"]), interner),
+            [Permission.deserialize(dict(id=record["permission"])), ],
+        )
+    else:
+        raise ValueError(f"unknown journal op {op!r}")
+
+
+class JournalStateBackend(JsonStateBackend):
+    """
+    :param path: path of the snapshot file
+    :param compact_ratio: compact when the journal is bigger than
+        ``compact_ratio`` x snapshot size ...
+    :param compact_min_bytes: ... and bigger than this
+    :param stream: load the snapshot with the streaming loader, see
+        :func:`~aws_lf_tag.state.read_state`
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        compact_ratio: float = 0.5,
+        compact_min_bytes: int = 1000000,
+        stream: bool = False,
+    ):
+        super().__init__(path, stream=stream)
+        self.path_journal = self.path.with_name(self.path.name + ".journal")
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        # of the snapshot, only read from the file by the first save
+        self._state_version: int = None
+
+    def load(
+        self,
+        interner: Interner = None,
+        tag_keys: Iterable[str] = None,
+    ) -> Playbook:
+        if interner is None:
+            interner = Interner()
+        pb = super().load(interner)
+        for record in self._iter_records():
+            if record["op"] != OP_DIGESTS:
+                replay_record(pb, record, interner)
+        if tag_keys is not None:
+            pb = pb.subset(tag_keys)
+        return pb
+
+    def _iter_records(self) -> Iterable[dict]:
+        if not self.path_journal.exists():
+            return
+        with self.path_journal.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:  # truncated last line
+                    return
+
+    def load_digests(self) -> Digests:
+        digests = read_digests(self.path)
+        for record in self._iter_records():
+            if record["op"] == OP_DIGESTS:
+                digests = merge_digests(
+                    digests, record["digests"], record["tag_keys"],
+                )
+        return digests
+
+    def _drop_truncated_line(self):
+        if not self.path_journal.exists():
+            return
+        with self.path_journal.open("rb+") as f:
+            f.seek(0, 2)
+            if f.tell() == 0:
+                return
+            f.seek(-1, 2)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            content = f.read()
+            f.truncate(content.rfind(b"\n") + 1)
+
+    def append(self, records: List[dict]):
+        if len(records) == 0:
+            return
+        self._drop_truncated_line()
+        with self.path_journal.open("a", encoding="utf-8") as f:
+            f.write("".join([
+                json.dumps(record, separators=(",", ":")) + "\n"
+                for record in records
+            ]))
+
+    def compact(self, pb: Playbook):
+        """
+        Write the full state into the snapshot and delete the journal.
+        """
+        write_state(pb, self.path)
+        self._state_version = STATE_VERSION
+        if self.path_journal.exists():
+            self.path_journal.unlink()
+
+    def need_compact(self) -> bool:
+        if not self.path_journal.exists():
+            return False
+        journal_size = self.path_journal.stat().st_size
+        return journal_size > max(
+            self.compact_min_bytes,
+            self.path.stat().st_size * self.compact_ratio,
+        )
+
+    def need_upgrade(self) -> bool:
+        """
+        A snapshot in an older state format, it is rewritten by the next
+        save, instead of only having the journal appended to it. The version
+        is read once, only a compaction changes it afterward.
+        """
+        if self._state_version is None:
+            self._state_version = read_state_version(self.path)
+        return self._state_version < STATE_VERSION
+
+    def save(self, pb: Playbook, deployed_pb: Playbook):
+        if not self.path.exists():
+            super().save(pb, deployed_pb)
+            self._state_version = STATE_VERSION
+            return
+        # records only cover the tags in ``pb`` and ``deployed_pb``, so
+        # they are correct for a subset too
+        records = diff_records(pb, deployed_pb)
+        records.append(dict(
+            op=OP_DIGESTS,
+            digests=compute_digests(pb),
+            tag_keys=None if pb.tag_keys is None else sorted(pb.tag_keys),
+        ))
+        self.append(records)
+        if self.need_compact() or self.need_upgrade():
+            self.compact(self.load() if pb.tag_keys is not None else pb)
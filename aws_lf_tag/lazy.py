@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+Runtime support for the lazy generated resource / principal modules.
+
+A lazy module only has a ``_definitions`` table that maps variable name to
+a compact definition tuple, plus a :pep:`562` module level ``__getattr__``.
+An object is built on its first access and then cached in the module
+namespace, so the following access is a regular global lookup, and
+``from resource_xxx import col_xxx`` keeps working.
+
+The split resource package works the same way, but on database granularity:
+its ``__init__`` only imports the submodule of the accessed database.
+"""
+
+import threading
+import importlib
+from typing import Dict, Tuple, Callable, Union, List
+
+from .core import DELIMITER, Database, Table, Column, IamUser, IamRole
+
+_principal_class_mapper = {
+    "IamUser": IamUser,
+    "IamRole": IamRole,
+}
+
+
+def _make_getattr_and_dir(
+    module_name: str,
+    namespace: dict,
+    definitions: dict,
+    build: Callable,
+) -> Tuple[Callable, Callable]:
+    lock = threading.RLock()
+
+    def __getattr__(name: str):
+        try:
+            definition = definitions[name]
+        except KeyError:
+            raise AttributeError(
+                f"module {module_name!r} has no attribute {name!r}"
+            ) from None
+        with lock:
+            try:
+                return namespace[name]
+            except KeyError:
+                obj = build(name, definition)
+                namespace[name] = obj
+                return obj
+
+    def __dir__() -> List[str]:
+        return sorted(set(namespace).union(definitions))
+
+    return __getattr__, __dir__
+
+
+def make_lazy_resource_module(
+    namespace: dict,
+    account_id: str,
+    region: str,
+    definitions: Dict[str, Tuple[str, Union[str, None]]],
+) -> Tuple[Callable, Callable]:
+    """
+    Create the ``__getattr__`` and ``__dir__`` of a lazy resource module.
+
+    :param namespace: the ``globals()`` of the generated module
+    :param definitions: ``{var_name: (name, parent_var_name)}``, the kind of
+        resource is told by the ``db_`` / ``tb_`` / ``col_`` prefix
+    """
+
+    def build(name: str, definition: Tuple[str, Union[str, None]]):
+        resource_name, parent_var_name = definition
+        if name.startswith("db_"):
+            return Database(account_id=account_id, region=region, name=resource_name)
+        elif name.startswith("tb_"):
+            return Table(name=resource_name, database=__getattr__(parent_var_name))
+        elif name.startswith("col_"):
+            return Column(name=resource_name, table=__getattr__(parent_var_name))
+        else:  # pragma: no cover
+            raise ValueError(f"invalid resource variable name {name!r}")
+
+    __getattr__, __dir__ = _make_getattr_and_dir(
+        namespace["__name__"], namespace, definitions, build,
+    )
+    return __getattr__, __dir__
+
+
+def make_lazy_principal_module(
+    namespace: dict,
+    definitions: Dict[str, Tuple[str, str]],
+) -> Tuple[Callable, Callable]:
+    """
+    Create the ``__getattr__`` and ``__dir__`` of a lazy principal module.
+
+    :param namespace: the ``globals()`` of the generated module
+    :param definitions: ``{var_name: (class_name, arn)}``
+    """
+
+    def build(name: str, definition: Tuple[str, str]):
+        class_name, arn = definition
+        return _principal_class_mapper[class_name](arn=arn)
+
+    return _make_getattr_and_dir(
+        namespace["__name__"], namespace, definitions, build,
+    )
+
+
+def make_lazy_package(
+    namespace: dict,
+    submodules: Dict[str, str],
+) -> Tuple[Callable, Callable]:
+    """
+    Create the ``__getattr__`` and ``__dir__`` of the ``__init__`` of a
+    generated resource package, it has one submodule per database.
+
+    Accessing ``db_xxx`` / ``tb_xxx`` / ``col_xxx`` on the package only
+    imports the submodule of the database that resource belongs to.
+
+    :param namespace: the ``globals()`` of the package ``__init__``
+    :param submodules: ``{database_fullname: submodule_name}``
+    """
+    package_name = namespace["__name__"]
+    submodule_names = set(submodules.values())
+
+    def __getattr__(name: str):
+        if name in submodule_names:
+            return importlib.import_module(f"{package_name}.{name}")
+        # resource variable name is ``{prefix}_{account}____{region}____{database}...``
+        fullname = name.partition("_")[2]
+        db_fullname = DELIMITER.join(fullname.split(DELIMITER)[:3])
+        try:
+            submodule_name = submodules[db_fullname]
+        except KeyError:
+            raise AttributeError(
+                f"module {package_name!r} has no attribute {name!r}"
+            ) from None
+        module = importlib.import_module(f"{package_name}.{submodule_name}")
+        obj = getattr(module, name)
+        namespace[name] = obj
+        return obj
+
+    def __dir__() -> List[str]:
+        return sorted(set(namespace).union(submodule_names))
+
+    return __getattr__, __dir__
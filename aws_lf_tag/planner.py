@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""
+Coalesce resource attachments into as few ``add_lf_tags_to_resource`` /
+``remove_lf_tags_from_resource`` calls as possible.
+
+Both APIs take many LF tags per call, and a ``TableWithColumns`` resource
+takes many column names. The planner groups the attachments by resource,
+then merges the columns of the same table that get the exact same set of
+tags into one call. Tagging a 300 columns table with the same tag is 1 call
+instead of 300.
+"""
+
+from typing import List, Dict, Tuple, Iterable
+
+from .core import Tag, Resource, Column, ResourceAttachment
+
+# max number of ``LFTags`` in one add / remove call
+MAX_LF_TAGS = 50
+
+
+class ResourceCall:
+    """
+    One ``add_lf_tags_to_resource`` / ``remove_lf_tags_from_resource`` call
+    and the attachments it covers.
+    """
+    __slots__ = ("resources", "tags", "attachments")
+
+    def __init__(self, resources: List[Resource], tags: List[Tag]):
+        # more than one resource only if they are columns of the same table
+        self.resources = resources
+        self.tags = tags
+        self.attachments: List[ResourceAttachment] = list()
+
+    @property
+    def resource_arg(self) -> dict:
+        resource = self.resources[0]
+        value = resource.get_add_remove_lf_tags_arg_value
+        if isinstance(resource, Column):
+            value["ColumnNames"] = [column.name for column in self.resources]
+        return {resource.get_add_remove_lf_tags_arg_name: value}
+
+    @property
+    def lf_tags_arg(self) -> List[dict]:
+        values: Dict[str, List[str]] = dict()
+        for tag in self.tags:
+            values.setdefault(tag.key, list()).append(tag.value)
+        return [
+            dict(TagKey=key, TagValues=tag_values)
+            for key, tag_values in values.items()
+        ]
+
+    def to_kwargs(self, catalog_id: str) -> dict:
+        lf_tags = self.lf_tags_arg
+        for lf_tag in lf_tags:
+            lf_tag["CatalogId"] = catalog_id
+        return dict(
+            CatalogId=catalog_id,
+            LFTags=lf_tags,
+            Resource=self.resource_arg,
+        )
+
+    def describe_tags(self) -> str:
+        return "{" + ", ".join(
+            f"{tag.key!r}: {tag.value}" for tag in self.tags
+        ) + "}"
+
+
+def _chunk_by_key(tags: List[Tag], max_lf_tags: int) -> Iterable[List[Tag]]:
+    """
+    Split sorted tags into chunks of at most ``max_lf_tags`` tag keys.
+    """
+    chunk: List[Tag] = list()
+    keys = set()
+    for tag in tags:
+        if tag.key not in keys and len(keys) == max_lf_tags:
+            yield chunk
+            chunk, keys = list(), set()
+        chunk.append(tag)
+        keys.add(tag.key)
+    if chunk:
+        yield chunk
+
+
+def plan_resource_calls(
+    ra_list: Iterable[ResourceAttachment],
+    max_lf_tags: int = MAX_LF_TAGS,
+    by_tag_key: bool = False,
+) -> List[ResourceCall]:
+    """
+    :param ra_list: attachments to add, or attachments to remove
+    :param max_lf_tags: max number of tag keys per call
+    :param by_tag_key: never put two tag keys in the same call, so the
+        calls of a tag key don't depend on another tag key
+    """
+    if by_tag_key:
+        by_key: Dict[str, List[ResourceAttachment]] = dict()
+        for ra in ra_list:
+            by_key.setdefault(ra.tag.key, list()).append(ra)
+        return [
+            call
+            for ras in by_key.values()
+            for call in plan_resource_calls(ras, max_lf_tags)
+        ]
+
+    # resource id -> (resource, attachments)
+    by_resource: Dict[str, Tuple[Resource, List[ResourceAttachment]]] = dict()
+    for ra in ra_list:
+        try:
+            by_resource[ra.resource.id][1].append(ra)
+        except KeyError:
+            by_resource[ra.resource.id] = (ra.resource, [ra, ])
+
+    # (is column, table id or resource id, tag ids) -> (resources, attachments)
+    groups: Dict[tuple, Tuple[List[Resource], List[ResourceAttachment]]] = dict()
+    for resource, ras in by_resource.values():
+        tag_ids = frozenset(ra.tag.id for ra in ras)
+        if isinstance(resource, Column):
+            group_key = (True, resource.table.id, tag_ids)
+        else:
+            group_key = (False, resource.id, tag_ids)
+        try:
+            resources, attachments = groups[group_key]
+            resources.append(resource)
+            attachments.extend(ras)
+        except KeyError:
+            groups[group_key] = ([resource, ], list(ras))
+
+    calls: List[ResourceCall] = list()
+    for resources, attachments in groups.values():
+        tags = {ra.tag.id: ra.tag for ra in attachments}
+        sorted_tags = [tags[tag_id] for tag_id in sorted(tags)]
+        for chunk in _chunk_by_key(sorted_tags, max_lf_tags):
+            call = ResourceCall(resources=resources, tags=chunk)
+            tag_ids = {tag.id for tag in chunk}
+            call.attachments = [
+                ra for ra in attachments if ra.tag.id in tag_ids
+            ]
+            calls.append(call)
+    return calls
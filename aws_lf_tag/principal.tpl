@@ -1,5 +1,21 @@
 # -*- coding: utf-8 -*-
 
+{% if lazy %}
+from aws_lf_tag.lazy import make_lazy_principal_module
+
+_definitions = {
+{%- for iam_user in iam_user_list %}
+    {{ iam_user.render_lazy_define() }}
+{%- endfor %}
+{%- for iam_role in iam_role_list %}
+    {{ iam_role.render_lazy_define() }}
+{%- endfor %}
+}
+
+__all__ = list(_definitions)
+
+__getattr__, __dir__ = make_lazy_principal_module(globals(), _definitions)
+{% else %}
 from aws_lf_tag import IamUser, IamRole
 
 {% for iam_user in iam_user_list %}
@@ -9,3 +25,4 @@ from aws_lf_tag import IamUser, IamRole
 {% for iam_role in iam_role_list %}
 {{ iam_role.render_define() }}
 {% endfor %}
+{% endif %}
@@ -1,12 +1,31 @@
 # -*- coding: utf-8 -*-
 
+{% if lazy %}
+from aws_lf_tag.lazy import make_lazy_resource_module
+{% else %}
 from aws_lf_tag import Database, Table, Column
-
-{% if database_list|length %}
-account_id = "{{ database_list[0].account_id }}"
-region = "{{ database_list[0].region }}"
 {% endif %}
 
+account_id = "{{ account_id }}"
+region = "{{ region }}"
+
+{% if lazy %}
+_definitions = {
+{%- for database in database_list %}
+    {{ database.render_lazy_define() }}
+{%- for table in database.t.values() %}
+    {{ table.render_lazy_define() }}
+{%- for column in table.c.values() %}
+    {{ column.render_lazy_define() }}
+{%- endfor %}
+{%- endfor %}
+{%- endfor %}
+}
+
+__all__ = list(_definitions)
+
+__getattr__, __dir__ = make_lazy_resource_module(globals(), account_id, region, _definitions)
+{% else %}
 {% for database in database_list %}
 {{ database.render_define() }}
 
@@ -20,3 +39,4 @@ region = "{{ database_list[0].region }}"
 {% endfor %}
 
 {% endfor %}
+{% endif %}
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+from aws_lf_tag.lazy import make_lazy_package
+
+account_id = "{{ account_id }}"
+region = "{{ region }}"
+
+_submodules = {
+{%- for db_fullname, submodule_name in submodule_list %}
+    "{{ db_fullname }}": "{{ submodule_name }}",
+{%- endfor %}
+}
+
+__getattr__, __dir__ = make_lazy_package(globals(), _submodules)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+Run a DAG of tasks on a thread pool.
+
+Every node whose dependencies are all done is submitted right away, so
+independent branches move forward on their own. When a node raises, the
+nodes depending on it, directly or not, are skipped, the others still run,
+and the first error is raised at the end, or left on the failed node.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Iterable, Union, Any, Callable
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+
+
+class Node:
+    __slots__ = ("id", "func", "deps", "dependents", "status", "result", "error")
+
+    def __init__(self, id: str, func: Callable[[], Any]):
+        self.id = id
+        self.func = func
+        self.deps: List[Node] = list()
+        self.dependents: List[Node] = list()
+        self.status = STATUS_PENDING
+        self.result = None
+        self.error: Exception = None
+
+    def __repr__(self):
+        return f"Node(id={self.id!r}, status={self.status!r})"
+
+
+class Dag:
+    def __init__(self):
+        self.nodes: Dict[str, Node] = dict()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(
+        self,
+        id: str,
+        func: Callable[[], Any],
+        deps: Iterable[Node] = (),
+    ) -> Node:
+        """
+        :param id: unique id of the node
+        :param func: the task, takes no argument
+        :param deps: nodes that have to be done before this one, they are
+            added before it, so there is no cycle
+        """
+        if id in self.nodes:
+            raise ValueError(f"node {id!r} already exists")
+        node = Node(id, func)
+        for dep in set(deps):
+            node.deps.append(dep)
+            dep.dependents.append(node)
+        self.nodes[id] = node
+        return node
+
+    def _skip(self, node: Node):
+        for dependent in node.dependents:
+            if dependent.status == STATUS_PENDING:
+                dependent.status = STATUS_SKIPPED
+                self._skip(dependent)
+
+    def run(
+        self,
+        max_workers: int = 10,
+        raise_error: bool = True,
+    ) -> Dict[str, Node]:
+        """
+        Run all nodes, each node is run after all its dependencies are done.
+
+        :param raise_error: raise the first error after all nodes are done
+            or skipped, if False the caller checks the ``status`` and
+            ``error`` of the nodes
+        :return: the nodes, with their ``status``, ``result`` and ``error``
+        """
+        n_deps = {id: len(node.deps) for id, node in self.nodes.items()}
+        ready = [node for node in self.nodes.values() if not node.deps]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = dict()
+            while ready or futures:
+                for node in ready:
+                    futures[executor.submit(node.func)] = node
+                ready = list()
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = futures.pop(future)
+                    try:
+                        node.result = future.result()
+                        node.status = STATUS_DONE
+                    except Exception as e:
+                        node.error = e
+                        node.status = STATUS_FAILED
+                        self._skip(node)
+                        continue
+                    for dependent in node.dependents:
+                        n_deps[dependent.id] -= 1
+                        if (
+                            n_deps[dependent.id] == 0
+                            and dependent.status == STATUS_PENDING
+                        ):
+                            ready.append(dependent)
+
+        if raise_error:
+            error = self.get_error()
+            if error is not None:
+                raise error
+        return self.nodes
+
+    def get_error(self) -> Union[Exception, None]:
+        """
+        :return: the error of the first failed node, None if no node failed
+        """
+        for node in self.nodes.values():
+            if node.status == STATUS_FAILED:
+                return node.error
+        return None
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+"""
+In memory search index over databases, tables and columns.
+
+- a trie over the ``Resource.id`` segments:
+  ``account_id -> region -> database -> table -> column``
+- an inverted map from database / table / column name to resources
+
+Selectors are dot separated glob patterns, ``database``,
+``database.table`` or ``database.table.column``, for example::
+
+    index.select("db_*.*.ssn")
+    index.select("sales.orders")
+    index.select("*.users.*email*")
+
+A literal segment is a dict lookup in the trie, a glob segment only scans
+the children of the current node. If the last segment is literal, the
+inverted map gives the candidates directly, only their parents are matched.
+"""
+
+import re
+import types
+from fnmatch import fnmatchcase
+from typing import List, Dict, Tuple, Iterable, Union
+
+from .core import Resource, Database, Table, Column
+
+_glob_chars = set("*?[")
+
+LEVEL_DATABASE = "database"
+LEVEL_TABLE = "table"
+LEVEL_COLUMN = "column"
+_levels = [LEVEL_DATABASE, LEVEL_TABLE, LEVEL_COLUMN]
+
+
+def _is_glob(pattern: str) -> bool:
+    return not _glob_chars.isdisjoint(pattern)
+
+
+def _get_path(resource: Resource) -> Tuple[str, ...]:
+    if isinstance(resource, Column):
+        tb = resource.table
+        db = tb.database
+        return (db.account_id, db.region, db.name, tb.name, resource.name)
+    elif isinstance(resource, Table):
+        db = resource.database
+        return (db.account_id, db.region, db.name, resource.name)
+    elif isinstance(resource, Database):
+        return (resource.account_id, resource.region, resource.name)
+    else:  # pragma: no cover
+        raise TypeError(f"{resource!r} is not a Database, Table or Column")
+
+
+class _Node:
+    __slots__ = ("resource", "children")
+
+    def __init__(self):
+        self.resource: Union[Resource, None] = None
+        self.children: Dict[str, _Node] = dict()
+
+
+class ResourceIndex:
+    def __init__(self):
+        self._root = _Node()
+        self._names: Dict[str, Dict[str, List[Resource]]] = {
+            level: dict()
+            for level in _levels
+        }
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, resource: Resource):
+        path = _get_path(resource)
+        node = self._root
+        for segment in path:
+            try:
+                node = node.children[segment]
+            except KeyError:
+                child = _Node()
+                node.children[segment] = child
+                node = child
+        if node.resource is None:
+            self._size += 1
+            self._names[_levels[len(path) - 3]].setdefault(
+                resource.name, list()
+            ).append(resource)
+        node.resource = resource
+
+    @classmethod
+    def from_resources(cls, resources: Iterable[Resource]) -> 'ResourceIndex':
+        """
+        Build an index from resources, for example
+        :meth:`aws_lf_tag.bincat.BinaryCatalog.iter_resources`.
+        """
+        index = cls()
+        for resource in resources:
+            index.add(resource)
+        return index
+
+    @classmethod
+    def from_databases(cls, database_list: Iterable[Database]) -> 'ResourceIndex':
+        """
+        Build an index from databases, with all tables and columns in
+        ``database.t`` and ``table.c``.
+        """
+        index = cls()
+        for database in database_list:
+            index.add(database)
+            for table in database.t.values():
+                index.add(table)
+                for column in table.c.values():
+                    index.add(column)
+        return index
+
+    @classmethod
+    def from_module(cls, module: types.ModuleType) -> 'ResourceIndex':
+        """
+        Build an index from a generated resource module, lazy module works too.
+        """
+        index = cls()
+        for name in dir(module):
+            if name.startswith(("db_", "tb_", "col_")):
+                obj = getattr(module, name)
+                if isinstance(obj, Resource):
+                    index.add(obj)
+        return index
+
+    def _walk(self, node: _Node, patterns: List[str]) -> Iterable[_Node]:
+        if len(patterns) == 0:
+            yield node
+            return
+        pattern, rest = patterns[0], patterns[1:]
+        if _is_glob(pattern):
+            for key, child in node.children.items():
+                if fnmatchcase(key, pattern):
+                    yield from self._walk(child, rest)
+        else:
+            child = node.children.get(pattern)
+            if child is not None:
+                yield from self._walk(child, rest)
+
+    def select(self, selector: str) -> List[Resource]:
+        """
+        Find resources by a ``database[.table[.column]]`` glob selector, in
+        all accounts and regions of the index.
+        """
+        patterns = selector.split(".")
+        if not (1 <= len(patterns) <= 3):
+            raise ValueError(
+                f"invalid selector {selector!r}, "
+                f"expect 'database[.table[.column]]'"
+            )
+
+        if not _is_glob(patterns[-1]):
+            resources = self._names[_levels[len(patterns) - 1]].get(patterns[-1], list())
+            return [
+                resource
+                for resource in resources
+                if all(
+                    fnmatchcase(name, pattern)
+                    for name, pattern in zip(_get_path(resource)[2:-1], patterns[:-1])
+                )
+            ]
+
+        return [
+            node.resource
+            for node in self._walk(self._root, ["*", "*"] + patterns)
+            if node.resource is not None
+        ]
+
+    def search_regex(
+        self,
+        pattern: Union[str, re.Pattern],
+        level: str = LEVEL_COLUMN,
+    ) -> List[Resource]:
+        """
+        Find resources whose name matches the regex (``re.search``). Each
+        distinct name is only tested once.
+
+        :param level: "database", "table" or "column"
+        """
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern)
+        resources = list()
+        for name, resource_list in self._names[level].items():
+            if pattern.search(name):
+                resources.extend(resource_list)
+        return resources
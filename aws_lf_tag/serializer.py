@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pluggable serializers and compression for the deployed state file.
+
+The file format is detected from the file name when writing, and from the
+magic bytes when reading:
+
+==========================  ===============  ===========
+file name                   serializer       compression
+==========================  ===============  ===========
+``deployed.json``           orjson / json    none
+``deployed.json.gz``        orjson / json    gzip
+``deployed.json.zst``       orjson / json    zstd
+``deployed.msgpack``        msgpack          none
+``deployed.msgpack.gz``     msgpack          gzip
+==========================  ===============  ===========
+
+``orjson``, ``msgpack`` and ``zstandard`` are optional, json falls back to
+the standard library ``json`` module when ``orjson`` is not installed.
+"""
+
+import io
+import gzip
+import json
+from pathlib import Path
+from typing import Dict, Union, BinaryIO, TextIO
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+COMPRESSION_NONE = "none"
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_ZSTD = "zstd"
+
+FORMAT_JSON = "json"
+FORMAT_MSGPACK = "msgpack"
+
+
+class Serializer:
+    name: str
+    format: str
+
+    def dumps(self, data: dict) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, b: bytes) -> dict:
+        raise NotImplementedError
+
+
+class StdlibJsonSerializer(Serializer):
+    name = "json"
+    format = FORMAT_JSON
+
+    def dumps(self, data: dict) -> bytes:
+        return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, b: bytes) -> dict:
+        return json.loads(b)
+
+
+class OrjsonSerializer(Serializer):
+    name = "orjson"
+    format = FORMAT_JSON
+
+    def dumps(self, data: dict) -> bytes:
+        return orjson.dumps(data)
+
+    def loads(self, b: bytes) -> dict:
+        return orjson.loads(b)
+
+
+class MsgpackSerializer(Serializer):
+    name = "msgpack"
+    format = FORMAT_MSGPACK
+
+    def dumps(self, data: dict) -> bytes:
+        return msgpack.packb(data, use_bin_type=True)
+
+    def loads(self, b: bytes) -> dict:
+        return msgpack.unpackb(b, raw=False, strict_map_key=False)
+
+
+_serializers: Dict[str, Serializer] = {
+    "json": StdlibJsonSerializer(),
+}
+if orjson is not None:
+    _serializers["orjson"] = OrjsonSerializer()
+if msgpack is not None:
+    _serializers["msgpack"] = MsgpackSerializer()
+
+
+def get_serializer(format: str = FORMAT_JSON, name: str = None) -> Serializer:
+    """
+    :param format: "json" or "msgpack"
+    :param name: a specific serializer, for example "json" to force the
+        standard library, default is the fastest installed one
+    """
+    if name is not None:
+        try:
+            return _serializers[name]
+        except KeyError:
+            raise ValueError(f"serializer {name!r} is not installed")
+    if format == FORMAT_MSGPACK:
+        return get_serializer(name="msgpack")
+    return _serializers.get("orjson", _serializers["json"])
+
+
+def detect_from_path(path: Union[str, Path]):
+    """
+    :return: ``(format, compression)`` by the file suffixes
+    """
+    suffixes = Path(path).suffixes
+    compression = COMPRESSION_NONE
+    if suffixes and suffixes[-1] == ".gz":
+        compression = COMPRESSION_GZIP
+        suffixes = suffixes[:-1]
+    elif suffixes and suffixes[-1] in (".zst", ".zstd"):
+        compression = COMPRESSION_ZSTD
+        suffixes = suffixes[:-1]
+    format = FORMAT_JSON
+    if suffixes and suffixes[-1] in (".msgpack", ".mpk"):
+        format = FORMAT_MSGPACK
+    return format, compression
+
+
+def detect_compression(head: bytes) -> str:
+    if head.startswith(GZIP_MAGIC):
+        return COMPRESSION_GZIP
+    if head.startswith(ZSTD_MAGIC):
+        return COMPRESSION_ZSTD
+    return COMPRESSION_NONE
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise ImportError("zstd compression needs 'pip install zstandard'")
+
+
+def compress(b: bytes, compression: str) -> bytes:
+    if compression == COMPRESSION_GZIP:
+        return gzip.compress(b, compresslevel=6)
+    if compression == COMPRESSION_ZSTD:
+        _require_zstd()
+        return zstandard.ZstdCompressor().compress(b)
+    return b
+
+
+def open_decompressed(path: Union[str, Path]) -> BinaryIO:
+    """
+    Open a file for binary reading, decompress on the fly by magic bytes.
+    The returned file is buffered, it has ``peek()``, and closing it closes
+    the underlying file.
+    """
+    f = Path(path).open("rb")
+    try:
+        compression = detect_compression(f.read(4))
+        f.seek(0)
+        if compression == COMPRESSION_GZIP:
+            f.close()
+            return gzip.open(path, "rb")
+        if compression == COMPRESSION_ZSTD:
+            _require_zstd()
+            return io.BufferedReader(
+                zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+            )
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+
+def is_json(head: bytes) -> bool:
+    """
+    A json state always starts with ``{``, a msgpack map never does.
+    """
+    return head.lstrip()[:1] == b"{"
+
+
+def open_text(f: BinaryIO) -> TextIO:
+    return io.TextIOWrapper(f, encoding="utf-8")
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persisted Glue Data Catalog snapshot, used for incremental code generation.
+
+The snapshot remembers the ``CreateTime`` of each database and the
+``CreateTime`` / ``UpdateTime`` of each table, together with its column names.
+On the next crawl, only tables whose timestamps moved are re-parsed, and the
+generated module is only re-rendered when something actually changed.
+"""
+
+import json
+from pathlib import Path
+from datetime import datetime
+from typing import List, Dict, Tuple, Iterable, Union
+
+from .core import Database, Table, Column
+
+
+def _to_str(value: Union[datetime, str, None]) -> Union[str, None]:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def get_signature(dct: dict) -> List[Union[str, None]]:
+    """
+    Change detection signature of a ``get_databases`` / ``get_tables``
+    response item.
+    """
+    return [_to_str(dct.get("CreateTime")), _to_str(dct.get("UpdateTime"))]
+
+
+def get_column_names(tb_dct: dict) -> List[str]:
+    return [
+        col_dct["Name"]
+        for col_dct in tb_dct.get("StorageDescriptor", dict()).get("Columns", list())
+    ]
+
+
+class SnapshotDiff:
+    """
+    What changed between two crawls. Each item is a ``database`` name or a
+    ``(database, table)`` name tuple.
+    """
+
+    def __init__(self):
+        self.added_databases: List[str] = list()
+        self.removed_databases: List[str] = list()
+        self.added_tables: List[Tuple[str, str]] = list()
+        self.removed_tables: List[Tuple[str, str]] = list()
+        self.updated_tables: List[Tuple[str, str]] = list()
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}("
+            f"added_databases={len(self.added_databases)}, "
+            f"removed_databases={len(self.removed_databases)}, "
+            f"added_tables={len(self.added_tables)}, "
+            f"removed_tables={len(self.removed_tables)}, "
+            f"updated_tables={len(self.updated_tables)})"
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        return not (
+            self.added_databases
+            or self.removed_databases
+            or self.added_tables
+            or self.removed_tables
+            or self.updated_tables
+        )
+
+
+class CatalogSnapshot:
+    """
+    Data structure::
+
+        {
+            "account_id": "111122223333",
+            "region": "us-east-1",
+            "render_options": {"lazy": false, "split": false},
+            "databases": {
+                "db_name": {
+                    "signature": [create_time, update_time],
+                    "tables": {
+                        "tb_name": {
+                            "signature": [create_time, update_time],
+                            "columns": ["col_name", ...],
+                        },
+                    },
+                },
+            },
+        }
+    """
+
+    def __init__(
+        self,
+        account_id: str,
+        region: str,
+        databases: Dict[str, dict] = None,
+        render_options: dict = None,
+    ):
+        self.account_id = account_id
+        self.region = region
+        if databases is None:
+            databases = dict()
+        self.databases: Dict[str, dict] = databases
+        if render_options is None:
+            render_options = dict()
+        # the options the module was last rendered with
+        self.render_options: dict = render_options
+
+    def serialize(self) -> dict:
+        return dict(
+            account_id=self.account_id,
+            region=self.region,
+            render_options=self.render_options,
+            databases=self.databases,
+        )
+
+    @classmethod
+    def deserialize(cls, data: dict) -> 'CatalogSnapshot':
+        return cls(
+            account_id=data["account_id"],
+            region=data["region"],
+            databases=data["databases"],
+            render_options=data.get("render_options", dict()),
+        )
+
+    @classmethod
+    def read(cls, path: Path) -> 'CatalogSnapshot':
+        return cls.deserialize(json.loads(Path(path).read_text(encoding="utf-8")))
+
+    def write(self, path: Path):
+        Path(path).write_text(json.dumps(self.serialize()), encoding="utf-8")
+
+    def update(
+        self,
+        catalog: Iterable[Tuple[dict, List[dict]]],
+    ) -> SnapshotDiff:
+        """
+        Patch the snapshot in place with a fresh crawl result.
+
+        :param catalog: the ``(database_dict, table_dict_list)`` tuples
+            from :func:`aws_lf_tag.crawler.iter_catalog`
+        """
+        diff = SnapshotDiff()
+        databases: Dict[str, dict] = dict()
+        for db_dct, tb_dct_list in catalog:
+            db_name = db_dct["Name"]
+            db_signature = get_signature(db_dct)
+            old_db_data = self.databases.get(db_name)
+            # a database dropped and re-created is a brand-new database
+            if old_db_data is None or old_db_data["signature"] != db_signature:
+                if old_db_data is not None:
+                    diff.removed_databases.append(db_name)
+                diff.added_databases.append(db_name)
+                old_tables = dict()
+            else:
+                old_tables = old_db_data["tables"]
+
+            tables: Dict[str, dict] = dict()
+            for tb_dct in tb_dct_list:
+                tb_name = tb_dct["Name"]
+                tb_signature = get_signature(tb_dct)
+                old_tb_data = old_tables.get(tb_name)
+                if old_tb_data is not None and old_tb_data["signature"] == tb_signature:
+                    tables[tb_name] = old_tb_data
+                    continue
+                if old_tb_data is None:
+                    diff.added_tables.append((db_name, tb_name))
+                else:
+                    diff.updated_tables.append((db_name, tb_name))
+                tables[tb_name] = dict(
+                    signature=tb_signature,
+                    columns=get_column_names(tb_dct),
+                )
+
+            for tb_name in old_tables:
+                if tb_name not in tables:
+                    diff.removed_tables.append((db_name, tb_name))
+
+            databases[db_name] = dict(signature=db_signature, tables=tables)
+
+        for db_name in self.databases:
+            if db_name not in databases:
+                diff.removed_databases.append(db_name)
+
+        self.databases = databases
+        return diff
+
+    def iter_databases(self) -> Iterable[Database]:
+        for db_name, db_data in self.databases.items():
+            database = Database(
+                account_id=self.account_id,
+                region=self.region,
+                name=db_name,
+            )
+            for tb_name, tb_data in db_data["tables"].items():
+                table = Table(name=tb_name, database=database)
+                for col_name in tb_data["columns"]:
+                    table.c[col_name] = Column(name=col_name, table=table)
+                database.t[tb_name] = table
+            yield database
+
+    def to_database_list(self) -> List[Database]:
+        return list(self.iter_databases())
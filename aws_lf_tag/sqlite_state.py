@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+
+"""
+SQLite deployed state store.
+
+Tags, resources, principals and attachments are rows in indexed tables, so
+loading the tags of one key, or finding what is attached to one table, only
+reads the matching rows::
+
+    backend = SqliteStateBackend("deployed-111122223333-us-east-1.sqlite")
+    pb = Playbook(boto_ses, workspace_dir, state_backend=backend)
+    pb.apply(tag_keys=["Admin", ])
+
+    backend.get_resource_tags(tb_users)
+
+Saving only writes the changes between the deployed and the new playbook,
+in one transaction.
+"""
+
+import sqlite3
+from pathlib import Path
+from typing import List, Dict, Tuple, Iterable, Union
+
+from .core import (
+    Interner, Principal, Resource, Database, Table, Column, Permission, Tag,
+    PrincipalAttachment, ResourceAttachment, Playbook, get_deploy_metadata,
+)
+from .digest import Digests, compute_digests
+from .journal import (
+    diff_records,
+    OP_ADD_TAG, OP_REMOVE_TAG,
+    OP_ADD_RESOURCE_ATTACHMENT, OP_REMOVE_RESOURCE_ATTACHMENT,
+    OP_ADD_PRINCIPAL_ATTACHMENT, OP_REMOVE_PRINCIPAL_ATTACHMENT,
+)
+from .state import StateBackend
+
+_schema = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    UNIQUE (key, value)
+);
+CREATE TABLE IF NOT EXISTS resources (
+    id INTEGER PRIMARY KEY,
+    account_id TEXT NOT NULL,
+    region TEXT NOT NULL,
+    database_name TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    column_name TEXT NOT NULL,
+    UNIQUE (database_name, table_name, column_name, account_id, region)
+);
+CREATE TABLE IF NOT EXISTS principals (
+    id INTEGER PRIMARY KEY,
+    arn TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS resource_attachments (
+    tag_id INTEGER NOT NULL,
+    resource_id INTEGER NOT NULL,
+    PRIMARY KEY (tag_id, resource_id)
+);
+CREATE INDEX IF NOT EXISTS ix_resource_attachments_resource
+    ON resource_attachments (resource_id);
+CREATE TABLE IF NOT EXISTS principal_attachments (
+    tag_id INTEGER NOT NULL,
+    principal_id INTEGER NOT NULL,
+    permission TEXT NOT NULL,
+    PRIMARY KEY (tag_id, principal_id, permission)
+);
+CREATE INDEX IF NOT EXISTS ix_principal_attachments_principal
+    ON principal_attachments (principal_id);
+CREATE TABLE IF NOT EXISTS digests (
+    tag_key TEXT PRIMARY KEY,
+    tags TEXT NOT NULL,
+    resources TEXT NOT NULL,
+    principals TEXT NOT NULL
+);
+"""
+
+# account_id, region, database, table, column name, empty string for
+# "not a table / column"
+ResourceKey = Tuple[str, str, str, str, str]
+
+
+def _get_resource_key(dct: dict) -> ResourceKey:
+    """
+    Convert ``Resource.serialize()`` output into
+    ``(account_id, region, database, table, column)``.
+    """
+    if "table" in dct:  # column
+        tb_dct = dct["table"]
+        db_dct = tb_dct["database"]
+        return (db_dct["account_id"], db_dct["region"], db_dct["name"], tb_dct["name"], dct["name"])
+    if "database" in dct:  # table
+        db_dct = dct["database"]
+        return (db_dct["account_id"], db_dct["region"], db_dct["name"], dct["name"], "")
+    return (dct["account_id"], dct["region"], dct["name"], "", "")
+
+
+def _to_resource(key: ResourceKey, interner: Interner) -> Resource:
+    account_id, region, database_name, table_name, column_name = key
+    resource = interner.intern(Database(
+        account_id=account_id, region=region, name=database_name,
+    ))
+    if table_name:
+        resource = interner.intern(Table(name=table_name, database=resource))
+    if column_name:
+        resource = interner.intern(Column(name=column_name, table=resource))
+    return resource
+
+
+class SqliteStateBackend(StateBackend):
+    """
+    :param path: path of the sqlite file, it is created if not exists
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.connection = sqlite3.connect(str(self.path))
+        self.connection.executescript(_schema)
+
+    def close(self):
+        self.connection.close()
+
+    def _in_clause(self, column: str, values: list) -> str:
+        return f"{column} IN ({', '.join(['?'] * len(values))})"
+
+    def load(
+        self,
+        interner: Interner = None,
+        tag_keys: Iterable[str] = None,
+    ) -> Playbook:
+        if interner is None:
+            interner = Interner()
+        where, params = "", list()
+        if tag_keys is not None:
+            params = list(tag_keys)
+            where = "WHERE " + self._in_clause("t.key", params)
+
+        tags: Dict[int, Tag] = dict()
+        for tag_id, key, value in self.connection.execute(
+            f"SELECT t.id, t.key, t.value FROM tags t {where}", params,
+        ):
+            tags[tag_id] = Tag(key=key, value=value)
+
+        for tag_id, *resource_key in self.connection.execute(
+            f"""
+            SELECT ra.tag_id, r.account_id, r.region, r.database_name, r.table_name, r.column_name
+            FROM resource_attachments ra
+            JOIN tags t ON ra.tag_id = t.id
+            JOIN resources r ON ra.resource_id = r.id
+            {where}
+            """,
+            params,
+        ):
+            tag = tags[tag_id]
+            ra = ResourceAttachment(tag=tag, resource=_to_resource(resource_key, interner))
+            tag.resource_attachments[ra.id] = ra
+
+        for tag_id, arn, permission_id in self.connection.execute(
+            f"""
+            SELECT pa.tag_id, p.arn, pa.permission
+            FROM principal_attachments pa
+            JOIN tags t ON pa.tag_id = t.id
+            JOIN principals p ON pa.principal_id = p.id
+            {where}
+            """,
+            params,
+        ):
+            tag = tags[tag_id]
+            pa = PrincipalAttachment(
+                tag=tag,
+                principal=Principal.deserialize(dict(arn=arn), interner),
+                permission=Permission.deserialize(dict(id=permission_id)),
+            )
+            tag.principal_attachments[pa.id] = pa
+
+        pb = Playbook(_skip_validation=True)
+        for tag in tags.values():
+            pb.add_tag(tag)
+        if tag_keys is not None:
+            pb.tag_keys = set(tag_keys)
+        return pb
+
+    def _get_tag_id(self, key: str, value: str) -> int:
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO tags (key, value) VALUES (?, ?)", (key, value),
+        )
+        if cursor.rowcount:
+            return cursor.lastrowid
+        return self.connection.execute(
+            "SELECT id FROM tags WHERE key = ? AND value = ?", (key, value),
+        ).fetchone()[0]
+
+    def _get_resource_id(self, key: ResourceKey) -> int:
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO resources "
+            "(account_id, region, database_name, table_name, column_name) "
+            "VALUES (?, ?, ?, ?, ?)",
+            key,
+        )
+        if cursor.rowcount:
+            return cursor.lastrowid
+        return self.connection.execute(
+            "SELECT id FROM resources WHERE account_id = ? AND region = ? "
+            "AND database_name = ? AND table_name = ? AND column_name = ?",
+            key,
+        ).fetchone()[0]
+
+    def _get_principal_id(self, arn: str) -> int:
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO principals (arn) VALUES (?)", (arn,),
+        )
+        if cursor.rowcount:
+            return cursor.lastrowid
+        return self.connection.execute(
+            "SELECT id FROM principals WHERE arn = ?", (arn,),
+        ).fetchone()[0]
+
+    def _write_record(self, record: dict):
+        op = record["op"]
+        tag_id = self._get_tag_id(*record["tag"])
+        if op == OP_ADD_TAG:
+            pass
+        elif op == OP_REMOVE_TAG:
+            for table in ["resource_attachments", "principal_attachments"]:
+                self.connection.execute(f"DELETE FROM {table} WHERE tag_id = ?", (tag_id,))
+            self.connection.execute("DELETE FROM tags WHERE id = ?", (tag_id,))
+        elif op == OP_ADD_RESOURCE_ATTACHMENT:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO resource_attachments VALUES (?, ?)",
+                (tag_id, self._get_resource_id(_get_resource_key(record["resource"]))),
+            )
+        elif op == OP_REMOVE_RESOURCE_ATTACHMENT:
+            self.connection.execute(
+                "DELETE FROM resource_attachments WHERE tag_id = ? AND resource_id = ?",
+                (tag_id, self._get_resource_id(_get_resource_key(record["resource"]))),
+            )
+        elif op == OP_ADD_PRINCIPAL_ATTACHMENT:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO principal_attachments VALUES (?, ?, ?)",
+                (tag_id, self._get_principal_id(record["principal"]), record["permission"]),
+            )
+        elif op == OP_REMOVE_PRINCIPAL_ATTACHMENT:
+            self.connection.execute(
+                "DELETE FROM principal_attachments "
+                "WHERE tag_id = ? AND principal_id = ? AND permission = ?",
+                (tag_id, self._get_principal_id(record["principal"]), record["permission"]),
+            )
+        else:  # pragma: no cover
+            raise ValueError(f"unknown op {op!r}")
+
+    def load_digests(self) -> Digests:
+        return {
+            tag_key: list(digest)
+            for tag_key, *digest in self.connection.execute(
+                "SELECT tag_key, tags, resources, principals FROM digests"
+            )
+        }
+
+    def save(self, pb: Playbook, deployed_pb: Playbook):
+        with self.connection:
+            for record in diff_records(pb, deployed_pb):
+                self._write_record(record)
+            if pb.tag_keys is None:
+                self.connection.execute("DELETE FROM digests")
+            else:
+                tag_keys = list(pb.tag_keys)
+                self.connection.execute(
+                    "DELETE FROM digests WHERE " + self._in_clause("tag_key", tag_keys),
+                    tag_keys,
+                )
+            self.connection.executemany(
+                "INSERT INTO digests VALUES (?, ?, ?, ?)",
+                [
+                    (tag_key, *digest)
+                    for tag_key, digest in compute_digests(pb).items()
+                ],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                list(get_deploy_metadata().items()),
+            )
+
+    def get_resource_tags(self, resource: Resource) -> List[Tag]:
+        """
+        Deployed tags attached to a resource.
+        """
+        key = _get_resource_key(resource.serialize())
+        return [
+            Tag(key=tag_key, value=tag_value)
+            for tag_key, tag_value in self.connection.execute(
+                """
+                SELECT t.key, t.value
+                FROM resources r
+                JOIN resource_attachments ra ON ra.resource_id = r.id
+                JOIN tags t ON ra.tag_id = t.id
+                WHERE r.database_name = ? AND r.table_name = ? AND r.column_name = ?
+                AND r.account_id = ? AND r.region = ?
+                ORDER BY t.key, t.value
+                """,
+                key[2:] + key[:2],
+            )
+        ]
+
+    def get_principal_permissions(self, principal: Principal) -> List[Tuple[Tag, Permission]]:
+        """
+        Deployed ``(tag, permission)`` pairs granted to a principal.
+        """
+        return [
+            (Tag(key=tag_key, value=tag_value), Permission.deserialize(dict(id=permission_id)))
+            for tag_key, tag_value, permission_id in self.connection.execute(
+                """
+                SELECT t.key, t.value, pa.permission
+                FROM principals p
+                JOIN principal_attachments pa ON pa.principal_id = p.id
+                JOIN tags t ON pa.tag_id = t.id
+                WHERE p.arn = ?
+                ORDER BY t.key, t.value, pa.permission
+                """,
+                (principal.arn,),
+            )
+        ]
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+
+"""
+Normalized deployed state file format.
+
+``Playbook.serialize`` (version 1) nests a full copy of the tag, the
+resource with all its parents and the permission inside every attachment.
+Version 2 writes each entity once, in a table, and attachments are rows of
+indexes into these tables::
+
+    {
+        "version": 2,
+        "deployed_by": "alice",
+        "deployed_at_local_time": "...",
+        "deployed_at_utc_time": "...",
+        "digests": {"Admin": [tags, resources, principals], ...},
+        "tags": [["Admin", "y"], ...],
+        "principals": ["arn:aws:iam::111122223333:role/ec2-role", ...],
+        "permissions": ["Select", ...],
+        "databases": [["111122223333", "us-east-1", "db"], ...],
+        "tables": [[database_index, "tb"], ...],
+        "columns": [[table_index, "col"], ...],
+        "principal_attachments": [[tag_index, principal_index, permission_index], ...],
+        "resource_attachments": [[tag_index, resource_type, resource_index], ...],
+    }
+
+``resource_type`` is 0 for database, 1 for table and 2 for column.
+``digests`` is described in :mod:`aws_lf_tag.digest`. Version 1 files are
+still readable, :func:`upgrade_state` converts them.
+
+The small fields come before the entity tables, :func:`read_header` reads
+them without decoding the tables, for json and for msgpack.
+"""
+
+import os
+from pathlib import Path
+from typing import List, Dict, Union, Iterable, BinaryIO
+
+from .core import (
+    Interner, Principal, Database, Table, Column, Permission, Tag,
+    PrincipalAttachment, ResourceAttachment, Playbook, get_deploy_metadata,
+)
+from .digest import Digests, compute_digests
+from .serializer import (
+    FORMAT_JSON, FORMAT_MSGPACK, Serializer, get_serializer,
+    detect_from_path, compress, open_decompressed, open_text, is_json,
+    msgpack,
+)
+
+STATE_VERSION = 2
+
+RESOURCE_TYPE_DATABASE = 0
+RESOURCE_TYPE_TABLE = 1
+RESOURCE_TYPE_COLUMN = 2
+
+# the big part of a state, the header is everything before the first of them
+_body_fields = {
+    "tags", "principals", "permissions", "databases", "tables", "columns",
+    "principal_attachments", "resource_attachments",
+}
+
+
+def get_state_version(data: dict) -> int:
+    return data.get("version", 1)
+
+
+class _Table:
+    """
+    Entity table, id -> row index.
+    """
+
+    def __init__(self):
+        self.index: Dict[str, int] = dict()
+        self.rows: list = list()
+
+    def get(self, id: str, make_row) -> int:
+        try:
+            return self.index[id]
+        except KeyError:
+            ind = len(self.rows)
+            self.index[id] = ind
+            self.rows.append(make_row())
+            return ind
+
+
+def dump_state(pb: Playbook) -> dict:
+    """
+    Serialize a playbook into the normalized version 2 format.
+    """
+    tags, principals, permissions = _Table(), _Table(), _Table()
+    databases, tables, columns = _Table(), _Table(), _Table()
+
+    def get_database(db: Database) -> int:
+        return databases.get(db.id, lambda: [db.account_id, db.region, db.name])
+
+    def get_table(tb: Table) -> int:
+        return tables.get(tb.id, lambda: [get_database(tb.database), tb.name])
+
+    def get_column(col: Column) -> int:
+        return columns.get(col.id, lambda: [get_table(col.table), col.name])
+
+    principal_attachments: List[List[int]] = list()
+    resource_attachments: List[List[int]] = list()
+    for tag in pb.tags.values():
+        tag_ind = tags.get(tag.id, lambda: [tag.key, tag.value])
+        for pa in tag.principal_attachments.values():
+            principal_attachments.append([
+                tag_ind,
+                principals.get(pa.principal.id, lambda: pa.principal.arn),
+                permissions.get(pa.permission.id, lambda: pa.permission.id),
+            ])
+        for ra in tag.resource_attachments.values():
+            resource = ra.resource
+            if isinstance(resource, Column):
+                row = [tag_ind, RESOURCE_TYPE_COLUMN, get_column(resource)]
+            elif isinstance(resource, Table):
+                row = [tag_ind, RESOURCE_TYPE_TABLE, get_table(resource)]
+            else:
+                row = [tag_ind, RESOURCE_TYPE_DATABASE, get_database(resource)]
+            resource_attachments.append(row)
+
+    data = dict(version=STATE_VERSION)
+    data.update(get_deploy_metadata())
+    # before the entity tables, so it can be read without the rest
+    data["digests"] = compute_digests(pb)
+    data.update(
+        tags=tags.rows,
+        principals=principals.rows,
+        permissions=permissions.rows,
+        databases=databases.rows,
+        tables=tables.rows,
+        columns=columns.rows,
+        principal_attachments=principal_attachments,
+        resource_attachments=resource_attachments,
+    )
+    return data
+
+
+def load_state(data: dict, interner: Interner = None) -> Playbook:
+    """
+    Deserialize a version 1 or version 2 state into a playbook.
+    """
+    version = get_state_version(data)
+    if version == 1:
+        return Playbook.deserialize(data, interner)
+    if version != STATE_VERSION:
+        raise ValueError(f"unsupported state version {version!r}")
+
+    if interner is None:
+        interner = Interner()
+
+    def intern(obj):
+        return interner.intern(obj)
+
+    principals = [
+        intern(Principal(arn=arn))
+        for arn in data["principals"]
+    ]
+    permissions = [
+        Permission.deserialize(dict(id=permission_id))
+        for permission_id in data["permissions"]
+    ]
+    databases = [
+        intern(Database(account_id=account_id, region=region, name=name))
+        for account_id, region, name in data["databases"]
+    ]
+    tables = [
+        intern(Table(name=name, database=databases[db_ind]))
+        for db_ind, name in data["tables"]
+    ]
+    columns = [
+        intern(Column(name=name, table=tables[tb_ind]))
+        for tb_ind, name in data["columns"]
+    ]
+    resources_by_type = {
+        RESOURCE_TYPE_DATABASE: databases,
+        RESOURCE_TYPE_TABLE: tables,
+        RESOURCE_TYPE_COLUMN: columns,
+    }
+    tags = [
+        Tag(key=key, value=value)
+        for key, value in data["tags"]
+    ]
+
+    for tag_ind, principal_ind, permission_ind in data["principal_attachments"]:
+        tag = tags[tag_ind]
+        pa = PrincipalAttachment(
+            tag=tag,
+            principal=principals[principal_ind],
+            permission=permissions[permission_ind],
+        )
+        tag.principal_attachments[pa.id] = pa
+
+    for tag_ind, resource_type, resource_ind in data["resource_attachments"]:
+        tag = tags[tag_ind]
+        ra = ResourceAttachment(
+            tag=tag,
+            resource=resources_by_type[resource_type][resource_ind],
+        )
+        tag.resource_attachments[ra.id] = ra
+
+    pb = Playbook(_skip_validation=True)
+    for tag in tags:
+        pb.add_tag(tag)
+    return pb
+
+
+def upgrade_state(data: dict) -> dict:
+    """
+    Convert a state of any older version into the current version.
+    """
+    if get_state_version(data) == STATE_VERSION:
+        return data
+    new_data = dump_state(load_state(data))
+    for key in ["deployed_by", "deployed_at_local_time", "deployed_at_utc_time"]:
+        if key in data:
+            new_data[key] = data[key]
+    return new_data
+
+
+def read_state(
+    path: Union[str, Path],
+    interner: Interner = None,
+    stream: bool = False,
+) -> Playbook:
+    """
+    Read a version 1 or version 2 state file, the serializer and the
+    compression are detected from the file content, see
+    :mod:`aws_lf_tag.serializer`.
+
+    :param stream: by default json is decoded at once with the fastest
+        installed json library (orjson). If True, decode it with the pure
+        python streaming loader in :mod:`aws_lf_tag.stream`, lower peak
+        memory but slower.
+    """
+    from .stream import stream_state  # stream imports state
+
+    with open_decompressed(path) as f:
+        if is_json(f.peek(64)[:64]):
+            if stream:
+                return stream_state(open_text(f), interner)
+            serializer = get_serializer(FORMAT_JSON)
+        else:
+            serializer = get_serializer(FORMAT_MSGPACK)
+        return load_state(serializer.loads(f.read()), interner)
+
+
+def _unpack_header(f: BinaryIO) -> dict:
+    """
+    Unpack the fields of a msgpack state one by one, stop at the first
+    entity table, the tables are never decoded.
+    """
+    get_serializer(FORMAT_MSGPACK)  # raise if msgpack is not installed
+    unpacker = msgpack.Unpacker(f, raw=False, strict_map_key=False)
+    header = dict()
+    for _ in range(unpacker.read_map_header()):
+        field = unpacker.unpack()
+        if field in _body_fields:
+            break
+        header[field] = unpacker.unpack()
+    return header
+
+
+def read_header(path: Union[str, Path]) -> dict:
+    """
+    Read the small fields of a state file, ``version``, the deploy metadata
+    and the ``digests``, it stops before the entity tables.
+    """
+    from .stream import stream_header  # stream imports state
+
+    with open_decompressed(path) as f:
+        if is_json(f.peek(64)[:64]):
+            return stream_header(open_text(f))
+        return _unpack_header(f)
+
+
+def read_digests(path: Union[str, Path]) -> Digests:
+    """
+    Read only the ``digests`` of a state file, see :func:`read_header`.
+    Empty if the file doesn't exist or has no digests.
+    """
+    path = Path(path)
+    if not path.exists():
+        return dict()
+    return read_header(path).get("digests", dict())
+
+
+def read_state_version(path: Union[str, Path]) -> int:
+    """
+    Read only the version of a state file, see :func:`get_state_version`.
+    """
+    return get_state_version(read_header(path))
+
+
+def write_state(
+    pb: Playbook,
+    path: Union[str, Path],
+    serializer: Serializer = None,
+):
+    """
+    Write the state to a temp file first then rename it, a crash never leaves
+    a half written state file. The serializer and the compression are
+    detected from the file name, for example ``deployed.json.gz``.
+    """
+    path = Path(path)
+    format, compression = detect_from_path(path)
+    if serializer is None:
+        serializer = get_serializer(format)
+    path_tmp = path.with_name(path.name + ".tmp")
+    path_tmp.write_bytes(compress(serializer.dumps(dump_state(pb)), compression))
+    os.replace(path_tmp, path)
+
+
+class StateBackend:
+    """
+    Where ``Playbook.apply`` loads the deployed playbook from and saves the
+    new deployed playbook to.
+    """
+
+    def load(
+        self,
+        interner: Interner = None,
+        tag_keys: Iterable[str] = None,
+    ) -> Playbook:
+        """
+        :param tag_keys: only load the tags of these keys, default is all
+        """
+        raise NotImplementedError
+
+    def load_digests(self) -> Digests:
+        """
+        Digests of the deployed state, see :mod:`aws_lf_tag.digest`. It
+        should be much cheaper than :meth:`load`. Empty means unknown, then
+        everything is applied.
+        """
+        return dict()
+
+    def save(self, pb: Playbook, deployed_pb: Playbook):
+        """
+        :param pb: the playbook just applied, it is the new deployed state,
+            if ``pb.tag_keys`` is not None, only the tags of these keys
+            are replaced
+        :param deployed_pb: the previous deployed state, returned by
+            :meth:`load`
+        """
+        raise NotImplementedError
+
+
+class JsonStateBackend(StateBackend):
+    """
+    The whole state in one json file, rewritten on every save.
+
+    :param stream: load with the streaming loader, see :func:`read_state`
+    """
+
+    def __init__(self, path: Union[str, Path], stream: bool = False):
+        self.path = Path(path)
+        self.stream = stream
+
+    def load(
+        self,
+        interner: Interner = None,
+        tag_keys: Iterable[str] = None,
+    ) -> Playbook:
+        if self.path.exists():
+            pb = read_state(self.path, interner, stream=self.stream)
+        else:
+            pb = Playbook(_skip_validation=True)
+        if tag_keys is not None:
+            pb = pb.subset(tag_keys)
+        return pb
+
+    def load_digests(self) -> Digests:
+        return read_digests(self.path)
+
+    def save(self, pb: Playbook, deployed_pb: Playbook):
+        if pb.tag_keys is not None:
+            full_pb = self.load()
+            for tag in list(full_pb.tags.values()):
+                if tag.key in pb.tag_keys:
+                    full_pb.remove_tag(tag.id)
+            # don't register the merged playbook on the tags of ``pb``
+            for tag in pb.tags.values():
+                full_pb._index_tag(tag)
+            pb = full_pb
+        write_state(pb, self.path)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+"""
+Integer encoded attachment store.
+
+Tags, resources, principals and permissions are encoded into small integer
+codes by a :class:`Codebook`. An attachment then becomes a single 64 bits
+integer key:
+
+- resource attachment: ``tag << 32 | resource``
+- principal attachment: ``tag << 40 | principal << 8 | permission``
+
+Keys are kept as a sorted unique numpy array, so diffing the new and the
+deployed playbook is a sorted array set operation instead of hashing
+millions of long ``____`` joined string ids. Without numpy the keys are
+python int sets, and ``Playbook`` doesn't use the store at all: encoding
+every attachment in python costs more than diffing its incrementally
+maintained string id mappers.
+
+The two stores being diffed MUST share the same :class:`Codebook`.
+"""
+
+from array import array
+from typing import List, Dict, Tuple, Iterable
+
+from .core import (
+    Hashable, Tag, PrincipalAttachment, ResourceAttachment,
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+_TAG_BITS = 24
+_RESOURCE_BITS = 32
+_PRINCIPAL_BITS = 32
+_PERMISSION_BITS = 8
+
+_RESOURCE_MASK = (1 << _RESOURCE_BITS) - 1
+_PRINCIPAL_MASK = (1 << _PRINCIPAL_BITS) - 1
+_PERMISSION_MASK = (1 << _PERMISSION_BITS) - 1
+
+
+class Encoder:
+    """
+    Two way mapping between ``Hashable.id`` and a dense integer code, the
+    first object seen for an id is the one returned by :meth:`decode`.
+    """
+    __slots__ = ("name", "bits", "codes", "objects")
+
+    def __init__(self, name: str, bits: int):
+        self.name = name
+        self.bits = bits
+        self.codes: Dict[str, int] = dict()
+        self.objects: List[Hashable] = list()
+
+    def __len__(self):
+        return len(self.objects)
+
+    def encode(self, obj: Hashable) -> int:
+        try:
+            return self.codes[obj.id]
+        except KeyError:
+            code = len(self.objects)
+            if code >> self.bits:
+                raise ValueError(
+                    f"too many {self.name}, the limit is {1 << self.bits}"
+                )
+            self.codes[obj.id] = code
+            self.objects.append(obj)
+            return code
+
+    def decode(self, code: int) -> Hashable:
+        return self.objects[code]
+
+
+class Codebook:
+    def __init__(self):
+        self.tag = Encoder("tags", _TAG_BITS)
+        self.resource = Encoder("resources", _RESOURCE_BITS)
+        self.principal = Encoder("principals", _PRINCIPAL_BITS)
+        self.permission = Encoder("permissions", _PERMISSION_BITS)
+
+    def encode_resource_attachment(self, ra: ResourceAttachment) -> int:
+        return (
+            (self.tag.encode(ra.tag) << _RESOURCE_BITS)
+            | self.resource.encode(ra.resource)
+        )
+
+    def decode_resource_attachment(self, key: int) -> ResourceAttachment:
+        return ResourceAttachment(
+            tag=self.tag.decode(key >> _RESOURCE_BITS),
+            resource=self.resource.decode(key & _RESOURCE_MASK),
+        )
+
+    def encode_principal_attachment(self, pa: PrincipalAttachment) -> int:
+        return (
+            (self.tag.encode(pa.tag) << (_PRINCIPAL_BITS + _PERMISSION_BITS))
+            | (self.principal.encode(pa.principal) << _PERMISSION_BITS)
+            | self.permission.encode(pa.permission)
+        )
+
+    def decode_principal_attachment(self, key: int) -> PrincipalAttachment:
+        return PrincipalAttachment(
+            tag=self.tag.decode(key >> (_PRINCIPAL_BITS + _PERMISSION_BITS)),
+            principal=self.principal.decode((key >> _PERMISSION_BITS) & _PRINCIPAL_MASK),
+            permission=self.permission.decode(key & _PERMISSION_MASK),
+        )
+
+
+def _to_sorted_unique(keys: array):
+    """
+    A sorted unique array with numpy, a set without.
+    """
+    if np is not None:
+        return np.unique(np.frombuffer(keys, dtype=np.uint64))
+    return set(keys)
+
+
+def _to_set(keys) -> set:
+    return keys if isinstance(keys, (set, frozenset)) else set(keys)
+
+
+def diff_keys(new_keys, deployed_keys) -> Tuple[list, list, int]:
+    """
+    Diff two sorted unique key arrays, or two key sets.
+
+    :return: to add keys, to remove keys, number of keys in both
+    """
+    if np is not None:
+        return (
+            np.setdiff1d(new_keys, deployed_keys, assume_unique=True).tolist(),
+            np.setdiff1d(deployed_keys, new_keys, assume_unique=True).tolist(),
+            len(np.intersect1d(new_keys, deployed_keys, assume_unique=True)),
+        )
+    s1, s2 = _to_set(new_keys), _to_set(deployed_keys)
+    return (
+        sorted(s1.difference(s2)),
+        sorted(s2.difference(s1)),
+        len(s1.intersection(s2)),
+    )
+
+
+class AttachmentStore:
+    """
+    Resource attachments and principal attachments of a playbook, as packed
+    integer keys.
+    """
+
+    def __init__(self, codebook: Codebook = None):
+        if codebook is None:
+            codebook = Codebook()
+        self.codebook = codebook
+        self._ra_buffer = array("Q")
+        self._pa_buffer = array("Q")
+        self._ra_keys = None
+        self._pa_keys = None
+
+    def add_resource_attachment(self, ra: ResourceAttachment):
+        self._ra_buffer.append(self.codebook.encode_resource_attachment(ra))
+        self._ra_keys = None
+
+    def add_principal_attachment(self, pa: PrincipalAttachment):
+        self._pa_buffer.append(self.codebook.encode_principal_attachment(pa))
+        self._pa_keys = None
+
+    @classmethod
+    def from_tags(
+        cls,
+        tags: Iterable[Tag],
+        codebook: Codebook = None,
+    ) -> 'AttachmentStore':
+        store = cls(codebook)
+        for tag in tags:
+            for ra in tag.resource_attachments.values():
+                store.add_resource_attachment(ra)
+            for pa in tag.principal_attachments.values():
+                store.add_principal_attachment(pa)
+        return store
+
+    @property
+    def resource_attachment_keys(self):
+        if self._ra_keys is None:
+            self._ra_keys = _to_sorted_unique(self._ra_buffer)
+        return self._ra_keys
+
+    @property
+    def principal_attachment_keys(self):
+        if self._pa_keys is None:
+            self._pa_keys = _to_sorted_unique(self._pa_buffer)
+        return self._pa_keys
+
+    def diff_resource_attachments(
+        self,
+        deployed: 'AttachmentStore',
+    ) -> Tuple[List[ResourceAttachment], List[ResourceAttachment]]:
+        """
+        :return: resource attachments to add, resource attachments to remove
+        """
+        assert self.codebook is deployed.codebook
+        to_add, to_remove, _ = diff_keys(
+            self.resource_attachment_keys,
+            deployed.resource_attachment_keys,
+        )
+        decode = self.codebook.decode_resource_attachment
+        return [decode(key) for key in to_add], [decode(key) for key in to_remove]
+
+    def diff_principal_attachments(
+        self,
+        deployed: 'AttachmentStore',
+    ) -> Tuple[List[PrincipalAttachment], List[PrincipalAttachment]]:
+        """
+        :return: principal attachments to grant, principal attachments to revoke
+        """
+        assert self.codebook is deployed.codebook
+        to_grant, to_revoke, _ = diff_keys(
+            self.principal_attachment_keys,
+            deployed.principal_attachment_keys,
+        )
+        decode = self.codebook.decode_principal_attachment
+        return [decode(key) for key in to_grant], [decode(key) for key in to_revoke]
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+
+"""
+Streaming loader for deployed state files.
+
+``json.loads(path.read_text())`` needs the whole text, the whole dict tree
+and then the object graph in memory at the same time. This loader reads the
+file in chunks and only decodes one small value at a time, one attachment
+or one entity table row, so the peak memory is about the size of the final
+object graph.
+
+Both the nested version 1 format (``Playbook.serialize``) and the normalized
+version 2 format (:mod:`aws_lf_tag.state`) are supported. It only uses the
+standard library ``json`` decoder, no extra dependency. It is slower than
+decoding the whole file with orjson, so it is opt-in, see
+:func:`aws_lf_tag.state.read_state`.
+"""
+
+import json
+from pathlib import Path
+from typing import List, Iterable, Union, TextIO
+
+from .core import (
+    Interner, Principal, Resource, Database, Table, Column, Permission, Tag,
+    PrincipalAttachment, ResourceAttachment, Playbook,
+)
+from .serializer import open_decompressed, open_text
+from .state import (
+    RESOURCE_TYPE_DATABASE, RESOURCE_TYPE_TABLE, RESOURCE_TYPE_COLUMN,
+)
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+_whitespace = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+
+class JsonStream:
+    """
+    A pull parser over a text file. The caller walks containers with
+    :meth:`iter_object` / :meth:`iter_array` and decodes small leaf values
+    with :meth:`read_value`.
+    """
+
+    def __init__(self, f: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """
+        Read one more chunk, drop the consumed part of the buffer.
+        """
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and return the next char without consuming it.
+        """
+        while True:
+            while self.pos < len(self.buffer):
+                if self.buffer[self.pos] not in _whitespace:
+                    return self.buffer[self.pos]
+                self.pos += 1
+            if not self._fill():
+                raise ValueError("unexpected end of json")
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(
+                f"expect {char!r} but got {self.buffer[self.pos]!r}"
+            )
+        self.pos += 1
+
+    def read_value(self):
+        """
+        Decode the next complete json value, it has to fit in memory.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # a number at the end of the buffer may be cut in the middle
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def _iter_container(self, open_char: str, close_char: str, is_object: bool):
+        self.expect(open_char)
+        if self.peek() == close_char:
+            self.pos += 1
+            return
+        while True:
+            if is_object:
+                key = self.read_value()
+                self.expect(":")
+                yield key
+            else:
+                yield None
+            char = self.peek()
+            self.pos += 1
+            if char == close_char:
+                return
+            if char != ",":
+                raise ValueError(f"expect ',' or {close_char!r} but got {char!r}")
+
+    def iter_object(self) -> Iterable[str]:
+        """
+        Yield the keys of an object. The caller MUST consume the value of
+        each key before asking for the next one.
+        """
+        return self._iter_container("{", "}", True)
+
+    def iter_array(self) -> Iterable[None]:
+        """
+        Yield once per array item. The caller MUST consume the item.
+        """
+        return self._iter_container("[", "]", False)
+
+    def iter_values(self) -> Iterable:
+        """
+        Decode array items one by one.
+        """
+        for _ in self.iter_array():
+            yield self.read_value()
+
+
+def _load_v1_tag(
+    stream: JsonStream,
+    tag_id: str,
+    interner: Interner,
+) -> Tag:
+    tag: Union[Tag, None] = None
+    key = value = None
+
+    def get_tag(data: dict = None) -> Tag:
+        nonlocal tag
+        if tag is None:
+            if key is not None and value is not None:
+                tag = Tag(key=key, value=value)
+            elif data is not None:
+                tag = Tag.deserialize(data)
+            else:
+                raise ValueError(f"tag {tag_id!r} has no key / value")
+        return tag
+
+    for field in stream.iter_object():
+        if field == "key":
+            key = stream.read_value()
+        elif field == "value":
+            value = stream.read_value()
+        elif field == "principal_attachments":
+            for pa_id in stream.iter_object():
+                pa_dct = stream.read_value()
+                pa = PrincipalAttachment(
+                    tag=get_tag(pa_dct["tag"]),
+                    principal=Principal.deserialize(pa_dct["principal"], interner),
+                    permission=Permission.deserialize(pa_dct["permission"]),
+                )
+                tag.principal_attachments[pa_id] = pa
+        elif field == "resource_attachments":
+            for ra_id in stream.iter_object():
+                ra_dct = stream.read_value()
+                ra = ResourceAttachment(
+                    tag=get_tag(ra_dct["tag"]),
+                    resource=Resource.deserialize(ra_dct["resource"], interner),
+                )
+                tag.resource_attachments[ra_id] = ra
+        else:
+            stream.read_value()
+    return get_tag()
+
+
+def _load_v2_table(stream: JsonStream, field: str, tables: dict, interner: Interner):
+    if field == "tags":
+        tables[field] = [
+            Tag(key=key, value=value)
+            for key, value in stream.iter_values()
+        ]
+    elif field == "principals":
+        tables[field] = [
+            interner.intern(Principal(arn=arn))
+            for arn in stream.iter_values()
+        ]
+    elif field == "permissions":
+        tables[field] = [
+            Permission.deserialize(dict(id=permission_id))
+            for permission_id in stream.iter_values()
+        ]
+    elif field == "databases":
+        tables[field] = [
+            interner.intern(Database(account_id=account_id, region=region, name=name))
+            for account_id, region, name in stream.iter_values()
+        ]
+    elif field == "tables":
+        databases = tables["databases"]
+        tables[field] = [
+            interner.intern(Table(name=name, database=databases[db_ind]))
+            for db_ind, name in stream.iter_values()
+        ]
+    elif field == "columns":
+        tbs = tables["tables"]
+        tables[field] = [
+            interner.intern(Column(name=name, table=tbs[tb_ind]))
+            for tb_ind, name in stream.iter_values()
+        ]
+
+
+def _load_v2_attachments(stream: JsonStream, field: str, tables: dict):
+    tags: List[Tag] = tables["tags"]
+    if field == "principal_attachments":
+        principals, permissions = tables["principals"], tables["permissions"]
+        for tag_ind, principal_ind, permission_ind in stream.iter_values():
+            tag = tags[tag_ind]
+            pa = PrincipalAttachment(
+                tag=tag,
+                principal=principals[principal_ind],
+                permission=permissions[permission_ind],
+            )
+            tag.principal_attachments[pa.id] = pa
+    else:
+        resources_by_type = {
+            RESOURCE_TYPE_DATABASE: tables["databases"],
+            RESOURCE_TYPE_TABLE: tables["tables"],
+            RESOURCE_TYPE_COLUMN: tables["columns"],
+        }
+        for tag_ind, resource_type, resource_ind in stream.iter_values():
+            tag = tags[tag_ind]
+            ra = ResourceAttachment(
+                tag=tag,
+                resource=resources_by_type[resource_type][resource_ind],
+            )
+            tag.resource_attachments[ra.id] = ra
+
+
+_v2_tables = ["tags", "principals", "permissions", "databases", "tables", "columns"]
+_v2_attachments = ["principal_attachments", "resource_attachments"]
+
+
+def stream_state(
+    f: TextIO,
+    interner: Interner = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Playbook:
+    """
+    Load a version 1 or version 2 state from a text file object.
+    """
+    if interner is None:
+        interner = Interner()
+    stream = JsonStream(f, chunk_size=chunk_size)
+    pb = Playbook(_skip_validation=True)
+    tables = dict()
+    for field in stream.iter_object():
+        if field == "tags" and stream.peek() == "{":  # version 1
+            for tag_id in stream.iter_object():
+                pb.add_tag(_load_v1_tag(stream, tag_id, interner))
+        elif field in _v2_tables:
+            _load_v2_table(stream, field, tables, interner)
+        elif field in _v2_attachments:
+            missing = [name for name in _v2_tables if name not in tables]
+            if missing:
+                raise ValueError(f"{missing} have to come before {field!r}")
+            _load_v2_attachments(stream, field, tables)
+        else:
+            stream.read_value()
+    for tag in tables.get("tags", list()):
+        pb.add_tag(tag)
+    return pb
+
+
+def stream_digests(f: TextIO) -> dict:
+    """
+    Read the ``digests`` of a version 2 state, stop as soon as it is found,
+    or as soon as the big part of the file starts.
+    """
+    stream = JsonStream(f, chunk_size=4096)
+    for field in stream.iter_object():
+        if field == "digests":
+            return stream.read_value()
+        if field in _v2_tables or field in _v2_attachments:
+            break
+        stream.read_value()
+    return dict()
+
+
+def stream_header(f: TextIO) -> dict:
+    """
+    Read the small fields at the start of a state, ``version``, the deploy
+    metadata and the ``digests``, stop as soon as the big part of the file
+    starts.
+    """
+    stream = JsonStream(f, chunk_size=4096)
+    header = dict()
+    for field in stream.iter_object():
+        if field in _v2_tables or field in _v2_attachments:
+            break
+        header[field] = stream.read_value()
+    return header
+
+
+def stream_state_file(
+    path: Union[str, Path],
+    interner: Interner = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Playbook:
+    """
+    Load a state file, gzip / zstd compressed file works too.
+    """
+    with open_decompressed(path) as f:
+        return stream_state(open_text(f), interner, chunk_size)
@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+
+"""
+In memory fake boto3 clients for testing, no AWS credential needed.
+"""
+
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Union, Callable
+
+
+def _paginate(items: list, page_size: int, next_token: str = None):
+    start = int(next_token) if next_token else 0
+    end = start + page_size
+    next_token = str(end) if end < len(items) else None
+    return items[start:end], next_token
+
+
+class FakeGlueClient:
+    """
+    A fake glue client that serves ``get_databases`` and ``get_tables``
+    from an in memory catalog, and returns at most ``page_size`` items
+    per page.
+
+    :param catalog: ``{database_name: {table_name: [column_name, ...]}}``
+    :param latency: seconds to sleep in each api call
+
+    ``max_in_flight`` is the peak number of concurrent api calls.
+    """
+
+    def __init__(
+        self,
+        catalog: Dict[str, Dict[str, List[str]]],
+        page_size: int = 100,
+        latency: float = 0,
+    ):
+        self.catalog = catalog
+        self.page_size = page_size
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls: Dict[str, int] = {"get_databases": 0, "get_tables": 0}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.create_time = datetime(2022, 1, 1, tzinfo=timezone.utc)
+        self.update_time: Dict[tuple, datetime] = dict()
+
+    def touch(self, database_name: str, table_name: str):
+        """
+        Simulate a table update, bump its ``UpdateTime``.
+        """
+        key = (database_name, table_name)
+        self.update_time[key] = self.update_time.get(
+            key, self.create_time
+        ) + timedelta(seconds=1)
+
+    def _record(self, api: str):
+        with self.lock:
+            self.calls[api] += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def get_databases(self, CatalogId: str, MaxResults: int = 100, NextToken: str = None):
+        self._record("get_databases")
+        db_dct_list = [
+            {"Name": db_name, "CatalogId": CatalogId, "CreateTime": self.create_time}
+            for db_name in self.catalog
+        ]
+        page, next_token = _paginate(
+            db_dct_list, min(MaxResults, self.page_size), NextToken,
+        )
+        res = {"DatabaseList": page}
+        if next_token:
+            res["NextToken"] = next_token
+        return res
+
+    def get_tables(
+        self,
+        CatalogId: str,
+        DatabaseName: str,
+        MaxResults: int = 100,
+        NextToken: str = None,
+    ):
+        self._record("get_tables")
+        tb_dct_list = [
+            {
+                "Name": tb_name,
+                "DatabaseName": DatabaseName,
+                "CreateTime": self.create_time,
+                "UpdateTime": self.update_time.get(
+                    (DatabaseName, tb_name), self.create_time
+                ),
+                "StorageDescriptor": {
+                    "Columns": [{"Name": col_name} for col_name in col_name_list]
+                },
+            }
+            for tb_name, col_name_list in self.catalog[DatabaseName].items()
+        ]
+        page, next_token = _paginate(
+            tb_dct_list, min(MaxResults, self.page_size), NextToken,
+        )
+        res = {"TableList": page}
+        if next_token:
+            res["NextToken"] = next_token
+        return res
+
+
+class FakeIamClient:
+    """
+    A fake iam client that serves ``list_users`` and ``list_roles``, returns
+    at most ``page_size`` items per page.
+
+    :param user_names: list of user name, can include path like ``"dev/alice"``
+    :param role_names: list of role name, can include path
+
+    ``max_in_flight`` is the peak number of concurrent api calls.
+    """
+
+    def __init__(
+        self,
+        account_id: str,
+        user_names: List[str],
+        role_names: List[str],
+        page_size: int = 100,
+        latency: float = 0,
+    ):
+        self.account_id = account_id
+        self.user_names = user_names
+        self.role_names = role_names
+        self.page_size = page_size
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls: Dict[str, int] = {"list_users": 0, "list_roles": 0}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _list(
+        self,
+        api: str,
+        key: str,
+        resource_type: str,
+        names: List[str],
+        PathPrefix: str = "/",
+        Marker: str = None,
+        MaxItems: int = 100,
+    ):
+        with self.lock:
+            self.calls[api] += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        items = list()
+        for name in names:
+            path = "/" + name.rsplit("/", 1)[0] + "/" if "/" in name else "/"
+            if path.startswith(PathPrefix):
+                items.append({
+                    "Path": path,
+                    f"{resource_type.capitalize()}Name": name.rsplit("/", 1)[-1],
+                    "Arn": f"arn:aws:iam::{self.account_id}:{resource_type}/{name}",
+                })
+        page, next_token = _paginate(items, min(MaxItems, self.page_size), Marker)
+        res = {key: page, "IsTruncated": next_token is not None}
+        if next_token:
+            res["Marker"] = next_token
+        return res
+
+    def list_users(self, **kwargs):
+        return self._list("list_users", "Users", "user", self.user_names, **kwargs)
+
+    def list_roles(self, **kwargs):
+        return self._list("list_roles", "Roles", "role", self.role_names, **kwargs)
+
+
+def make_catalog(
+    n_db: int,
+    n_tb: int,
+    n_col: int,
+) -> Dict[str, Dict[str, List[str]]]:
+    return {
+        f"db{i}": {
+            f"tb{j}": [f"col{k}" for k in range(n_col)]
+            for j in range(n_tb)
+        }
+        for i in range(n_db)
+    }
+
+
+class FakeStsClient:
+    def __init__(self, account_id: str):
+        self.account_id = account_id
+
+    def get_caller_identity(self):
+        return {"Account": self.account_id}
+
+
+class FakeBotoSession:
+    """
+    A fake ``boto3.session.Session`` that hands out the given fake clients.
+    """
+
+    def __init__(
+        self,
+        account_id: str,
+        region_name: str,
+        **clients,
+    ):
+        self.region_name = region_name
+        self.clients = dict(sts=FakeStsClient(account_id))
+        self.clients.update(clients)
+
+    def client(self, service_name: str, **kwargs):
+        return self.clients[service_name]
+
+
+class FakeLakeFormationClient:
+    """
+    A fake lakeformation client that records every write api call as an
+    ``(api_name, kwargs)`` tuple in ``calls``, ``max_in_flight`` is the
+    peak number of concurrent api calls.
+    """
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls: List[tuple] = list()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _record(self, api: str, kwargs: dict) -> dict:
+        with self.lock:
+            self.calls.append((api, kwargs))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        return dict()
+
+    def count(self, api: str) -> int:
+        return sum(1 for name, _ in self.calls if name == api)
+
+    def create_lf_tag(self, **kwargs):
+        return self._record("create_lf_tag", kwargs)
+
+    def update_lf_tag(self, **kwargs):
+        return self._record("update_lf_tag", kwargs)
+
+    def delete_lf_tag(self, **kwargs):
+        return self._record("delete_lf_tag", kwargs)
+
+    def add_lf_tags_to_resource(self, **kwargs):
+        self._record("add_lf_tags_to_resource", kwargs)
+        return {"Failures": []}
+
+    def remove_lf_tags_from_resource(self, **kwargs):
+        self._record("remove_lf_tags_from_resource", kwargs)
+        return {"Failures": []}
+
+    def batch_grant_permissions(self, **kwargs):
+        self._record("batch_grant_permissions", kwargs)
+        return {"Failures": []}
+
+    def batch_revoke_permissions(self, **kwargs):
+        self._record("batch_revoke_permissions", kwargs)
+        return {"Failures": []}
+
+
+class ThrottlingLakeFormationClient(FakeLakeFormationClient):
+    """
+    A fake lakeformation client that raises ``ThrottlingException`` like
+    the real service does when it is overloaded.
+
+    :param capacity: a call is throttled when more than ``capacity`` calls
+        are in flight
+    :param throttle_first: the first n calls of each api are throttled
+    :param error_code: the error code to raise
+    """
+
+    def __init__(
+        self,
+        latency: float = 0,
+        capacity: int = None,
+        throttle_first: int = 0,
+        error_code: str = "ThrottlingException",
+    ):
+        super().__init__(latency=latency)
+        self.capacity = capacity
+        self.throttle_first = throttle_first
+        self.error_code = error_code
+        self.attempts: Dict[str, int] = dict()
+        self.throttles: List[tuple] = list()
+
+    def _record(self, api: str, kwargs: dict) -> dict:
+        from botocore.exceptions import ClientError
+
+        with self.lock:
+            self.attempts[api] = self.attempts.get(api, 0) + 1
+            throttled = (
+                self.attempts[api] <= self.throttle_first
+                or (self.capacity is not None and self.in_flight >= self.capacity)
+            )
+            if throttled:
+                self.throttles.append((api, kwargs))
+        if throttled:
+            raise ClientError(
+                {"Error": {"Code": self.error_code, "Message": "Rate exceeded"}},
+                api,
+            )
+        return super()._record(api, kwargs)
+
+
+class PartialFailureLakeFormationClient(FakeLakeFormationClient):
+    """
+    A fake lakeformation client that reports some batch entries / LF tags
+    in the ``Failures`` of the response, like the real service does.
+
+    :param should_fail: ``(api_name, item) -> error code or None``, item is
+        a batch entry or an ``LFTags`` item
+    """
+
+    def __init__(
+        self,
+        should_fail: Callable[[str, dict], Union[str, None]],
+        latency: float = 0,
+    ):
+        super().__init__(latency=latency)
+        self.should_fail = should_fail
+
+    def _failures(self, api: str, kwargs: dict) -> List[dict]:
+        failures = list()
+        if "Entries" in kwargs:
+            for entry in kwargs["Entries"]:
+                error_code = self.should_fail(api, entry)
+                if error_code:
+                    failures.append(dict(
+                        RequestEntry=entry,
+                        Error=dict(ErrorCode=error_code, ErrorMessage="failed"),
+                    ))
+        else:
+            for lf_tag in kwargs["LFTags"]:
+                error_code = self.should_fail(api, lf_tag)
+                if error_code:
+                    failures.append(dict(
+                        LFTag=lf_tag,
+                        Error=dict(ErrorCode=error_code, ErrorMessage="failed"),
+                    ))
+        return failures
+
+    def add_lf_tags_to_resource(self, **kwargs):
+        self._record("add_lf_tags_to_resource", kwargs)
+        return {"Failures": self._failures("add_lf_tags_to_resource", kwargs)}
+
+    def remove_lf_tags_from_resource(self, **kwargs):
+        self._record("remove_lf_tags_from_resource", kwargs)
+        return {"Failures": self._failures("remove_lf_tags_from_resource", kwargs)}
+
+    def batch_grant_permissions(self, **kwargs):
+        self._record("batch_grant_permissions", kwargs)
+        return {"Failures": self._failures("batch_grant_permissions", kwargs)}
+
+    def batch_revoke_permissions(self, **kwargs):
+        self._record("batch_revoke_permissions", kwargs)
+        return {"Failures": self._failures("batch_revoke_permissions", kwargs)}
+
+
+def make_playbook(
+    account_id: str = "111122223333",
+    lf_client: FakeLakeFormationClient = None,
+    deployed_pb=None,
+):
+    """
+    A playbook wired to a fake lakeformation client, ready to ``apply_*``.
+    """
+    from ..core import Playbook
+
+    pb = Playbook(_skip_validation=True)
+    pb.account_id = account_id
+    pb.lf_client = FakeLakeFormationClient() if lf_client is None else lf_client
+    pb.deployed_pb = Playbook(_skip_validation=True) if deployed_pb is None else deployed_pb
+    return pb
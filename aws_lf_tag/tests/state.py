@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+"""
+Playbooks and assertions shared by the state backend tests.
+"""
+
+from ..core import (
+    Playbook, Database, Table, Column, IamRole, Tag, PermissionEnum,
+)
+
+aws_account_id = "111122223333"
+aws_region = "us-east-1"
+
+
+def make_state_playbook(n_tb: int = 3, n_col: int = 4) -> Playbook:
+    """
+    A playbook without clients, with ``n_tb`` tables of ``n_col`` columns
+    in one database, all attached to two "Admin" tag values, and an
+    "Empty" tag without attachment.
+    """
+    pb = Playbook(_skip_validation=True)
+    db = Database(account_id=aws_account_id, region=aws_region, name="db")
+    role = IamRole(arn=f"arn:aws:iam::{aws_account_id}:role/ec2-role")
+    resources = [db, ]
+    for i in range(n_tb):
+        tb = Table(name=f"tb{i}", database=db)
+        resources.append(tb)
+        for j in range(n_col):
+            resources.append(Column(name=f"col{j}", table=tb))
+    for value in ["y", "n"]:
+        tag = Tag(key="Admin", value=value, pb=pb)
+        tag.attach_to_resources(resources)
+        tag.attach_to_principal(role, [
+            PermissionEnum.DescribeDatabase.value,
+            PermissionEnum.Select.value,
+            PermissionEnum.SelectGrantable.value,
+        ])
+    Tag(key="Empty", value="y", pb=pb)
+    return pb
+
+
+def assert_same_playbook(pb1: Playbook, pb2: Playbook):
+    assert set(pb1.tags) == set(pb2.tags)
+    assert pb1.tag_mapper == pb2.tag_mapper
+    assert set(pb1.resource_attachment_mapper) == set(pb2.resource_attachment_mapper)
+    assert set(pb1.principal_attachment_mapper) == set(pb2.principal_attachment_mapper)
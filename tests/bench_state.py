@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark deployed state read / write on a synthetic playbook.
+
+Usage::
+
+    python tests/bench_state.py              # 1M resource attachments
+    python tests/bench_state.py 100000
+"""
+
+import sys
+import json
+import time
+import tempfile
+from pathlib import Path
+
+from aws_lf_tag.core import (
+    Playbook, Database, Table, Column, IamRole, Tag, PermissionEnum,
+)
+from aws_lf_tag.serializer import get_serializer
+from aws_lf_tag.state import read_state, write_state, load_state
+
+N_TAG = 10
+N_COL = 100
+
+
+def make_playbook(n_attachment: int) -> Playbook:
+    pb = Playbook(_skip_validation=True)
+    n_tb = max(1, n_attachment // (N_TAG * N_COL))
+    db = Database(account_id="111122223333", region="us-east-1", name="db")
+    columns = [
+        Column(name=f"col{j}", table=tb)
+        for tb in [Table(name=f"tb{i}", database=db) for i in range(n_tb)]
+        for j in range(N_COL)
+    ]
+    role = IamRole(arn="arn:aws:iam::111122223333:role/ec2-role")
+    for i in range(N_TAG):
+        tag = Tag(key="Level", value=str(i), pb=pb)
+        tag.attach_to_resources(columns)
+        tag.attach_to_principal(role, [PermissionEnum.Select.value])
+    return pb
+
+
+def timeit(func):
+    st = time.time()
+    result = func()
+    return time.time() - st, result
+
+
+def main(n_attachment: int):
+    pb = make_playbook(n_attachment)
+    print(f"{len(pb.resource_attachment_mapper)} resource attachments")
+    dir_tmp = Path(tempfile.mkdtemp())
+
+    # the original format: nested, indent=4, stdlib json
+    path = dir_tmp / "v1.json"
+    elapsed_write, _ = timeit(lambda: path.write_text(json.dumps(pb.serialize(), indent=4)))
+    elapsed_read, _ = timeit(lambda: Playbook.deserialize(json.loads(path.read_text())))
+    rows = [("v1 json indent=4", elapsed_write, elapsed_read, path.stat().st_size)]
+
+    cases = [
+        ("v2 json", "state.json", "json", True),
+        ("v2 json, no stream", "state.json", "json", False),
+        ("v2 orjson, no stream", "state.json", "orjson", False),
+        ("v2 orjson gzip", "state.json.gz", "orjson", True),
+        ("v2 msgpack", "state.msgpack", "msgpack", False),
+    ]
+    for label, filename, serializer_name, stream in cases:
+        try:
+            serializer = get_serializer(name=serializer_name)
+        except ValueError:
+            print(f"skip {label}, {serializer_name} is not installed")
+            continue
+        path = dir_tmp / filename
+        elapsed_write, _ = timeit(lambda: write_state(pb, path, serializer=serializer))
+        if stream:
+            elapsed_read, _ = timeit(lambda: read_state(path, stream=True))
+        else:
+            elapsed_read, _ = timeit(lambda: load_state(serializer.loads(path.read_bytes())))
+        rows.append((label, elapsed_write, elapsed_read, path.stat().st_size))
+
+    print(f"{'case':<24}{'write (s)':>12}{'read (s)':>12}{'size (MB)':>12}")
+    for label, elapsed_write, elapsed_read, size in rows:
+        print(f"{label:<24}{elapsed_write:>12.2f}{elapsed_read:>12.2f}{size / 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from aws_lf_tag.core import Database, Table, Column
+from aws_lf_tag.crawler import crawl_catalog
+from aws_lf_tag.bincat import write_binary_catalog, BinaryCatalog
+from aws_lf_tag.gen_code import gen_resource
+from aws_lf_tag.tests.fake import FakeGlueClient, FakeBotoSession, make_catalog
+
+aws_region = "us-east-1"
+aws_account_id = "111122223333"
+
+
+class TestBinaryCatalog:
+    def test(self, tmp_path):
+        catalog = make_catalog(5, 7, 9)
+        catalog["db3"]["tb_ünicode"] = ["id", "名字"]
+        glue_client = FakeGlueClient(catalog)
+        database_list = crawl_catalog(glue_client, aws_account_id, aws_region)
+
+        p = tmp_path / "catalog.lfcat"
+        write_binary_catalog(database_list, p)
+
+        with BinaryCatalog(p) as bc:
+            assert (bc.n_database, bc.n_table, bc.n_column) == (5, 36, 317)
+            assert bc.account_id == aws_account_id
+            assert bc.region == aws_region
+
+            db = bc.database("db3")
+            assert isinstance(db, Database)
+            assert db == database_list[3]
+
+            tb = bc.table("db3", "tb_ünicode")
+            assert isinstance(tb, Table)
+            assert tb.database is db
+
+            col = bc.column("db3", "tb_ünicode", "名字")
+            assert isinstance(col, Column)
+            assert col.table is tb
+            assert col.id == "111122223333____us-east-1____db3____tb_ünicode____名字"
+
+            assert [tb.name for tb in bc.tables("db0")] == sorted(catalog["db0"])
+            assert [col.name for col in bc.columns("db4", "tb6")] == sorted(catalog["db4"]["tb6"])
+            assert len(list(bc.iter_resources())) == 5 + 36 + 317
+
+            for args in [("db9",), ("db0", "tb9"), ("db0", "tb0", "col9")]:
+                with pytest.raises(KeyError):
+                    [bc.database, bc.table, bc.column][len(args) - 1](*args)
+
+    def test_empty(self, tmp_path):
+        p = tmp_path / "catalog.lfcat"
+        write_binary_catalog([], p)
+        with BinaryCatalog(p) as bc:
+            assert list(bc.databases()) == []
+
+    def test_invalid_file(self, tmp_path):
+        p = tmp_path / "catalog.lfcat"
+        p.write_bytes(b"not a binary catalog file")
+        with pytest.raises(ValueError):
+            BinaryCatalog(p)
+
+
+def test_gen_resource_binary(tmp_path):
+    glue_client = FakeGlueClient(make_catalog(2, 2, 2))
+    boto_ses = FakeBotoSession(aws_account_id, aws_region, glue=glue_client)
+    gen_resource(boto_ses, str(tmp_path), binary=True)
+    with BinaryCatalog(tmp_path / "resource_111122223333_us_east_1.lfcat") as bc:
+        assert bc.column("db1", "tb1", "col1").id == "111122223333____us-east-1____db1____tb1____col1"
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from aws_lf_tag.boto_utils import list_iam_users, list_iam_roles
+from aws_lf_tag.gen_code import gen_principal
+from aws_lf_tag.tests.fake import FakeIamClient, FakeBotoSession
+
+aws_region = "us-east-1"
+aws_account_id = "111122223333"
+
+
+def test_list_iam_users_and_roles():
+    iam_client = FakeIamClient(
+        aws_account_id,
+        user_names=[f"user{i}" for i in range(25)],
+        role_names=[f"role{i}" for i in range(15)] + ["data-team/analyst"],
+        page_size=10,
+    )
+    assert len(list_iam_users(iam_client)) == 25
+    assert iam_client.calls["list_users"] == 3
+    assert len(list_iam_roles(iam_client)) == 16
+
+    role_dct_list = list_iam_roles(iam_client, path_prefix="/data-team/")
+    assert [dct["Arn"] for dct in role_dct_list] == [
+        "arn:aws:iam::111122223333:role/data-team/analyst",
+    ]
+
+
+def test_gen_principal(tmp_path):
+    iam_client = FakeIamClient(
+        aws_account_id,
+        user_names=[f"user{i}" for i in range(5)],
+        role_names=[f"role{i}" for i in range(5)] + ["data-team/analyst"],
+        page_size=2,
+        latency=0.05,
+    )
+    boto_ses = FakeBotoSession(aws_account_id, aws_region, iam=iam_client)
+    p = gen_principal(boto_ses, str(tmp_path))
+    # users and roles are listed concurrently
+    assert iam_client.max_in_flight == 2
+    content = p.read_text()
+    assert "user_user4 = " in content
+    assert "role_data_team__analyst = " in content
+
+    p = gen_principal(boto_ses, str(tmp_path), path_prefix="/data-team/")
+    content = p.read_text()
+    assert "user_user4 = " not in content
+    assert "role_data_team__analyst = " in content
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
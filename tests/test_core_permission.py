@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from aws_lf_tag.core import (
+    PermissionEnum, PermissionSet, Tag, IamRole, group_permissions,
+)
+from aws_lf_tag.tests.fake import make_playbook
+
+
+class TestPermissionSet:
+    def test(self):
+        ps1 = PermissionSet.from_permissions([
+            PermissionEnum.Select.value,
+            PermissionEnum.Insert.value,
+            PermissionEnum.SelectGrantable.value,
+        ])
+        assert ps1.permissions == ["SELECT", "INSERT"]
+        assert ps1.permissions_with_grant_option == ["SELECT"]
+        assert [p.id for p in ps1.to_permissions("TABLE")] == [
+            "Select", "Insert", "SelectGrantable",
+        ]
+
+        ps2 = PermissionSet.from_permissions([
+            PermissionEnum.Select.value,
+            PermissionEnum.Delete.value,
+        ])
+        assert (ps1 - ps2).permissions == ["INSERT"]
+        assert (ps1 - ps2).permissions_with_grant_option == ["SELECT"]
+        assert (ps1 & ps2).permissions == ["SELECT"]
+        assert (ps1 | ps2).permissions == ["SELECT", "INSERT", "DELETE"]
+        assert not (ps2 - ps1 - ps2)
+        assert ps1 == PermissionSet(ps1.mask, ps1.grantable_mask)
+
+    def test_group_permissions(self):
+        role = IamRole(arn="arn:aws:iam::111122223333:role/ec2-role")
+        tag = Tag(key="Admin", value="y")
+        tag.attach_to_principal(role, [
+            PermissionEnum.DescribeDatabase.value,
+            PermissionEnum.Select.value,
+            PermissionEnum.SelectGrantable.value,
+        ])
+        groups = group_permissions([tag, ])
+        assert groups[(role.id, "Admin", "y", "DATABASE")].permissions == ["DESCRIBE"]
+        table_ps = groups[(role.id, "Admin", "y", "TABLE")]
+        assert table_ps.permissions == ["SELECT"]
+        assert table_ps.permissions_with_grant_option == ["SELECT"]
+
+
+class TestApplyPrincipals:
+    def test(self):
+        role = IamRole(arn="arn:aws:iam::111122223333:role/ec2-role")
+        deployed_pb = make_playbook()
+        tag = Tag(key="Admin", value="y", pb=deployed_pb)
+        tag.attach_to_principal(role, [
+            PermissionEnum.Select.value,
+            PermissionEnum.Delete.value,
+        ])
+
+        pb = make_playbook(deployed_pb=deployed_pb)
+        tag = Tag(key="Admin", value="y", pb=pb)
+        tag.attach_to_principal(role, [
+            PermissionEnum.Select.value,
+            PermissionEnum.Insert.value,
+            PermissionEnum.InsertGrantable.value,
+        ])
+        pb.apply_principals(verbose=False)
+
+        (api, grant), = [
+            call for call in pb.lf_client.calls
+            if call[0] == "batch_grant_permissions"
+        ]
+        entry, = grant["Entries"]
+        assert entry["Permissions"] == ["INSERT"]
+        assert entry["PermissionsWithGrantOption"] == ["INSERT"]
+
+        (api, revoke), = [
+            call for call in pb.lf_client.calls
+            if call[0] == "batch_revoke_permissions"
+        ]
+        entry, = revoke["Entries"]
+        assert entry["Permissions"] == ["DELETE"]
+        assert "PermissionsWithGrantOption" not in entry
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
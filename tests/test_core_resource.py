@@ -35,6 +35,11 @@ class TestResource(BaseTest):
         assert self.col.id == "111122223333____us-east-1____db____tb____col"
         assert self.col.attr_safe_name == "col"
 
+    def test_slots(self):
+        for resource in [self.db, self.tb, self.col]:
+            assert not hasattr(resource, "__dict__")
+            assert hash(resource) == hash(resource.id)
+
     def test_seder(self):
         assert isinstance(Resource.deserialize(self.db.serialize()), Database)
         assert isinstance(Resource.deserialize(self.tb.serialize()), Table)
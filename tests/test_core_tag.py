@@ -25,6 +25,8 @@ class TestPrincipalAttachment:
 
         pa1 = PrincipalAttachment.deserialize(pa.serialize())
         assert pa1 == pa
+        assert hash(pa1) == hash(pa)
+        assert not hasattr(pa, "__dict__")
 
 
 class TestResourceAttachment:
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from aws_lf_tag.crawler import get_databases, iter_catalog, crawl_catalog
+from aws_lf_tag.tests.fake import FakeGlueClient, make_catalog
+
+aws_region = "us-east-1"
+aws_account_id = "111122223333"
+
+
+def test_get_databases():
+    glue_client = FakeGlueClient(make_catalog(25, 1, 1), page_size=10)
+    db_dct_list = get_databases(glue_client, aws_account_id)
+    assert [dct["Name"] for dct in db_dct_list] == [f"db{i}" for i in range(25)]
+    assert glue_client.calls["get_databases"] == 3
+
+
+def test_iter_catalog():
+    catalog = make_catalog(20, 35, 3)
+    catalog["db_empty"] = dict()
+    glue_client = FakeGlueClient(catalog, page_size=10)
+    result = list(iter_catalog(glue_client, aws_account_id, max_workers=4))
+
+    # database order is preserved and every table page is followed
+    assert [db_dct["Name"] for db_dct, _ in result] == list(catalog)
+    for db_dct, tb_dct_list in result:
+        assert [
+            tb_dct["Name"] for tb_dct in tb_dct_list
+        ] == list(catalog[db_dct["Name"]])
+    assert glue_client.calls["get_tables"] == 20 * 4 + 1
+
+
+def test_crawl_catalog():
+    glue_client = FakeGlueClient(make_catalog(3, 12, 4), page_size=5)
+    database_list = crawl_catalog(
+        glue_client, aws_account_id, aws_region, max_workers=2,
+    )
+    assert len(database_list) == 3
+    db = database_list[0]
+    assert db.id == "111122223333____us-east-1____db0"
+    assert len(db.t) == 12
+    assert db.t["tb11"].c["col3"].id == "111122223333____us-east-1____db0____tb11____col3"
+
+
+def test_crawl_catalog_concurrency():
+    # get_tables calls run in parallel, up to max_workers at a time
+    glue_client = FakeGlueClient(make_catalog(20, 1, 1), latency=0.05)
+    crawl_catalog(glue_client, aws_account_id, aws_region, max_workers=20)
+    assert 1 < glue_client.max_in_flight <= 20
+
+    glue_client = FakeGlueClient(make_catalog(20, 1, 1), latency=0.01)
+    crawl_catalog(glue_client, aws_account_id, aws_region, max_workers=4)
+    assert 1 < glue_client.max_in_flight <= 4
+
+    glue_client = FakeGlueClient(make_catalog(20, 1, 1), latency=0.01)
+    crawl_catalog(glue_client, aws_account_id, aws_region, max_workers=1)
+    assert glue_client.max_in_flight == 1
+
+
+def test_crawl_empty_catalog():
+    glue_client = FakeGlueClient(dict())
+    assert crawl_catalog(glue_client, aws_account_id, aws_region) == []
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+from aws_lf_tag.core import (
+    Playbook, Database, Table, Column, IamRole, Tag, PermissionEnum,
+)
+from aws_lf_tag.digest import (
+    compute_digests, merge_digests, get_changed_phases,
+    PHASE_TAGS, PHASE_RESOURCES, PHASE_PRINCIPALS,
+)
+from aws_lf_tag.journal import JournalStateBackend
+from aws_lf_tag.sqlite_state import SqliteStateBackend
+from aws_lf_tag.state import JsonStateBackend, read_digests
+from aws_lf_tag.tests.fake import make_playbook
+
+aws_account_id = "111122223333"
+aws_region = "us-east-1"
+
+db = Database(account_id=aws_account_id, region=aws_region, name="db")
+tb = Table(name="tb", database=db)
+col = Column(name="col", table=tb)
+role = IamRole(arn=f"arn:aws:iam::{aws_account_id}:role/ec2-role")
+
+
+def add_tags(pb: Playbook, reverse=False):
+    resources = [db, tb, col]
+    values = ["y", "n"]
+    if reverse:
+        resources.reverse()
+        values.reverse()
+    for value in values:
+        tag = Tag(key="Admin", value=value, pb=pb)
+        tag.attach_to_resources(resources)
+        tag.attach_to_principal(role, [PermissionEnum.Select.value])
+    tag = Tag(key="Regular", value="y", pb=pb)
+    tag.attach_to_resource(tb)
+    tag.attach_to_principal(role, [PermissionEnum.DescribeTable.value])
+    return pb
+
+
+def test_compute_digests():
+    digests = compute_digests(add_tags(Playbook(_skip_validation=True)))
+    assert set(digests) == {"Admin", "Regular"}
+    assert all(len(digest) == 3 for digest in digests.values())
+    # same content, different build order
+    assert digests == compute_digests(
+        add_tags(Playbook(_skip_validation=True), reverse=True)
+    )
+
+    pb = add_tags(Playbook(_skip_validation=True))
+    pb.tags["Admin____y"].detach_from_resource(col)
+    assert get_changed_phases(compute_digests(pb), digests) == {
+        "Admin": [PHASE_RESOURCES, ],
+    }
+    assert get_changed_phases(digests, dict()) == {
+        "Admin": [PHASE_TAGS, PHASE_RESOURCES, PHASE_PRINCIPALS],
+        "Regular": [PHASE_TAGS, PHASE_RESOURCES, PHASE_PRINCIPALS],
+    }
+    assert get_changed_phases(dict(), digests, tag_keys=["Regular"]) == {
+        "Regular": [PHASE_TAGS, PHASE_RESOURCES, PHASE_PRINCIPALS],
+    }
+
+
+def test_merge_digests():
+    old = {"a": ["1", "1", "1"], "b": ["1", "1", "1"]}
+    new = {"a": ["2", "2", "2"]}
+    assert merge_digests(old, new) == new
+    assert merge_digests(old, new, tag_keys=["a"]) == {
+        "a": ["2", "2", "2"], "b": ["1", "1", "1"],
+    }
+    assert merge_digests(old, dict(), tag_keys=["b"]) == {"a": ["1", "1", "1"]}
+
+
+@pytest.mark.parametrize(
+    "make_backend",
+    [
+        lambda tmp_path: JsonStateBackend(tmp_path / "deployed.json.gz"),
+        lambda tmp_path: JournalStateBackend(tmp_path / "deployed.json"),
+        lambda tmp_path: SqliteStateBackend(tmp_path / "deployed.sqlite"),
+    ],
+)
+def test_apply_fast_path(tmp_path, make_backend, capsys):
+    backend = make_backend(tmp_path)
+    pb = make_playbook()
+    pb.state_backend = backend
+    add_tags(pb)
+    pb.apply(verbose=False)
+    assert len(pb.lf_client.calls)
+    assert backend.load_digests() == compute_digests(pb)
+
+    # nothing changed, no api call
+    pb = make_playbook()
+    pb.state_backend = backend
+    add_tags(pb, reverse=True)
+    capsys.readouterr()
+    pb.apply(verbose=False)
+    assert pb.lf_client.calls == []
+    assert "Nothing changed" not in capsys.readouterr().out
+    pb.apply()
+    assert "Nothing changed" in capsys.readouterr().out
+
+    # force diffs everything, still nothing to do
+    pb.apply(verbose=False, force=True)
+    assert pb.lf_client.calls == []
+
+    # only the resource phase of "Admin" runs
+    pb = make_playbook()
+    pb.state_backend = backend
+    add_tags(pb)
+    pb.tags["Admin____y"].detach_from_resource(col)
+    pb.apply(verbose=False)
+    assert [call[0] for call in pb.lf_client.calls] == [
+        "remove_lf_tags_from_resource",
+    ]
+    assert backend.load_digests() == compute_digests(pb)
+
+    # remove a tag key
+    pb.remove_tag("Regular____y")
+    pb.lf_client.calls.clear()
+    pb.apply(verbose=False)
+    assert "delete_lf_tag" in [call[0] for call in pb.lf_client.calls]
+    assert set(backend.load_digests()) == {"Admin", }
+    assert set(backend.load().tags) == {"Admin____y", "Admin____n"}
+
+    # the short lived subset / merged playbooks are not kept on the tags
+    for _ in range(3):
+        pb.tags["Admin____y"].attach_to_resource(col)
+        pb.apply(verbose=False)
+        pb.tags["Admin____y"].detach_from_resource(col)
+        pb.apply(verbose=False)
+    assert all(tag.playbooks == [pb] for tag in pb.tags.values())
+
+
+def test_apply_without_deployed_digests(tmp_path):
+    # a version 1 state has no digests
+    deployed_pb = Playbook(_skip_validation=True)
+    for key in ["Old", "Keep"]:
+        Tag(key=key, value="y", pb=deployed_pb).attach_to_resource(tb)
+    path = tmp_path / "deployed.json"
+    path.write_text(json.dumps(deployed_pb.serialize()))
+
+    pb = make_playbook()
+    pb.state_backend = JsonStateBackend(path)
+    Tag(key="Keep", value="y", pb=pb).attach_to_resource(tb)
+    pb.apply(verbose=False)
+    assert [api for api, _ in pb.lf_client.calls] == [
+        "remove_lf_tags_from_resource", "delete_lf_tag",
+    ]
+    assert set(pb.state_backend.load().tags) == {"Keep____y", }
+
+
+def test_read_digests_no_digests(tmp_path):
+    path = tmp_path / "deployed.json"
+    path.write_text('{"tags": {}}')
+    assert read_digests(path) == dict()
+    assert read_digests(tmp_path / "not-exists.json") == dict()
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+from aws_lf_tag.core import Database, Table, Tag
+from aws_lf_tag.executor import (
+    TokenBucket, AimdLimiter, ApplyExecutor, make_boto_config,
+    API_FAMILY_RESOURCE,
+)
+from aws_lf_tag.tests.fake import (
+    FakeLakeFormationClient, ThrottlingLakeFormationClient, make_playbook,
+)
+from botocore.exceptions import ClientError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock, sleep=clock.sleep)
+    # burst
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    # then 2 per second
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert bucket.acquire() == pytest.approx(0.5)
+    clock.now += 10
+    # never more than the capacity
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(0.5)
+
+
+def test_run():
+    client = FakeLakeFormationClient(latency=0.05)
+    executor = ApplyExecutor(max_workers=10, rates={API_FAMILY_RESOURCE: (1000, 1000)})
+    calls = [
+        ("add_lf_tags_to_resource", dict(i=i))
+        for i in range(20)
+    ]
+    results = executor.run(client, calls)
+    assert 1 < client.max_in_flight <= 10
+    assert results == [{"Failures": []}] * 20
+    assert sorted(kwargs["i"] for _, kwargs in client.calls) == list(range(20))
+
+    # single worker, same order
+    client = FakeLakeFormationClient(latency=0.01)
+    ApplyExecutor(max_workers=1).run(client, calls)
+    assert [kwargs["i"] for _, kwargs in client.calls] == list(range(20))
+    assert client.max_in_flight == 1
+
+
+def test_run_error():
+    class Client(FakeLakeFormationClient):
+        def add_lf_tags_to_resource(self, **kwargs):
+            if kwargs["i"] == 3:
+                raise ValueError
+            return super().add_lf_tags_to_resource(**kwargs)
+
+    client = Client()
+    calls = [("add_lf_tags_to_resource", dict(i=i)) for i in range(10)]
+    with pytest.raises(ValueError):
+        ApplyExecutor(max_workers=4).run(client, calls)
+    # the other calls are done
+    assert client.count("add_lf_tags_to_resource") == 9
+
+
+def test_rate_limit():
+    # a call starts every 50 ms and takes 10 ms, the 10 workers never overlap
+    executor = ApplyExecutor(max_workers=10, rates={API_FAMILY_RESOURCE: (20, 1)})
+    calls = [("add_lf_tags_to_resource", dict()) for _ in range(6)]
+    client = FakeLakeFormationClient(latency=0.01)
+    executor.run(client, calls)
+    assert client.count("add_lf_tags_to_resource") == 6
+    assert client.max_in_flight == 1
+
+
+def test_make_boto_config():
+    assert make_boto_config(50).max_pool_connections == 50
+    assert make_boto_config(1).max_pool_connections == 10
+    assert make_boto_config().retries["total_max_attempts"] == 1
+
+
+def no_sleep(seconds: float):
+    pass
+
+
+def test_aimd_limiter():
+    limiter = AimdLimiter(max_limit=8)
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 4
+    limiter.acquire()
+    limiter.release(throttled=True)
+    limiter.acquire()
+    limiter.release(throttled=True)
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 1
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 8
+
+
+def test_aimd_limiter_one_decrease_per_window():
+    limiter = AimdLimiter(max_limit=8)
+    # 4 calls in flight are throttled by the same congestion
+    generations = [limiter.acquire() for _ in range(4)]
+    for generation in generations:
+        limiter.release(throttled=True, generation=generation)
+    assert limiter.limit == 4
+
+    # a call acquired after the decrease is a new window
+    generation = limiter.acquire()
+    limiter.release(throttled=True, generation=generation)
+    assert limiter.limit == 2
+
+
+def test_concurrent_throttles():
+    class Client(FakeLakeFormationClient):
+        def __init__(self):
+            super().__init__()
+            self.barrier = threading.Barrier(8)
+            self.throttled = set()
+
+        def add_lf_tags_to_resource(self, **kwargs):
+            with self.lock:
+                first = kwargs["i"] not in self.throttled
+                self.throttled.add(kwargs["i"])
+            if first:
+                # the 8 calls are all in flight when they are throttled
+                self.barrier.wait(timeout=5)
+                raise ClientError(
+                    {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+                    "add_lf_tags_to_resource",
+                )
+            return super().add_lf_tags_to_resource(**kwargs)
+
+    client = Client()
+    executor = ApplyExecutor(
+        max_workers=8,
+        rates={API_FAMILY_RESOURCE: (10000, 10000)},
+        sleep=no_sleep,
+    )
+    executor.run(client, [("add_lf_tags_to_resource", dict(i=i)) for i in range(8)])
+    assert executor.get_stats()["add_lf_tags_to_resource"]["throttles"] == 8
+    # halved once to 4 then + 8 successes is about 5.7, halved 8 times
+    # down to 1 then + 8 successes would be about 4.3
+    assert 5 < executor.limiter.limit < 8
+
+
+def test_retry():
+    client = ThrottlingLakeFormationClient(throttle_first=3)
+    executor = ApplyExecutor(sleep=no_sleep)
+    assert executor.call(client, "add_lf_tags_to_resource", dict()) == {"Failures": []}
+    assert executor.get_stats() == {
+        "add_lf_tags_to_resource": dict(
+            calls=4, retries=3, throttles=3, failures=0,
+            retried_entries=0, failed_entries=0,
+        ),
+    }
+    assert executor.limiter.limit < executor.max_workers
+
+    # not a throttle, retried but the concurrency limit is not lowered
+    client = ThrottlingLakeFormationClient(
+        throttle_first=1, error_code="ConcurrentModificationException",
+    )
+    executor = ApplyExecutor(sleep=no_sleep)
+    executor.call(client, "create_lf_tag", dict())
+    assert executor.get_stats()["create_lf_tag"]["retries"] == 1
+    assert executor.get_stats()["create_lf_tag"]["throttles"] == 0
+    assert executor.limiter.limit == executor.max_workers
+
+    # give up
+    client = ThrottlingLakeFormationClient(throttle_first=100)
+    executor = ApplyExecutor(max_attempts=3, sleep=no_sleep)
+    with pytest.raises(ClientError):
+        executor.call(client, "create_lf_tag", dict())
+    assert executor.get_stats()["create_lf_tag"] == dict(
+        calls=3, retries=2, throttles=3, failures=1,
+        retried_entries=0, failed_entries=0,
+    )
+
+    # not retryable
+    client = ThrottlingLakeFormationClient(
+        throttle_first=1, error_code="AccessDeniedException",
+    )
+    executor = ApplyExecutor(sleep=no_sleep)
+    with pytest.raises(ClientError):
+        executor.call(client, "create_lf_tag", dict())
+    assert executor.get_stats()["create_lf_tag"]["failures"] == 1
+
+
+def test_backoff():
+    executor = ApplyExecutor(base_delay=1, max_delay=5)
+    assert 0 <= executor.get_backoff(1) <= 1
+    assert all(executor.get_backoff(10) <= 5 for _ in range(100))
+
+
+def test_adaptive_concurrency():
+    client = ThrottlingLakeFormationClient(latency=0.01, capacity=3)
+    executor = ApplyExecutor(
+        max_workers=16,
+        rates={API_FAMILY_RESOURCE: (10000, 10000)},
+        base_delay=0.01,
+    )
+    calls = [("add_lf_tags_to_resource", dict(i=i)) for i in range(100)]
+    executor.run(client, calls)
+    assert client.count("add_lf_tags_to_resource") == 100
+    stats = executor.get_stats()["add_lf_tags_to_resource"]
+    assert stats["throttles"] == len(client.throttles) > 0
+    assert stats["failures"] == 0
+    assert executor.limiter.limit < 16
+
+
+def test_apply_throttled(tmp_path):
+    from aws_lf_tag.state import JsonStateBackend
+
+    pb = make_playbook(lf_client=ThrottlingLakeFormationClient(throttle_first=2))
+    pb.executor = ApplyExecutor(sleep=no_sleep)
+    pb.state_backend = JsonStateBackend(tmp_path / "deployed.json")
+    db = Database(account_id=pb.account_id, region="us-east-1", name="db")
+    tag = Tag(key="Admin", value="y", pb=pb)
+    tag.attach_to_resources([Table(name=f"tb{i}", database=db) for i in range(3)])
+    pb.apply(verbose=False)
+    assert pb.lf_client.count("create_lf_tag") == 1
+    assert pb.lf_client.count("add_lf_tags_to_resource") == 3
+    assert set(pb.state_backend.load().tags) == {"Admin____y", }
+
+
+def test_apply_with_executor():
+    executor = ApplyExecutor(max_workers=8, rates={API_FAMILY_RESOURCE: (1000, 1000)})
+    pb = make_playbook(lf_client=FakeLakeFormationClient(latency=0.01))
+    pb.executor = executor
+    db = Database(account_id=pb.account_id, region="us-east-1", name="db")
+    tag = Tag(key="Admin", value="y", pb=pb)
+    tag.attach_to_resources([Table(name=f"tb{i}", database=db) for i in range(40)])
+    pb.apply_tags(verbose=False)
+    pb.apply_resources(verbose=False)
+    assert pb.lf_client.count("create_lf_tag") == 1
+    assert pb.lf_client.count("add_lf_tags_to_resource") == 40
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from aws_lf_tag.core import (
+    Playbook, Database, Table, IamRole, Tag, PermissionEnum,
+)
+from aws_lf_tag.executor import ApplyExecutor
+from aws_lf_tag.state import JsonStateBackend
+from aws_lf_tag.tests.fake import PartialFailureLakeFormationClient, make_playbook
+from botocore.exceptions import ClientError
+
+aws_account_id = "111122223333"
+aws_region = "us-east-1"
+
+db = Database(account_id=aws_account_id, region=aws_region, name="db")
+tb = Table(name="tb", database=db)
+role1 = IamRole(arn=f"arn:aws:iam::{aws_account_id}:role/role1")
+role2 = IamRole(arn=f"arn:aws:iam::{aws_account_id}:role/role2")
+
+
+def no_sleep(seconds: float):
+    pass
+
+
+def get_principal(entry: dict) -> str:
+    return entry["Principal"]["DataLakePrincipalIdentifier"]
+
+
+def add_tags(pb: Playbook):
+    tag = Tag(key="Admin", value="y", pb=pb)
+    tag.attach_to_resources([db, tb])
+    tag.attach_to_principal(role1, [PermissionEnum.Select.value])
+    tag.attach_to_principal(role2, [PermissionEnum.Select.value])
+    return pb
+
+
+def make(tmp_path, should_fail) -> Playbook:
+    pb = make_playbook(lf_client=PartialFailureLakeFormationClient(should_fail))
+    pb.executor = ApplyExecutor(sleep=no_sleep)
+    pb.state_backend = JsonStateBackend(tmp_path / "deployed.json")
+    return pb
+
+
+def test_retry_failed_entries_only(tmp_path):
+    attempts = dict()
+
+    def should_fail(api, entry):
+        if api != "batch_grant_permissions":
+            return None
+        attempts[entry["Id"]] = attempts.get(entry["Id"], 0) + 1
+        if get_principal(entry) == role1.id and attempts[entry["Id"]] <= 2:
+            return "ConcurrentModificationException"
+
+    pb = add_tags(make(tmp_path, should_fail))
+    pb.apply(verbose=False)
+    entries = [
+        entry
+        for api, kwargs in pb.lf_client.calls
+        if api == "batch_grant_permissions"
+        for entry in kwargs["Entries"]
+    ]
+    # role1 entry is sent 3 times, role2 entry only once
+    assert sorted(get_principal(entry) for entry in entries) == [
+        role1.id, role1.id, role1.id, role2.id,
+    ]
+    assert not pb.not_applied
+    stats = pb.executor.get_stats()["batch_grant_permissions"]
+    assert stats["retried_entries"] == 2
+    assert stats["failed_entries"] == 0
+    assert len(pb.state_backend.load().principal_attachment_mapper) == 2
+
+
+def test_failed_grant_not_saved(tmp_path):
+    def should_fail(api, entry):
+        if api == "batch_grant_permissions" and get_principal(entry) == role1.id:
+            return "AccessDeniedException"
+
+    pb = add_tags(make(tmp_path, should_fail))
+    pb.apply(verbose=False)
+    # not retryable, sent once
+    assert pb.lf_client.count("batch_grant_permissions") == 1
+    assert [pa.principal.id for pa in pb.not_applied.not_added.values()] == [role1.id]
+    assert len(pb.not_applied.errors) == 1
+
+    deployed_pb = pb.state_backend.load()
+    assert {
+        pa.principal.id for pa in deployed_pb.principal_attachment_mapper.values()
+    } == {role2.id, }
+    assert len(deployed_pb.resource_attachment_mapper) == 2
+    # the desired playbook is untouched
+    assert len(pb.principal_attachment_mapper) == 2
+
+    # the next apply grants it again
+    pb.lf_client.should_fail = lambda api, entry: None
+    pb.lf_client.calls.clear()
+    pb.apply(verbose=False)
+    assert [
+        [get_principal(entry) for entry in kwargs["Entries"]]
+        for api, kwargs in pb.lf_client.calls
+    ] == [[role1.id]]
+
+
+def test_failed_revoke_kept(tmp_path):
+    pb = add_tags(make(tmp_path, lambda api, entry: None))
+    pb.apply(verbose=False)
+
+    def should_fail(api, entry):
+        if api == "batch_revoke_permissions" and get_principal(entry) == role1.id:
+            return "AccessDeniedException"
+
+    pb = make(tmp_path, should_fail)
+    tag = Tag(key="Admin", value="y", pb=pb)
+    tag.attach_to_resources([db, tb])
+    pb.apply(verbose=False)
+    assert {
+        pa.principal.id
+        for pa in pb.state_backend.load().principal_attachment_mapper.values()
+    } == {role1.id, }
+
+
+def test_failed_revoke_keeps_tag_value(tmp_path):
+    def add_tag(pb: Playbook, value: str):
+        tag = Tag(key="K", value=value, pb=pb)
+        tag.attach_to_principal(role1, [PermissionEnum.DescribeDatabase.value])
+
+    pb = make(tmp_path, lambda api, entry: None)
+    add_tag(pb, "a")
+    add_tag(pb, "b")
+    pb.apply(verbose=False)
+
+    def should_fail(api, entry):
+        if api == "batch_revoke_permissions":
+            return "AccessDeniedException"
+
+    # value "b" is removed, but its grant can't be revoked
+    pb = make(tmp_path, should_fail)
+    add_tag(pb, "a")
+    pb.apply(verbose=False)
+    assert [api for api, _ in pb.lf_client.calls] == ["batch_revoke_permissions"]
+    assert set(pb.state_backend.load().tags) == {"K____a", "K____b"}
+
+    # the tag key is removed, none of its grant can be revoked
+    pb = make(tmp_path, should_fail)
+    pb.apply(verbose=False)
+    assert [api for api, _ in pb.lf_client.calls] == ["batch_revoke_permissions"]
+    assert set(pb.state_backend.load().tags) == {"K____a", "K____b"}
+
+    # once the revoke works, the tag key is deleted
+    pb = make(tmp_path, lambda api, entry: None)
+    pb.apply(verbose=False)
+    assert [api for api, _ in pb.lf_client.calls] == [
+        "batch_revoke_permissions", "delete_lf_tag",
+    ]
+    assert set(pb.state_backend.load().tags) == set()
+
+
+def test_failed_delete_tag_kept(tmp_path):
+    class Client(PartialFailureLakeFormationClient):
+        def delete_lf_tag(self, **kwargs):
+            raise ClientError(
+                {"Error": {"Code": "AccessDeniedException", "Message": "denied"}},
+                "delete_lf_tag",
+            )
+
+    pb = add_tags(make(tmp_path, lambda api, entry: None))
+    pb.apply(verbose=False)
+
+    pb = make(tmp_path, lambda api, entry: None)
+    pb.lf_client = Client(lambda api, entry: None)
+    with pytest.raises(ClientError):
+        pb.apply(verbose=False)
+    # detached and revoked, but the tag itself still exists
+    deployed_pb = pb.state_backend.load()
+    assert set(deployed_pb.tags) == {"Admin____y", }
+    assert len(deployed_pb.resource_attachment_mapper) == 0
+    assert len(deployed_pb.principal_attachment_mapper) == 0
+
+    pb = make(tmp_path, lambda api, entry: None)
+    pb.apply(verbose=False)
+    assert [api for api, _ in pb.lf_client.calls] == ["delete_lf_tag"]
+    assert set(pb.state_backend.load().tags) == set()
+
+
+def test_failed_resource_attachment(tmp_path):
+    def should_fail(api, item):
+        if api == "add_lf_tags_to_resource" and item.get("TagKey") == "Admin":
+            return "AccessDeniedException"
+
+    pb = make(tmp_path, should_fail)
+    tag = Tag(key="Admin", value="y", pb=pb)
+    tag.attach_to_resource(tb)
+    tag = Tag(key="Regular", value="y", pb=pb)
+    tag.attach_to_resource(tb)
+    pb.apply(verbose=False)
+    assert set(pb.state_backend.load().resource_attachment_mapper) == {
+        ra.id for ra in tag.resource_attachments.values()
+    }
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
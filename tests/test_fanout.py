@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from aws_lf_tag.fanout import gen_all
+from aws_lf_tag.tests.fake import (
+    FakeGlueClient, FakeIamClient, FakeBotoSession, make_catalog,
+)
+
+
+def make_boto_ses(account_id, region, latency=0.0):
+    return FakeBotoSession(
+        account_id,
+        region,
+        glue=FakeGlueClient(make_catalog(2, 3, 2), latency=latency),
+        iam=FakeIamClient(account_id, ["alice"], ["ec2-role"], latency=latency),
+    )
+
+
+def test_gen_all(tmp_path):
+    targets = [
+        make_boto_ses(account_id, region, latency=0.05)
+        for account_id in ["111111111111", "222222222222"]
+        for region in ["us-east-1", "us-west-1", "eu-west-1", "ap-east-1"]
+    ]
+    # all targets share one glue client, it sees the calls of every target
+    glue_client = targets[0].clients["glue"]
+    for target in targets:
+        target.clients["glue"] = glue_client
+    reports = gen_all(targets, str(tmp_path))
+    # a single target has at most 2 get_tables calls in flight, one per
+    # database, more means the targets run in parallel
+    assert glue_client.max_in_flight > 2
+
+    assert [r.kind for r in reports].count("resource") == 8
+    assert [r.kind for r in reports].count("principal") == 2
+    for report in reports:
+        assert report.error is None
+        assert report.elapsed > 0
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        [
+            f"resource_{account_id}_{region.replace('-', '_')}.py"
+            for account_id in ["111111111111", "222222222222"]
+            for region in ["us-east-1", "us-west-1", "eu-west-1", "ap-east-1"]
+        ] + ["principal_111111111111.py", "principal_222222222222.py"]
+    )
+
+
+def test_gen_all_error(tmp_path):
+    bad_target = make_boto_ses("111111111111", "us-east-1")
+    del bad_target.clients["glue"]
+    good_target = make_boto_ses("111111111111", "us-west-1")
+    reports = gen_all(
+        [bad_target, good_target], str(tmp_path),
+        principal=False,
+        resource_kwargs=dict(lazy=True),
+    )
+    assert reports[0].error == "KeyError: 'glue'"
+    assert reports[1].error is None
+    assert "make_lazy_resource_module" in open(reports[1].path).read()
+
+
+def test_gen_all_account_id_error(tmp_path):
+    bad_target = make_boto_ses("111111111111", "us-east-1")
+    del bad_target.clients["sts"]
+    good_target = make_boto_ses("222222222222", "us-west-1")
+    reports = gen_all([bad_target, good_target], str(tmp_path))
+    assert [(r.kind, r.region, r.error) for r in reports[:2]] == [
+        ("resource", "us-east-1", "KeyError: 'sts'"),
+        ("principal", "us-east-1", "KeyError: 'sts'"),
+    ]
+    assert [(r.kind, r.account_id, r.error) for r in reports[2:]] == [
+        ("resource", "222222222222", None),
+        ("principal", "222222222222", None),
+    ]
+
+
+def test_gen_all_process_pool_requires_profile(tmp_path):
+    with pytest.raises(TypeError):
+        gen_all([make_boto_ses("111111111111", "us-east-1")], str(tmp_path), use_process=True)
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import importlib
+
+import pytest
+from aws_lf_tag.core import Database, Column, IamRole, IamUser
+from aws_lf_tag.crawler import iter_databases
+from aws_lf_tag.gen_code import (
+    gen_resource, gen_principal, render_to_file, Template, tpl_resource,
+)
+from aws_lf_tag.tests.fake import (
+    FakeGlueClient, FakeIamClient, FakeBotoSession, make_catalog,
+)
+
+aws_region = "us-east-1"
+aws_account_id = "111122223333"
+
+
+@pytest.fixture
+def boto_ses():
+    return FakeBotoSession(
+        aws_account_id,
+        aws_region,
+        glue=FakeGlueClient(make_catalog(3, 4, 5)),
+        iam=FakeIamClient(
+            aws_account_id,
+            user_names=["alice", "bob"],
+            role_names=["ec2-role", "aws-service-role/ecs.amazonaws.com/AWSServiceRoleForECS"],
+        ),
+    )
+
+
+def import_module(dir_path, module_name):
+    sys.path.insert(0, str(dir_path))
+    try:
+        sys.modules.pop(module_name, None)
+        return importlib.import_module(module_name)
+    finally:
+        sys.path.remove(str(dir_path))
+
+
+def test_gen_resource(boto_ses, tmp_path):
+    p = gen_resource(boto_ses, str(tmp_path))
+    module = import_module(tmp_path, p.stem)
+    col = module.col_111122223333____us_east_1____db2____tb3____col4
+    assert isinstance(col, Column)
+    assert col.id == "111122223333____us-east-1____db2____tb3____col4"
+
+
+def test_gen_resource_error_keeps_module(boto_ses, tmp_path):
+    p = gen_resource(boto_ses, str(tmp_path))
+    content = p.read_text()
+
+    glue_client = boto_ses.clients["glue"]
+
+    def get_tables(**kwargs):
+        raise ConnectionError("get_tables failed")
+
+    glue_client.get_tables = get_tables
+    with pytest.raises(ConnectionError):
+        gen_resource(boto_ses, str(tmp_path), max_workers=1)
+    # the last good module is still there, no temp file is left behind
+    assert p.read_text() == content
+    assert sorted(path.name for path in tmp_path.iterdir()) == [p.name, ]
+
+
+def test_gen_resource_lazy(boto_ses, tmp_path):
+    p = gen_resource(boto_ses, str(tmp_path), lazy=True)
+    module = import_module(tmp_path, p.stem)
+    assert len(module._definitions) == 3 + 3 * 4 + 3 * 4 * 5
+    # nothing is built at import time
+    assert not any(
+        isinstance(value, Database) for value in vars(module).values()
+    )
+
+    col_name = "col_111122223333____us_east_1____db2____tb3____col4"
+    assert col_name in dir(module)
+    col = getattr(module, col_name)
+    assert col.id == "111122223333____us-east-1____db2____tb3____col4"
+    assert vars(module)[col_name] is col
+    assert col.table is module.tb_111122223333____us_east_1____db2____tb3
+
+    namespace = dict()
+    exec(f"from {p.stem} import {col_name}", namespace)
+    assert namespace[col_name] is col
+
+    with pytest.raises(AttributeError):
+        module.col_not_exists
+
+
+def test_gen_principal_lazy(boto_ses, tmp_path):
+    p = gen_principal(boto_ses, str(tmp_path))
+    module = import_module(tmp_path, p.stem)
+    assert isinstance(module.user_alice, IamUser)
+
+    p = gen_principal(boto_ses, str(tmp_path), lazy=True)
+    module = import_module(tmp_path, p.stem)
+    assert "role_ec2_role" not in vars(module)
+    assert isinstance(module.role_ec2_role, IamRole)
+    role = module.role_aws_service_role__ecs_amazonaws_com__AWSServiceRoleForECS
+    assert role.arn == "arn:aws:iam::111122223333:role/aws-service-role/ecs.amazonaws.com/AWSServiceRoleForECS"
+
+
+def test_render_to_file(tmp_path):
+    glue_client = FakeGlueClient(make_catalog(3, 4, 5))
+    tpl = Template(source=tpl_resource.read_text(encoding="utf-8"))
+    kwargs = dict(account_id=aws_account_id, region=aws_region, lazy=False)
+    p = tmp_path / "resource.py"
+    # databases are consumed from the crawler generator while rendering
+    render_to_file(
+        tpl, p,
+        database_list=iter_databases(glue_client, aws_account_id, aws_region),
+        **kwargs
+    )
+    database_list = list(iter_databases(glue_client, aws_account_id, aws_region))
+    assert p.read_text(encoding="utf-8") == tpl.render(database_list=database_list, **kwargs)
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_gen_resource_split(boto_ses, tmp_path, lazy):
+    p = gen_resource(boto_ses, str(tmp_path), split=True, lazy=lazy)
+    assert p.is_dir()
+    assert sorted(f.name for f in p.iterdir()) == [
+        "__init__.py", "db_db0.py", "db_db1.py", "db_db2.py",
+    ]
+
+    package = import_module(tmp_path, p.name)
+    for submodule in ["db_db0", "db_db1", "db_db2"]:
+        sys.modules.pop(f"{p.name}.{submodule}", None)
+
+    col = package.col_111122223333____us_east_1____db1____tb3____col4
+    assert col.id == "111122223333____us-east-1____db1____tb3____col4"
+    # only the submodule of the touched database is imported
+    assert f"{p.name}.db_db1" in sys.modules
+    assert f"{p.name}.db_db0" not in sys.modules
+    assert package.db_db2.db_111122223333____us_east_1____db2.name == "db2"
+
+    with pytest.raises(AttributeError):
+        package.db_111122223333____us_east_1____db9
+
+    # submodule of removed database is cleaned up
+    del boto_ses.client("glue").catalog["db2"]
+    gen_resource(boto_ses, str(tmp_path), split=True, lazy=lazy)
+    assert not (p / "db_db2.py").exists()
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
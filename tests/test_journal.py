@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+from aws_lf_tag.core import (
+    Playbook, Database, Table, Column, IamRole, Tag, PermissionEnum,
+)
+from aws_lf_tag import journal
+from aws_lf_tag.journal import JournalStateBackend, diff_records
+from aws_lf_tag.state import STATE_VERSION, read_state_version
+from aws_lf_tag.tests.fake import make_playbook
+from aws_lf_tag.tests.state import assert_same_playbook
+
+aws_account_id = "111122223333"
+aws_region = "us-east-1"
+
+db = Database(account_id=aws_account_id, region=aws_region, name="db")
+tb = Table(name="tb", database=db)
+columns = [Column(name=f"col{i}", table=tb) for i in range(100)]
+role = IamRole(arn=f"arn:aws:iam::{aws_account_id}:role/ec2-role")
+
+
+def make_tags(n_col: int = 100, extra_tag: bool = False):
+    tags = list()
+    for value in ["y", "n"]:
+        tag = Tag(key="Admin", value=value)
+        tag.attach_to_resources([db, tb] + columns[:n_col])
+        tag.attach_to_principal(role, [
+            PermissionEnum.DescribeDatabase.value,
+            PermissionEnum.Select.value,
+        ])
+        tags.append(tag)
+    if extra_tag:
+        tag = Tag(key="Regular", value="y")
+        tag.attach_to_resource(db)
+        tags.append(tag)
+    return tags
+
+
+def new_playbook(tags) -> Playbook:
+    pb = Playbook(_skip_validation=True)
+    for tag in tags:
+        pb.add_tag(tag)
+    return pb
+
+
+class TestJournalStateBackend:
+    def test_save_and_load(self, tmp_path):
+        backend = JournalStateBackend(tmp_path / "deployed.json")
+        deployed_pb = backend.load()
+        assert len(deployed_pb.tags) == 0
+
+        # first save writes the snapshot
+        pb1 = new_playbook(make_tags(extra_tag=True))
+        backend.save(pb1, deployed_pb)
+        assert backend.path.exists()
+        assert not backend.path_journal.exists()
+        assert_same_playbook(pb1, backend.load())
+
+        # small change only appends to the journal
+        snapshot_size = backend.path.stat().st_size
+        pb2 = new_playbook(make_tags(n_col=99))
+        pb2.tags["Admin____y"].detach_from_principal(role, [PermissionEnum.Select.value])
+        pb2.tags["Admin____n"].attach_to_principal(role, [PermissionEnum.Insert.value])
+        pb2.add_tag(Tag(key="Regular", value="n"))
+        records = diff_records(pb2, backend.load())
+        assert {record["op"] for record in records} == {
+            "add_tag",
+            "remove_tag",
+            "remove_resource_attachment",
+            "add_principal_attachment",
+            "remove_principal_attachment",
+        }
+        backend.save(pb2, backend.load())
+        assert backend.path.stat().st_size == snapshot_size
+        assert backend.path_journal.stat().st_size < snapshot_size / 2
+        assert_same_playbook(pb2, backend.load())
+
+        # replay is idempotent
+        content = backend.path_journal.read_text()
+        backend.path_journal.write_text(content + content)
+        assert_same_playbook(pb2, backend.load())
+        backend.path_journal.write_text(content)
+
+        # truncated last line is ignored, and dropped on next append
+        backend.path_journal.write_text(content + '{"op": "add_ta')
+        assert_same_playbook(pb2, backend.load())
+        pb3 = new_playbook(make_tags(n_col=98))
+        backend.save(pb3, backend.load())
+        assert_same_playbook(pb3, backend.load())
+
+    def test_compact(self, tmp_path):
+        backend = JournalStateBackend(
+            tmp_path / "deployed.json",
+            compact_ratio=0,
+            compact_min_bytes=0,
+        )
+        pb1 = new_playbook(make_tags())
+        backend.save(pb1, backend.load())
+        pb2 = new_playbook(make_tags(n_col=50))
+        backend.save(pb2, backend.load())
+        assert not backend.path_journal.exists()
+        assert_same_playbook(pb2, backend.load())
+
+    def test_upgrade_v1_snapshot(self, tmp_path):
+        backend = JournalStateBackend(tmp_path / "deployed.json")
+        pb1 = new_playbook(make_tags())
+        backend.path.write_text(json.dumps(pb1.serialize()))
+        assert read_state_version(backend.path) == 1
+
+        # the first save rewrites the snapshot in the current format
+        pb2 = new_playbook(make_tags(n_col=99))
+        backend.save(pb2, backend.load())
+        assert read_state_version(backend.path) == STATE_VERSION
+        assert not backend.path_journal.exists()
+        assert_same_playbook(pb2, backend.load())
+
+        # then it is only appended to
+        pb3 = new_playbook(make_tags(n_col=98))
+        backend.save(pb3, backend.load())
+        assert backend.path_journal.exists()
+        assert_same_playbook(pb3, backend.load())
+
+    def test_read_version_once(self, tmp_path, monkeypatch):
+        calls = list()
+
+        def read_version(path):
+            calls.append(path)
+            return read_state_version(path)
+
+        monkeypatch.setattr(journal, "read_state_version", read_version)
+        backend = JournalStateBackend(tmp_path / "deployed.json")
+        backend.path.write_text(json.dumps(new_playbook(make_tags()).serialize()))
+        for n_col in [99, 98, 97]:
+            backend.save(new_playbook(make_tags(n_col=n_col)), backend.load())
+        assert len(calls) == 1
+
+    def test_playbook_apply(self, tmp_path):
+        pb = make_playbook()
+        pb.state_backend = JournalStateBackend(tmp_path / "deployed.json")
+        for tag in make_tags():
+            pb.add_tag(tag)
+        pb.apply(verbose=False)
+        assert_same_playbook(pb, pb.state_backend.load())
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from aws_lf_tag.core import (
+    Database, Table, Column, Tag, ResourceAttachment,
+)
+from aws_lf_tag.planner import plan_resource_calls
+from aws_lf_tag.tests.fake import make_playbook
+
+aws_account_id = "111122223333"
+aws_region = "us-east-1"
+
+db = Database(account_id=aws_account_id, region=aws_region, name="db")
+tb = Table(name="tb", database=db)
+columns = [Column(name=f"col{i}", table=tb) for i in range(300)]
+tag_admin = Tag(key="Admin", value="y")
+tag_level = Tag(key="Level", value="1")
+
+
+def ra(tag, resource) -> ResourceAttachment:
+    return ResourceAttachment(tag=tag, resource=resource)
+
+
+def test_columns_of_same_table():
+    calls = plan_resource_calls([ra(tag_admin, col) for col in columns])
+    assert len(calls) == 1
+    kwargs = calls[0].to_kwargs(aws_account_id)
+    assert kwargs["Resource"]["TableWithColumns"]["ColumnNames"] == [
+        col.name for col in columns
+    ]
+    assert kwargs["LFTags"] == [
+        dict(TagKey="Admin", TagValues=["y"], CatalogId=aws_account_id),
+    ]
+    assert len(calls[0].attachments) == 300
+
+
+def test_group_by_tag_set():
+    ra_list = [
+        ra(tag_admin, db),
+        ra(tag_level, db),
+        ra(tag_admin, tb),
+        ra(tag_admin, columns[0]),
+        ra(tag_level, columns[0]),
+        ra(tag_admin, columns[1]),
+        ra(tag_level, columns[1]),
+        ra(tag_admin, columns[2]),
+    ]
+    calls = plan_resource_calls(ra_list)
+    assert [
+        (list(call.resource_arg), [tag.id for tag in call.tags])
+        for call in calls
+    ] == [
+        (["Database"], ["Admin____y", "Level____1"]),
+        (["Table"], ["Admin____y"]),
+        (["TableWithColumns"], ["Admin____y", "Level____1"]),
+        (["TableWithColumns"], ["Admin____y"]),
+    ]
+    assert calls[2].resource_arg["TableWithColumns"]["ColumnNames"] == ["col0", "col1"]
+    assert sum(len(call.attachments) for call in calls) == len(ra_list)
+
+
+def test_max_lf_tags():
+    tags = [Tag(key=f"key{i}", value="v") for i in range(5)]
+    calls = plan_resource_calls([ra(tag, tb) for tag in tags], max_lf_tags=2)
+    assert [len(call.tags) for call in calls] == [2, 2, 1]
+    assert sum(len(call.attachments) for call in calls) == 5
+
+
+def test_apply_resources():
+    pb = make_playbook()
+    tag = Tag(key="Admin", value="y", pb=pb)
+    tag.attach_to_resources(columns)
+    pb.apply_resources(verbose=False)
+    assert pb.lf_client.count("add_lf_tags_to_resource") == 1
+
+    deployed_pb = pb
+    pb = make_playbook(deployed_pb=deployed_pb)
+    pb.apply_resources(verbose=False)
+    assert pb.lf_client.count("remove_lf_tags_from_resource") == 1
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
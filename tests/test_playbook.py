@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
 import pytest
-from aws_lf_tag.core import Playbook
+from aws_lf_tag.core import (
+    Playbook, Tag, Database, Table, Column, IamRole, PermissionEnum, Interner,
+)
 from aws_lf_tag.tests import (
     ec2_iam_role,
     db, tb, col,
@@ -19,6 +21,103 @@ class TestPlaybook:
         cls.pb.add_tag(tag_admin_n)
 
 
+class TestMapper:
+    def test_incremental(self):
+        role = IamRole(arn="arn:aws:iam::111122223333:role/ec2-role")
+        database = Database("111122223333", "us-east-1", "db")
+
+        pb = Playbook(_skip_validation=True)
+        tag_y = Tag(key="Admin", value="y")
+        tag_y.attach_to_resource(database)  # before add_tag
+        pb.add_tag(tag_y)
+        tag_n = Tag(key="Admin", value="n", pb=pb)
+        tag_n.attach_to_resource(database)  # after add_tag
+        tag_n.attach_to_principal(role, [PermissionEnum.DescribeDatabase.value])
+
+        assert pb.tag_mapper == {"Admin": {"y", "n"}}
+        assert set(pb.resource_attachment_mapper) == {
+            ra.id
+            for tag in [tag_y, tag_n]
+            for ra in tag.resource_attachments.values()
+        }
+        assert set(pb.principal_attachment_mapper) == set(tag_n.principal_attachments)
+
+        # replace a tag with another object of the same id
+        pb.add_tag(Tag(key="Admin", value="y"))
+        assert len(pb.resource_attachment_mapper) == 1
+        tag_y.attach_to_resource(Table(name="tb", database=database))
+        assert len(pb.resource_attachment_mapper) == 1
+
+    def test_deserialize_with_shared_interner(self):
+        pb = Playbook(_skip_validation=True)
+        database = Database("111122223333", "us-east-1", "db")
+        Tag(key="Admin", value="y", pb=pb).attach_to_resource(database)
+        data = pb.serialize()
+
+        interner = Interner()
+        pb1 = Playbook.deserialize(data, interner)
+        pb2 = Playbook.deserialize(data, interner)
+        assert pb1.tags["Admin____y"] is not pb2.tags["Admin____y"]
+        ra1, = pb1.resource_attachment_mapper.values()
+        ra2, = pb2.resource_attachment_mapper.values()
+        assert ra1.resource is ra2.resource
+
+        pb2.tags["Admin____y"].attach_to_resource(Table(name="tb", database=database))
+        assert len(pb1.resource_attachment_mapper) == 1
+        assert len(pb2.resource_attachment_mapper) == 2
+
+
+class TestInterner:
+    def test_intern(self):
+        interner = Interner()
+        db1 = interner.intern(Database("111122223333", "us-east-1", "db"))
+        db2 = interner.intern(Database("111122223333", "us-east-1", "db"))
+        assert db1 is db2
+        assert len(interner) == 1
+
+        # same id, different class, are different entities
+        tb1 = interner.intern(Table(name="tb", database=db1))
+        assert tb1 is not db1
+        assert len(interner) == 2
+
+    def test_deserialize_playbook(self):
+        pb = Playbook(_skip_validation=True)
+        database = Database("111122223333", "us-east-1", "db")
+        table = Table(name="tb", database=database)
+        columns = [Column(name=f"col{i}", table=table) for i in range(5)]
+        role = IamRole(arn="arn:aws:iam::111122223333:role/ec2-role")
+        for value in ["y", "n"]:
+            tag = Tag(key="Admin", value=value)
+            pb.add_tag(tag)
+            tag.attach_to_resources([database, table] + columns)
+            tag.attach_to_principal(role, [
+                PermissionEnum.DescribeTable.value,
+                PermissionEnum.Select.value,
+            ])
+
+        pb1 = Playbook.deserialize(pb.serialize())
+        assert set(pb1.tags) == set(pb.tags)
+        assert set(pb1.resource_attachment_mapper) == set(pb.resource_attachment_mapper)
+        assert set(pb1.principal_attachment_mapper) == set(pb.principal_attachment_mapper)
+
+        # one object per logical entity
+        databases = {
+            id(ra.resource) if isinstance(ra.resource, Database) else id(ra.resource.database)
+            for ra in pb1.resource_attachment_mapper.values()
+            if not isinstance(ra.resource, Column)
+        } | {
+            id(ra.resource.table.database)
+            for ra in pb1.resource_attachment_mapper.values()
+            if isinstance(ra.resource, Column)
+        }
+        assert len(databases) == 1
+        principals = {id(pa.principal) for pa in pb1.principal_attachment_mapper.values()}
+        assert len(principals) == 1
+        for tag_id, tag in pb1.tags.items():
+            for ra in tag.resource_attachments.values():
+                assert ra.tag is tag
+
+
 
 
 if __name__ == "__main__":
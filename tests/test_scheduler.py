@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+from aws_lf_tag.core import Database, Table, IamRole, Tag, PermissionEnum
+from aws_lf_tag.scheduler import Dag, STATUS_DONE, STATUS_FAILED, STATUS_SKIPPED
+from aws_lf_tag.state import JsonStateBackend
+from aws_lf_tag.tests.fake import FakeLakeFormationClient, make_playbook
+from botocore.exceptions import ClientError
+
+aws_account_id = "111122223333"
+aws_region = "us-east-1"
+
+db = Database(account_id=aws_account_id, region=aws_region, name="db")
+tb = Table(name="tb", database=db)
+role = IamRole(arn=f"arn:aws:iam::{aws_account_id}:role/ec2-role")
+
+
+class TestDag:
+    def test_order(self):
+        lock = threading.Lock()
+        done = list()
+        d_done = threading.Event()
+
+        def task(name: str, wait_for: threading.Event = None):
+            def func():
+                # "a" only finishes after "d", it would time out if "c" and
+                # "d" waited for "a"
+                if wait_for is not None:
+                    assert wait_for.wait(timeout=5)
+                with lock:
+                    done.append(name)
+                if name == "d":
+                    d_done.set()
+                return name
+
+            return func
+
+        dag = Dag()
+        a = dag.add("a", task("a", wait_for=d_done))
+        b = dag.add("b", task("b"), [a])
+        c = dag.add("c", task("c"))
+        d = dag.add("d", task("d"), [c])
+        dag.add("e", task("e"), [b, d])
+        nodes = dag.run(max_workers=4)
+        # c and d don't wait for a
+        assert done == ["c", "d", "a", "b", "e"]
+        assert nodes["e"].result == "e"
+
+    def test_failure(self):
+        def fail():
+            raise ValueError("a")
+
+        dag = Dag()
+        a = dag.add("a", fail)
+        b = dag.add("b", lambda: "b", [a])
+        dag.add("c", lambda: "c", [b])
+        dag.add("d", lambda: "d")
+        with pytest.raises(ValueError):
+            dag.run()
+        assert [node.status for node in dag.nodes.values()] == [
+            STATUS_FAILED, STATUS_SKIPPED, STATUS_SKIPPED, STATUS_DONE,
+        ]
+
+    def test_duplicate(self):
+        dag = Dag()
+        dag.add("a", lambda: None)
+        with pytest.raises(ValueError):
+            dag.add("a", lambda: None)
+        assert len(dag) == 1
+
+
+def test_apply_order(tmp_path):
+    pb = make_playbook()
+    pb.state_backend = JsonStateBackend(tmp_path / "deployed.json")
+    tag = Tag(key="Admin", value="y", pb=pb)
+    tag.attach_to_resource(tb)
+    tag.attach_to_principal(role, [PermissionEnum.Select.value])
+    pb.apply(verbose=False)
+
+    # move everything from "y" to "n"
+    pb = make_playbook()
+    pb.state_backend = JsonStateBackend(tmp_path / "deployed.json")
+    tag = Tag(key="Admin", value="n", pb=pb)
+    tag.attach_to_resource(tb)
+    tag.attach_to_principal(role, [PermissionEnum.Select.value])
+    pb.apply(verbose=False)
+    calls = [
+        (api, sorted(kwargs.get("TagValuesToAdd", kwargs.get("TagValuesToDelete", list()))))
+        for api, kwargs in pb.lf_client.calls
+    ]
+    assert calls[0] == ("update_lf_tag", ["n"])
+    assert {api for api, _ in calls[1:3]} == {
+        "add_lf_tags_to_resource", "batch_grant_permissions",
+    }
+    assert {api for api, _ in calls[3:5]} == {
+        "remove_lf_tags_from_resource", "batch_revoke_permissions",
+    }
+    assert calls[5] == ("update_lf_tag", ["y"])
+
+
+def test_apply_tag_keys_independent(tmp_path):
+    fast_attached = threading.Event()
+
+    class Client(FakeLakeFormationClient):
+        def create_lf_tag(self, **kwargs):
+            # "Slow" is only created once "Fast" is attached
+            if kwargs["TagKey"] == "Slow":
+                assert fast_attached.wait(timeout=5)
+            return super().create_lf_tag(**kwargs)
+
+        def add_lf_tags_to_resource(self, **kwargs):
+            res = super().add_lf_tags_to_resource(**kwargs)
+            if kwargs["LFTags"][0]["TagKey"] == "Fast":
+                fast_attached.set()
+            return res
+
+    pb = make_playbook(lf_client=Client())
+    pb.state_backend = JsonStateBackend(tmp_path / "deployed.json")
+    # same resource, still one call per tag key
+    Tag(key="Slow", value="y", pb=pb).attach_to_resource(tb)
+    Tag(key="Fast", value="y", pb=pb).attach_to_resource(tb)
+    pb.apply(verbose=False)
+    calls = [
+        (api, kwargs.get("TagKey") or [lf_tag["TagKey"] for lf_tag in kwargs["LFTags"]])
+        for api, kwargs in pb.lf_client.calls
+    ]
+    assert calls.index(("add_lf_tags_to_resource", ["Fast"])) < calls.index(("create_lf_tag", "Slow"))
+    assert calls.index(("create_lf_tag", "Slow")) < calls.index(("add_lf_tags_to_resource", ["Slow"]))
+
+
+def test_apply_failed_tag_key(tmp_path):
+    class Client(FakeLakeFormationClient):
+        def create_lf_tag(self, **kwargs):
+            if self.fail and kwargs["TagKey"] == "A":
+                raise ClientError(
+                    {"Error": {"Code": "AccessDeniedException", "Message": "denied"}},
+                    "create_lf_tag",
+                )
+            return super().create_lf_tag(**kwargs)
+
+    def make(fail: bool):
+        pb = make_playbook(lf_client=Client())
+        pb.lf_client.fail = fail
+        pb.state_backend = JsonStateBackend(tmp_path / "deployed.json")
+        for key in ["A", "B"]:
+            tag = Tag(key=key, value="y", pb=pb)
+            tag.attach_to_resource(tb)
+            tag.attach_to_principal(role, [PermissionEnum.Select.value])
+        return pb
+
+    # "A" fails, "B" is still applied and saved before the error is raised
+    pb = make(fail=True)
+    with pytest.raises(ClientError):
+        pb.apply(verbose=False)
+    assert sorted(
+        (api, kwargs.get("TagKey") or kwargs["LFTags"][0]["TagKey"])
+        for api, kwargs in pb.lf_client.calls
+        if api != "batch_grant_permissions"
+    ) == [("add_lf_tags_to_resource", "B"), ("create_lf_tag", "B")]
+    assert pb.lf_client.count("batch_grant_permissions") == 1
+    assert isinstance(pb.not_applied.exception, ClientError)
+    deployed_pb = pb.state_backend.load()
+    assert set(deployed_pb.tags) == {"B____y", }
+    assert len(deployed_pb.resource_attachment_mapper) == 1
+    assert len(deployed_pb.principal_attachment_mapper) == 1
+
+    # the next apply only does "A"
+    pb = make(fail=False)
+    pb.apply(verbose=False)
+    assert sorted(
+        (api, kwargs.get("TagKey") or kwargs["LFTags"][0]["TagKey"])
+        for api, kwargs in pb.lf_client.calls
+        if api != "batch_grant_permissions"
+    ) == [("add_lf_tags_to_resource", "A"), ("create_lf_tag", "A")]
+    assert set(pb.state_backend.load().tags) == {"A____y", "B____y"}
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
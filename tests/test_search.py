@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from aws_lf_tag.core import Database, Table, Column, Tag
+from aws_lf_tag.search import ResourceIndex
+
+aws_region = "us-east-1"
+aws_account_id = "111122223333"
+
+
+def make_database_list():
+    database_list = list()
+    for db_name, tables in [
+        ("db_sales", {"users": ["id", "ssn", "email"], "orders": ["id", "user_id"]}),
+        ("db_hr", {"users": ["id", "ssn", "home_email"]}),
+        ("analytics", {"users": ["id", "ssn"]}),
+    ]:
+        db = Database(account_id=aws_account_id, region=aws_region, name=db_name)
+        for tb_name, col_names in tables.items():
+            tb = Table(name=tb_name, database=db)
+            for col_name in col_names:
+                tb.c[col_name] = Column(name=col_name, table=tb)
+            db.t[tb_name] = tb
+        database_list.append(db)
+    return database_list
+
+
+class TestResourceIndex:
+    index: ResourceIndex
+
+    @classmethod
+    def setup_class(cls):
+        cls.index = ResourceIndex.from_databases(make_database_list())
+
+    def ids(self, resources):
+        return sorted(
+            resource.id.split("____", 2)[2].replace("____", ".")
+            for resource in resources
+        )
+
+    def test_len(self):
+        assert len(self.index) == 3 + 4 + 10
+
+    def test_select(self):
+        assert self.ids(self.index.select("db_*.*.ssn")) == [
+            "db_hr.users.ssn", "db_sales.users.ssn",
+        ]
+        assert self.ids(self.index.select("*.*.ssn")) == [
+            "analytics.users.ssn", "db_hr.users.ssn", "db_sales.users.ssn",
+        ]
+        assert self.ids(self.index.select("*.users.*email")) == [
+            "db_hr.users.home_email", "db_sales.users.email",
+        ]
+        assert self.ids(self.index.select("db_sales.orders")) == ["db_sales.orders"]
+        assert self.ids(self.index.select("db_sales.*")) == [
+            "db_sales.orders", "db_sales.users",
+        ]
+        assert self.ids(self.index.select("db_*")) == ["db_hr", "db_sales"]
+        assert self.index.select("not_exists.*.*") == []
+
+        with pytest.raises(ValueError):
+            self.index.select("a.b.c.d")
+
+    def test_search_regex(self):
+        assert self.ids(self.index.search_regex(r"email$")) == [
+            "db_hr.users.home_email", "db_sales.users.email",
+        ]
+        assert self.ids(self.index.search_regex(r"^db_", level="database")) == [
+            "db_hr", "db_sales",
+        ]
+
+    def test_from_resources(self):
+        index = ResourceIndex.from_resources(
+            ResourceIndex.from_databases(make_database_list()).select("*.*.*")
+        )
+        assert len(index) == 10
+        assert len(index.select("*.*.id")) == 4
+
+
+def test_attach_to_resources():
+    index = ResourceIndex.from_databases(make_database_list())
+    tag = Tag(key="PII", value="y")
+    tag.attach_to_resources(index.select("*.*.ssn"))
+    assert len(tag.resource_attachments) == 3
+
+    tag = Tag(key="PII", value="n")
+    tag.attach_to_resources("*.*.ssn", index=index)
+    assert len(tag.resource_attachments) == 3
+
+    # a bare selector would iterate its characters
+    with pytest.raises(TypeError):
+        Tag(key="PII", value="x").attach_to_resources("*.*.ssn")
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import gc
+import gzip
+import warnings
+
+import pytest
+from aws_lf_tag import serializer
+from aws_lf_tag import stream as stream_module
+from aws_lf_tag.serializer import (
+    get_serializer, detect_from_path, detect_compression, open_decompressed,
+    FORMAT_JSON, FORMAT_MSGPACK,
+    COMPRESSION_NONE, COMPRESSION_GZIP, COMPRESSION_ZSTD,
+)
+from aws_lf_tag.digest import compute_digests
+from aws_lf_tag.state import (
+    STATE_VERSION, read_state, read_header, write_state, JsonStateBackend,
+)
+from aws_lf_tag.tests.state import make_state_playbook, assert_same_playbook
+
+
+def test_detect():
+    assert detect_from_path("deployed.json") == (FORMAT_JSON, COMPRESSION_NONE)
+    assert detect_from_path("deployed.json.gz") == (FORMAT_JSON, COMPRESSION_GZIP)
+    assert detect_from_path("deployed.json.zst") == (FORMAT_JSON, COMPRESSION_ZSTD)
+    assert detect_from_path("deployed.msgpack.gz") == (FORMAT_MSGPACK, COMPRESSION_GZIP)
+    assert detect_compression(gzip.compress(b"{}")) == COMPRESSION_GZIP
+    assert detect_compression(b"{}") == COMPRESSION_NONE
+
+
+def test_get_serializer():
+    assert get_serializer(name="json").name == "json"
+    if serializer.orjson is not None:
+        assert get_serializer().name == "orjson"
+    with pytest.raises(ValueError):
+        get_serializer(name="not-exists")
+
+
+@pytest.mark.parametrize("filename", ["deployed.json", "deployed.json.gz"])
+@pytest.mark.parametrize("stream", [True, False])
+def test_read_write(tmp_path, filename, stream):
+    pb = make_state_playbook()
+    path = tmp_path / filename
+    write_state(pb, path, serializer=get_serializer(name="json"))
+    assert_same_playbook(pb, read_state(path, stream=stream))
+    write_state(pb, path)
+    assert_same_playbook(pb, read_state(path, stream=stream))
+
+
+@pytest.mark.skipif(serializer.msgpack is None, reason="msgpack is not installed")
+def test_msgpack(tmp_path):  # pragma: no cover
+    pb = make_state_playbook()
+    path = tmp_path / "deployed.msgpack.gz"
+    write_state(pb, path)
+    assert_same_playbook(pb, read_state(path))
+    header = read_header(path)
+    assert header["version"] == STATE_VERSION
+    assert header["digests"] == compute_digests(pb)
+    assert "tags" not in header
+
+
+@pytest.mark.skipif(serializer.zstandard is None, reason="zstandard is not installed")
+def test_zstd(tmp_path):  # pragma: no cover
+    pb = make_state_playbook()
+    path = tmp_path / "deployed.json.zst"
+    write_state(pb, path)
+    assert_same_playbook(pb, read_state(path))
+
+
+@pytest.mark.parametrize(
+    "filename",
+    [
+        "deployed.json",
+        "deployed.json.gz",
+        pytest.param(
+            "deployed.json.zst",
+            marks=pytest.mark.skipif(
+                serializer.zstandard is None, reason="zstandard is not installed",
+            ),
+        ),
+    ],
+)
+def test_open_decompressed(tmp_path, filename):
+    path = tmp_path / filename
+    write_state(make_state_playbook(), path)
+    with warnings.catch_warnings(record=True) as records:
+        warnings.simplefilter("always", ResourceWarning)
+        with open_decompressed(path) as f:
+            assert f.peek(1)[:1] == b"{"
+        del f
+        gc.collect()
+    # the underlying file is closed too
+    assert [r for r in records if issubclass(r.category, ResourceWarning)] == []
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_backend(tmp_path, monkeypatch, stream):
+    calls = list()
+    stream_state = stream_module.stream_state
+
+    def stream_state_spy(*args, **kwargs):
+        calls.append(args)
+        return stream_state(*args, **kwargs)
+
+    monkeypatch.setattr(stream_module, "stream_state", stream_state_spy)
+    pb = make_state_playbook()
+    backend = JsonStateBackend(tmp_path / "deployed.json.gz", stream=stream)
+    backend.save(pb, backend.load())
+    assert backend.path.read_bytes()[:2] == b"\x1f\x8b"
+    assert_same_playbook(pb, backend.load())
+    # the fast serializer by default, the streaming loader is opt-in
+    assert len(calls) == (1 if stream else 0)
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
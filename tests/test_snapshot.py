@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from aws_lf_tag.crawler import iter_catalog
+from aws_lf_tag.snapshot import CatalogSnapshot
+from aws_lf_tag import gen_code
+from aws_lf_tag.gen_code import gen_resource
+from aws_lf_tag.tests.fake import FakeGlueClient, FakeBotoSession, make_catalog
+
+aws_region = "us-east-1"
+aws_account_id = "111122223333"
+
+
+class TestCatalogSnapshot:
+    def test_update(self, tmp_path):
+        glue_client = FakeGlueClient(make_catalog(3, 4, 2), page_size=3)
+        snapshot = CatalogSnapshot(account_id=aws_account_id, region=aws_region)
+
+        diff = snapshot.update(iter_catalog(glue_client, aws_account_id))
+        assert len(diff.added_databases) == 3
+        assert len(diff.added_tables) == 12
+
+        diff = snapshot.update(iter_catalog(glue_client, aws_account_id))
+        assert diff.is_empty
+
+        glue_client.touch("db1", "tb2")
+        glue_client.catalog["db1"]["tb2"].append("new_col")
+        del glue_client.catalog["db2"]
+        glue_client.catalog["db0"]["tb9"] = ["col0"]
+        diff = snapshot.update(iter_catalog(glue_client, aws_account_id))
+        assert diff.updated_tables == [("db1", "tb2")]
+        assert diff.added_tables == [("db0", "tb9")]
+        assert diff.removed_databases == ["db2"]
+        assert snapshot.databases["db1"]["tables"]["tb2"]["columns"] == ["col0", "col1", "new_col"]
+
+        p = tmp_path / "snapshot.json"
+        snapshot.write(p)
+        snapshot1 = CatalogSnapshot.read(p)
+        assert snapshot1.serialize() == snapshot.serialize()
+
+        database_list = snapshot1.to_database_list()
+        assert [db.name for db in database_list] == ["db0", "db1"]
+        assert list(database_list[1].t["tb2"].c) == ["col0", "col1", "new_col"]
+
+
+def test_gen_resource_incremental(tmp_path, monkeypatch):
+    glue_client = FakeGlueClient(make_catalog(2, 2, 2))
+    boto_ses = FakeBotoSession(aws_account_id, aws_region, glue=glue_client)
+
+    p = gen_resource(boto_ses, str(tmp_path), incremental=True)
+    assert p.name == "resource_111122223333_us_east_1.py"
+    assert (tmp_path / "resource_111122223333_us_east_1.snapshot.json").exists()
+    mtime = p.stat().st_mtime_ns
+
+    # nothing changed, the module is not re-rendered
+    gen_resource(boto_ses, str(tmp_path), incremental=True)
+    assert p.stat().st_mtime_ns == mtime
+
+    # the catalog didn't change, but the render options did
+    gen_resource(boto_ses, str(tmp_path), incremental=True, lazy=True)
+    assert "make_lazy_resource_module" in p.read_text()
+    mtime = p.stat().st_mtime_ns
+    gen_resource(boto_ses, str(tmp_path), incremental=True, lazy=True)
+    assert p.stat().st_mtime_ns == mtime
+
+    glue_client.touch("db0", "tb0")
+    glue_client.catalog["db0"]["tb0"].append("new_col")
+
+    # rendering fails, the snapshot is not updated, the next run renders
+    def render_to_file(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(gen_code, "render_to_file", render_to_file)
+    with pytest.raises(OSError):
+        gen_resource(boto_ses, str(tmp_path), incremental=True)
+    monkeypatch.undo()
+
+    gen_resource(boto_ses, str(tmp_path), incremental=True)
+    assert "db0____tb0____new_col" in p.read_text()
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from aws_lf_tag.core import (
+    Playbook, Database, Table, Column, IamRole, Tag, PermissionEnum,
+)
+from aws_lf_tag.sqlite_state import SqliteStateBackend
+from aws_lf_tag.tests.fake import make_playbook
+from aws_lf_tag.tests.state import assert_same_playbook
+
+aws_account_id = "111122223333"
+aws_region = "us-east-1"
+
+db = Database(account_id=aws_account_id, region=aws_region, name="db")
+tb = Table(name="tb", database=db)
+col = Column(name="col", table=tb)
+role = IamRole(arn=f"arn:aws:iam::{aws_account_id}:role/ec2-role")
+
+
+def add_tags(pb: Playbook, values=("y", "n")):
+    for value in values:
+        tag = Tag(key="Admin", value=value, pb=pb)
+        tag.attach_to_resources([db, tb, col])
+        tag.attach_to_principal(role, [PermissionEnum.Select.value])
+    tag = Tag(key="Regular", value="y", pb=pb)
+    tag.attach_to_resource(tb)
+    tag.attach_to_principal(role, [PermissionEnum.DescribeTable.value])
+    return pb
+
+
+class TestSqliteStateBackend:
+    def test_save_and_load(self, tmp_path):
+        backend = SqliteStateBackend(tmp_path / "deployed.sqlite")
+        pb1 = add_tags(Playbook(_skip_validation=True))
+        backend.save(pb1, backend.load())
+        assert_same_playbook(pb1, backend.load())
+
+        pb2 = add_tags(Playbook(_skip_validation=True), values=("y",))
+        pb2.tags["Admin____y"].detach_from_resource(col)
+        backend.save(pb2, backend.load())
+        assert_same_playbook(pb2, backend.load())
+
+        # reopen
+        backend.close()
+        backend = SqliteStateBackend(tmp_path / "deployed.sqlite")
+        assert_same_playbook(pb2, backend.load())
+
+        # load one tag key only
+        pb3 = backend.load(tag_keys=["Regular", ])
+        assert set(pb3.tags) == {"Regular____y", }
+        assert pb3.tag_keys == {"Regular", }
+
+        # audit queries
+        assert [tag.id for tag in backend.get_resource_tags(tb)] == [
+            "Admin____y", "Regular____y",
+        ]
+        assert backend.get_resource_tags(col) == []
+        assert [
+            (tag.id, permission.id)
+            for tag, permission in backend.get_principal_permissions(role)
+        ] == [
+            ("Admin____y", "Select"),
+            ("Regular____y", "DescribeTable"),
+        ]
+        backend.close()
+
+    def test_apply_tag_keys(self, tmp_path):
+        backend = SqliteStateBackend(tmp_path / "deployed.sqlite")
+        pb = make_playbook()
+        pb.state_backend = backend
+        add_tags(pb)
+        pb.apply(verbose=False)
+
+        # remove everything in the playbook, but only apply "Regular"
+        pb = make_playbook()
+        pb.state_backend = backend
+        pb.apply(verbose=False, tag_keys=["Regular", ])
+        assert {
+            call[0] for call in pb.lf_client.calls
+        } == {
+            "delete_lf_tag",
+            "remove_lf_tags_from_resource",
+            "batch_revoke_permissions",
+        }
+        # the tag is deleted after it is detached and revoked
+        assert pb.lf_client.calls[-1][0] == "delete_lf_tag"
+        assert pb.lf_client.calls[-1][1]["TagKey"] == "Regular"
+        assert set(backend.load().tags) == {"Admin____y", "Admin____n"}
+        backend.close()
+
+
+class TestJsonStateBackendSubset:
+    def test(self, tmp_path):
+        from aws_lf_tag.state import JsonStateBackend
+
+        backend = JsonStateBackend(tmp_path / "deployed.json")
+        pb = make_playbook()
+        pb.state_backend = backend
+        add_tags(pb)
+        pb.apply(verbose=False)
+
+        pb = make_playbook()
+        pb.state_backend = backend
+        pb.apply(verbose=False, tag_keys=["Regular", ])
+        assert set(backend.load().tags) == {"Admin____y", "Admin____n"}
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+from aws_lf_tag.core import Column
+from aws_lf_tag.state import (
+    STATE_VERSION, dump_state, load_state, upgrade_state,
+    read_state, write_state,
+)
+from aws_lf_tag.tests.state import make_state_playbook, assert_same_playbook
+
+
+class TestState:
+    def test_round_trip(self):
+        pb = make_state_playbook()
+        data = dump_state(pb)
+        assert data["version"] == STATE_VERSION
+        assert len(data["databases"]) == 1
+        assert len(data["tables"]) == 3
+        assert len(data["columns"]) == 12
+        assert len(data["resource_attachments"]) == 2 * (1 + 3 + 3 * 4)
+
+        pb1 = load_state(json.loads(json.dumps(data)))
+        assert_same_playbook(pb, pb1)
+
+        # entities are shared
+        databases = {
+            id(ra.resource.table.database)
+            for ra in pb1.resource_attachment_mapper.values()
+            if isinstance(ra.resource, Column)
+        }
+        assert len(databases) == 1
+
+    def test_upgrade(self):
+        pb = make_state_playbook()
+        v1 = json.loads(json.dumps(pb.serialize()))
+        assert_same_playbook(pb, load_state(v1))
+
+        v2 = upgrade_state(v1)
+        assert v2["version"] == STATE_VERSION
+        assert v2["deployed_at_utc_time"] == v1["deployed_at_utc_time"]
+        assert_same_playbook(pb, load_state(v2))
+        assert upgrade_state(v2) is v2
+
+        with pytest.raises(ValueError):
+            load_state({"version": 999})
+
+    def test_size(self):
+        pb = make_state_playbook(n_tb=20, n_col=20)
+        v1_size = len(json.dumps(pb.serialize(), indent=4))
+        v2_size = len(json.dumps(dump_state(pb), separators=(",", ":")))
+        assert v2_size * 10 < v1_size
+
+    def test_read_write(self, tmp_path):
+        pb = make_state_playbook()
+        path = tmp_path / "deployed.json"
+        write_state(pb, path)
+        assert_same_playbook(pb, read_state(path))
+
+        # version 1 file is still readable
+        path.write_text(json.dumps(pb.serialize(), indent=4))
+        assert_same_playbook(pb, read_state(path))
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from aws_lf_tag.core import (
+    Database, Table, Column, IamRole, Tag, PermissionEnum,
+    ResourceAttachment, PrincipalAttachment, Playbook,
+)
+from aws_lf_tag import store
+from aws_lf_tag.store import Codebook, AttachmentStore, diff_keys
+from aws_lf_tag.tests.fake import make_playbook
+
+aws_account_id = "111122223333"
+aws_region = "us-east-1"
+
+
+def make_tags(col_names, permissions):
+    db = Database(account_id=aws_account_id, region=aws_region, name="db")
+    tb = Table(name="tb", database=db)
+    role = IamRole(arn=f"arn:aws:iam::{aws_account_id}:role/ec2-role")
+    tag = Tag(key="Admin", value="y")
+    tag.attach_to_resources([Column(name=name, table=tb) for name in col_names])
+    tag.attach_to_principal(role, permissions)
+    return [tag, ]
+
+
+class TestCodebook:
+    def test_round_trip(self):
+        codebook = Codebook()
+        tag = make_tags(["a", "b"], [PermissionEnum.Select.value])[0]
+        for ra in tag.resource_attachments.values():
+            key = codebook.encode_resource_attachment(ra)
+            assert codebook.decode_resource_attachment(key) == ra
+        for pa in tag.principal_attachments.values():
+            key = codebook.encode_principal_attachment(pa)
+            assert codebook.decode_principal_attachment(key) == pa
+        assert len(codebook.tag) == 1
+        assert len(codebook.resource) == 2
+
+    def test_limit(self):
+        codebook = Codebook()
+        codebook.permission.bits = 1
+        codebook.permission.encode(PermissionEnum.Select.value)
+        codebook.permission.encode(PermissionEnum.Insert.value)
+        with pytest.raises(ValueError):
+            codebook.permission.encode(PermissionEnum.Delete.value)
+
+
+class TestAttachmentStore:
+    def test_diff(self):
+        codebook = Codebook()
+        new = AttachmentStore.from_tags(
+            make_tags(["a", "b", "c"], [PermissionEnum.Select.value, PermissionEnum.Insert.value]),
+            codebook,
+        )
+        deployed = AttachmentStore.from_tags(
+            make_tags(["b", "c", "d"], [PermissionEnum.Select.value, PermissionEnum.Delete.value]),
+            codebook,
+        )
+
+        to_add, to_remove = new.diff_resource_attachments(deployed)
+        assert [ra.resource.name for ra in to_add] == ["a"]
+        assert [ra.resource.name for ra in to_remove] == ["d"]
+
+        to_grant, to_revoke = new.diff_principal_attachments(deployed)
+        assert [pa.permission.id for pa in to_grant] == ["Insert"]
+        assert [pa.permission.id for pa in to_revoke] == ["Delete"]
+
+    def test_diff_keys(self):
+        assert diff_keys([1, 2, 3], [2, 3, 4]) == ([1], [4], 2)
+
+
+class TestPlaybookApply:
+    def test_apply_resources_and_principals(self):
+        deployed_pb = Playbook(_skip_validation=True)
+        for tag in make_tags(["b", "c"], [PermissionEnum.Select.value]):
+            deployed_pb.add_tag(tag)
+        pb = make_playbook(deployed_pb=deployed_pb)
+        for tag in make_tags(["a", "b"], [PermissionEnum.Insert.value]):
+            pb.add_tag(tag)
+
+        pb.apply_resources(verbose=False)
+        pb.apply_principals(verbose=False)
+        lf_client = pb.lf_client
+        assert lf_client.count("add_lf_tags_to_resource") == 1
+        assert lf_client.count("remove_lf_tags_from_resource") == 1
+        assert lf_client.count("batch_grant_permissions") == 1
+        assert lf_client.count("batch_revoke_permissions") == 1
+
+    @pytest.mark.parametrize("has_numpy", [True, False])
+    def test_diff_resources(self, monkeypatch, has_numpy):
+        if has_numpy and store.np is None:
+            pytest.skip("numpy is not installed")
+        monkeypatch.setattr(store, "np", store.np if has_numpy else None)
+
+        deployed_pb = Playbook(_skip_validation=True)
+        for tag in make_tags(["b", "c"], list()):
+            deployed_pb.add_tag(tag)
+        pb = make_playbook(deployed_pb=deployed_pb)
+        for tag in make_tags(["a", "b"], list()):
+            pb.add_tag(tag)
+        if not has_numpy:
+            # the mappers are diffed, no store is built
+            monkeypatch.setattr(Playbook, "_get_attachment_stores", None)
+
+        to_add_calls, to_remove_calls = pb._diff_resources()
+        assert [
+            ra.resource.name for call in to_add_calls for ra in call.attachments
+        ] == ["a"]
+        assert [
+            ra.resource.name for call in to_remove_calls for ra in call.attachments
+        ] == ["c"]
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import tracemalloc
+
+import pytest
+from aws_lf_tag.core import Column
+from aws_lf_tag.state import dump_state, load_state
+from aws_lf_tag.stream import JsonStream, stream_state, stream_state_file
+from aws_lf_tag.tests.state import make_state_playbook, assert_same_playbook
+
+
+class TestJsonStream:
+    def test(self):
+        text = ' {"a" : [1, 22, {"b": "c"}], "d": {}, "e": [], "f": 1234567}'
+        stream = JsonStream(io.StringIO(text), chunk_size=3)
+        result = dict()
+        for key in stream.iter_object():
+            if key == "a":
+                result[key] = list(stream.iter_values())
+            elif key == "d":
+                result[key] = list(stream.iter_object())
+            else:
+                result[key] = stream.read_value()
+        assert result == {"a": [1, 22, {"b": "c"}], "d": [], "e": [], "f": 1234567}
+
+    def test_error(self):
+        stream = JsonStream(io.StringIO('{"a": 1'), chunk_size=3)
+        with pytest.raises(ValueError):
+            for _ in stream.iter_object():
+                stream.read_value()
+
+
+class TestStreamState:
+    @pytest.mark.parametrize("chunk_size", [5, 64, 1024 * 1024])
+    def test_v1_and_v2(self, chunk_size):
+        pb = make_state_playbook()
+        for data in [pb.serialize(), dump_state(pb)]:
+            text = json.dumps(data, indent=4)
+            pb1 = stream_state(io.StringIO(text), chunk_size=chunk_size)
+            assert_same_playbook(pb, pb1)
+            assert pb1.tag_mapper == pb.tag_mapper
+
+    def test_shared_objects(self, tmp_path):
+        pb = make_state_playbook()
+        path = tmp_path / "deployed.json"
+        path.write_text(json.dumps(pb.serialize()))
+        pb1 = stream_state_file(path)
+        databases = {
+            id(ra.resource.table.database)
+            for ra in pb1.resource_attachment_mapper.values()
+            if isinstance(ra.resource, Column)
+        }
+        assert len(databases) == 1
+
+    def test_peak_memory(self, tmp_path):
+        pb = make_state_playbook(n_tb=50, n_col=20)
+        path = tmp_path / "deployed.json"
+        path.write_text(json.dumps(pb.serialize()))
+
+        tracemalloc.start()
+        load_state(json.loads(path.read_text()))
+        _, peak_loads = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        stream_state_file(path, chunk_size=64 * 1024)
+        _, peak_stream = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert peak_stream < peak_loads / 2
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])